@@ -26,6 +26,11 @@ class ExplorerPanelApp(Application):
         """
         Called as the application is being initialized
         """
+        # The scan service is created by the first Explorer that needs it
+        # and shared by all panels and dialogs of this app instance.
+        self._scan_service = None
+        self._stall_watchdog = None
+
         # We won't be able to do anything if there's no UI. The import
         # of our app module below required some Qt components, and will likely
         # blow up.
@@ -37,6 +42,12 @@ class ExplorerPanelApp(Application):
         # and business logic of the app is kept. By using the import_module command,
         # toolkit's code reload mechanism will work properly.
         app_payload = self.import_module("app")
+
+        # The stall watchdog is opt-in, it reports the call sites that block the ui thread
+        stall_threshold = self.get_setting("stall_threshold")
+        if stall_threshold:
+            self._stall_watchdog = app_payload.StallWatchdog(self, stall_threshold)
+            self._stall_watchdog.start()
     
         # now register a panel, this is to tell the engine about the our panel ui 
         # that the engine can automatically create the panel - this happens for
@@ -205,6 +216,28 @@ class ExplorerPanelApp(Application):
         Called as part engine shutdown
         """
         self.log_debug("Destroying app...")
+
+        if self._scan_service:
+            self._scan_service.shutdown()
+            self._scan_service = None
+
+        if self._stall_watchdog:
+            self._stall_watchdog.stop()
+            self._stall_watchdog = None
+
+    def get_scan_service(self):
+        """
+        Returns the scan service shared by every Explorer panel and dialog.
+        Identical scans that are in flight are only run once and their
+        results are shared between all open views.
+
+        :returns: The ScanService of this app instance.
+        """
+        if self._scan_service is None:
+            app_payload = self.import_module("app")
+            self._scan_service = app_payload.ScanService(self)
+
+        return self._scan_service
     
     def create_panel(self):
         """
@@ -0,0 +1,85 @@
+import os
+
+# Grouping of the paths found by a scan, free of sgtk and Qt so it only works on plain data
+
+def group_entity(job):
+    # Group all paths found for one entity.
+    # job holds the entity name, a list of template descriptions and the (path, fields) found per template.
+    # The fields come from the walk or the template itself, so an entity groups the same as in a single entity scan.
+    result = {'entity': job['entity'], 'groups': []}
+
+    for template in job['templates']:
+        parsed = list(job['parsed'].get(template['index'], []))
+        if not parsed:
+            continue
+
+        for group in group_paths(parsed, template['is_render'], job['version_limit']):
+            group['template'] = template['index']
+            result['groups'].append(group)
+
+    return result
+
+def group_paths(parsed, is_render, version_limit=0):
+    # parsed is a list of (path, fields), returns the top level groups with their versions sorted.
+    # With a version limit only the newest versions are kept, the rest is moved to older_versions.
+    if is_render:
+        groups = _group_renders(parsed)
+    else:
+        groups = _group_caches(parsed)
+
+    for group in groups:
+        group['older_versions'] = []
+        if version_limit and len(group['versions']) > version_limit:
+            group['older_versions'] = group['versions'][:-version_limit]
+            group['versions'] = group['versions'][-version_limit:]
+
+    return groups
+
+def group_ignore_keys(is_render):
+    if is_render:
+        return ('version', 'AOV')
+    return ('version',)
+
+def group_key(fields, ignore_keys):
+    return sorted((key, value) for key, value in fields.items() if key not in ignore_keys)
+
+def _group_renders(parsed):
+    # Same grouping as the render branch of the cache manager: top level, version, AOV
+    parsed.sort(key=lambda k: k[0])
+
+    groups = []
+    group = None
+    for path, fields in parsed:
+        key = group_key(fields, group_ignore_keys(True))
+        if not group or group['key'] != key:
+            group = {'key': key, 'versions': []}
+            groups.append(group)
+
+        if not group['versions'] or group['versions'][-1]['version'] != fields.get('version'):
+            group['versions'].append({'version': fields.get('version'), 'entries': []})
+
+        group['versions'][-1]['entries'].append((path, fields))
+
+    for group in groups:
+        group['versions'].sort(key=lambda k: k['version'])
+        del group['key']
+    return groups
+
+def _group_caches(parsed):
+    # Same grouping as the regular branch of the cache manager, sorted on basename
+    parsed.sort(key=lambda k: os.path.basename(k[0]))
+
+    groups = []
+    group = None
+    for path, fields in parsed:
+        key = group_key(fields, group_ignore_keys(False))
+        if not group or group['key'] != key:
+            group = {'key': key, 'versions': []}
+            groups.append(group)
+
+        group['versions'].append({'version': fields.get('version'), 'entries': [(path, fields)]})
+
+    for group in groups:
+        group['versions'].sort(key=lambda k: k['version'])
+        del group['key']
+    return groups
@@ -1,24 +1,67 @@
 
 import os
-import glob
+import json
+import time
+import collections
 
 from sgtk.platform.qt import QtCore, QtGui
 import sgtk
 
+import aggregate
+import diskusage
+import integrity
+import ioscheduler
+import scanprogress
+import snapshots
+import templatewalker
 import treeitems
 
 class CacheManager(QtCore.QObject):
     add_item_sig = QtCore.Signal(treeitems.TopLevelTreeItem)
-
-    def __init__(self, app, column_names, image_types, tab_types):
+    add_entity_item_sig = QtCore.Signal(treeitems.EntityTreeItem)
+    older_versions_sig = QtCore.Signal(object, object)
+    progress_sig = QtCore.Signal(object)
+    steps_sig = QtCore.Signal(object)
+    changes_sig = QtCore.Signal(object)
+    degraded_sig = QtCore.Signal(object)
+
+    def __init__(self, app, scan_service, column_names, image_types, tab_types):
         super(CacheManager, self).__init__()
 
         self._app = app
         self._column_names = column_names
         self._abort = False
 
+        # Templates, filesystem access, publishes and listings are shared by every view of the app
+        self._scan_service = scan_service
+        self._filesystem = scan_service.get_filesystem()
+
+        # Folders listed for this view by the scan daemon, they do not show up in the filesystem stats
+        self._remote_directories = 0
+
+        # Scanned items per entity and step, the most recently used entities are kept warm.
+        # Warm entities hold their estimated memory, the oldest are evicted over the items budget.
         self._2d_item_dict = {}
         self._3d_item_dict = {}
+        self._warm_entities = collections.OrderedDict()
+        self._warm_entity_count = self._app.get_setting('warm_entity_count') or 1
+        self._warm_evictions = 0
+
+        self._ledger = scan_service.get_memory_ledger()
+        self._ledger.add_reporter('items', self._get_items_memory)
+
+        # Steps found on disk per entity and template, listed once before the templates are expanded
+        self._step_folder_dict = {}
+        self._site_step_list = None
+
+        # Matches of the last template walk per template name, entity and step
+        self._walk_result = {}
+
+        # Items are compared with the snapshot of the entity from the last session that scanned it.
+        # That snapshot stays the baseline for this session, the groups found now are stored for the next one.
+        self._snapshots = snapshots.SnapshotStore(os.path.join(self._app.cache_location, 'snapshots'))
+        self._baselines = {}
+        self._snapshot_groups = {}
 
         self._2d_templates = {}
         self._3d_templates = {}
@@ -27,39 +70,12 @@ class CacheManager(QtCore.QObject):
             self._2d_templates[item_type] = []
             self._3d_templates[item_type] = []
 
-            # Get templates in from shot and asset context
-            search_dict = self._app.shotgun.find_one(item_type, [['project.Project.name', 'is', self._app.context.project['name']]], ['code'])
-            search_dict['project'] = self._app.context.project
-
-            entity_context = self._app.sgtk.context_from_entity_dictionary(search_dict)
-
-            # Statically add the tk-houdini engine as I could not get this to work with the tk-desktop engine
-            # Still contacting support about it :(
-            settings = sgtk.platform.find_app_settings('tk-houdini', self._app.name, self._app.sgtk, entity_context)
-            self._app.log_debug('Cache Manager Settings {}'.format(settings))
-
-            if settings:
-                for output_profile in settings[0]["settings"]["templates"]:
-                    cache_template = self._app.get_template_by_name(output_profile['cache_template'])
-
-                    work_template = []
-                    if output_profile['work_template']:
-                        for template_name in output_profile['work_template']:
-                            work_template.append(self._app.get_template_by_name(template_name))
-                    
-                    preview_template = ''
-                    if output_profile['preview_template']:
-                        preview_template = self._app.get_template_by_name(output_profile['preview_template'])
-
-                    template_dict = {'cache_template': cache_template, 'work_template': work_template, 'preview_template': preview_template}
-
-                    extension = cache_template.definition.split('.')[-1]
-                    if extension in image_types:
-                        self._2d_templates[item_type].append(template_dict)
-                    else:
-                        self._3d_templates[item_type].append(template_dict)
-            else:
-                self._app.log_error("Could not find settings for the cachemanager. App will not work!")
+            for template_dict in scan_service.get_templates(item_type):
+                extension = template_dict['cache_template'].definition.split('.')[-1]
+                if extension in image_types:
+                    self._2d_templates[item_type].append(template_dict)
+                else:
+                    self._3d_templates[item_type].append(template_dict)
 
         self._app.log_debug('2D Templates {}'.format(self._2d_templates))
         self._app.log_debug('3D Templates {}'.format(self._3d_templates))
@@ -70,172 +86,847 @@ class CacheManager(QtCore.QObject):
     def clear_cache(self):
         self._2d_item_dict.clear()
         self._3d_item_dict.clear()
+        self._warm_entities.clear()
+        self._step_folder_dict.clear()
+        self._snapshot_groups.clear()
+
+    def release(self):
+        # Drop every item and stop reporting, used when the view is torn down
+        self.clear_cache()
+        self._walk_result = {}
+        self._ledger.remove_reporter('items', self._get_items_memory)
+
+    def get_disk_steps(self, shot_asset, item_type):
+        # Steps of an earlier pre-pass of the entity, empty when its step folders were not listed yet
+        if (item_type, shot_asset) not in self._step_folder_dict:
+            return []
+        return self._entity_steps(item_type, shot_asset)
+
+    def get_warm_items(self, shot_asset, item_type, version_limit=0, modified_window=None):
+        # Items of earlier scans of the entity, these can be shown without touching the disk.
+        # A relative window moved on since the scan, items without a version inside it any more are left out.
+        entity_key = (item_type, shot_asset, version_limit, modified_window)
+        window = templatewalker.resolve_window(modified_window)
+
+        items = []
+        for item_dict in (self._2d_item_dict, self._3d_item_dict):
+            step_dict = item_dict.get(entity_key, {})
+            for step in self.get_disk_steps(shot_asset, item_type):
+                for item in step_dict.get(step, []):
+                    if window and item.get_modified() is not None and not templatewalker.in_window(item.get_modified(), window):
+                        continue
+                    items.append(item)
+        return items
+
+    def is_warm(self, shot_asset, item_type, version_limit=0, modified_window=None):
+        if (item_type, shot_asset) not in self._step_folder_dict:
+            return False
+
+        entity_key = (item_type, shot_asset, version_limit, modified_window)
+        for item_dict in (self._2d_item_dict, self._3d_item_dict):
+            step_dict = item_dict.get(entity_key, {})
+            for step in self.get_disk_steps(shot_asset, item_type):
+                if step not in step_dict:
+                    return False
+        return True
 
-    def set_thread_variables(self, shot_asset, item_type, step_filters, type_filters, search_text):
+    def get_filesystem(self):
+        return self._filesystem
+
+    def set_thread_variables(self, shot_assets, item_type, version_limit=0, modified_window=None):
+        # modified_window is (since, until) in seconds since the epoch or ('relative', hours), folders outside of it are not scanned.
+        # Warm entities are kept under the window as given, the scan itself uses the window resolved when it starts.
         self._thread_var = {
-            'item_name': shot_asset,
+            'item_names': shot_assets,
             'item_type': item_type,
-            'step_filters': step_filters,
-            'type_filters': type_filters,
-            'search_text': search_text
+            'steps': [],
+            'version_limit': version_limit,
+            'modified_window': modified_window,
+            'scan_window': templatewalker.resolve_window(modified_window)
         }
+        self._abort = False
+
+    def set_load_more(self, placeholder):
+        # The next run of the thread loads the older versions behind the placeholder instead of scanning
+        self._thread_var['load_more'] = placeholder
+        self._abort = False
+
+    def cancel(self):
+        # Called from the ui thread, the scan stops at the next folder or template it reaches
+        self._abort = True
 
     def get_caches(self):
-        # get all published paths for item
-        self._publishes = []
+        # The thread runs a single scan and is started again for the next one.
+        # A cancelled scan returns normally, so every shared listing it was computing is released.
+        self._scan_service.set_thread_cancelled(self._is_cancelled)
+        try:
+            if self._thread_var.get('load_more'):
+                self._load_older_versions(self._thread_var.pop('load_more'))
+            else:
+                self._scan()
+        except templatewalker.ScanCancelled:
+            self._app.log_debug('Scan of {} cancelled'.format(', '.join(self._thread_var['item_names'])))
+        finally:
+            self.thread().quit()
+
+    ############################################################################
+    # Private methods
 
-        for publish_file in self._app.shotgun.find('PublishedFile', [['project.Project.name', 'is', self._app.context.project['name']]], ['path']):
-            self._publishes.append(publish_file['path']['local_path'].replace('/', os.sep))
+    def _scan(self):
+        # Round trips are counted per scan, the filesystem is shared with the other views and threads of the app
+        self._filesystem.reset_thread_stats()
+        self._remote_directories = 0
+
+        # Cheap pre-pass over the step folders of the entities, only steps that exist on disk are expanded
+        steps = set()
+        for item_name in self._thread_var['item_names']:
+            steps.update(self._entity_steps(self._thread_var['item_type'], item_name))
+        self._thread_var['steps'] = sorted(steps)
+        self.steps_sig.emit(self._thread_var['steps'])
+
+        self._start_progress()
+
+        # All templates are walked at once, folders they share are listed a single time.
+        # Steps that are still warm for a single entity are left out of the walk.
+        walk_steps = self._thread_var['steps']
+        if len(self._thread_var['item_names']) == 1:
+            entity_key = (self._thread_var['item_type'], self._thread_var['item_names'][0], self._thread_var['version_limit'], self._thread_var['modified_window'])
+            walk_steps = [step for step in walk_steps if step not in self._2d_item_dict.get(entity_key, {}) or step not in self._3d_item_dict.get(entity_key, {})]
+        self._walk_templates(self._thread_var['item_names'], walk_steps)
+
+        # get all published paths for item, shared with the other views
+        self._publishes = self._scan_service.get_publishes()
+
+        # Multiple entities are scanned as an aggregate, grouped per entity
+        if len(self._thread_var['item_names']) > 1:
+            for item_name in self._thread_var['item_names']:
+                self._snapshot_groups[(self._thread_var['item_type'], item_name)] = {}
+
+            self._aggregate_caches()
+            self._save_snapshots()
+            self._log_filesystem_stats()
+            self._log_memory_usage()
+            self._report_degraded_mounts()
+            return
 
         # start main loop
-        for step, enabled in self._thread_var['step_filters'].items():
+        # All steps and types are scanned once, filtering happens on the scanned items in the ui.
+        # Steps that are still warm from an earlier scan of the entity are skipped.
+        item_type = self._thread_var['item_type']
+        item_name = self._thread_var['item_names'][0]
+
+        entity_key = (item_type, item_name, self._thread_var['version_limit'], self._thread_var['modified_window'])
+        self._touch_warm_entity(entity_key)
+
+        item_dict_2d = self._2d_item_dict.setdefault(entity_key, {})
+        item_dict_3d = self._3d_item_dict.setdefault(entity_key, {})
+
+        # Groups of warm steps are kept from the scan that found them, a scan without warm steps starts over
+        if not item_dict_2d and not item_dict_3d:
+            self._snapshot_groups[(item_type, item_name)] = {}
+
+        for step in self._thread_var['steps']:
+            self._check_cancelled()
             ui_fields = {
-                self._thread_var['item_type']: self._thread_var['item_name'],
+                item_type: item_name,
                 'Step': step}
 
-            if enabled and self._thread_var['type_filters']['2D']:
-                if step in self._2d_item_dict:
-                    self._set_hidden(False, self._2d_item_dict[step], self._thread_var['search_text'])
-                else:
-                    self._2d_item_dict[step] = self._caches_from_templates(self._2d_templates[self._thread_var['item_type']], ui_fields, self._thread_var['search_text'])
-            elif step in self._2d_item_dict:
-                self._set_hidden(True, self._2d_item_dict[step], self._thread_var['search_text'])
+            if step not in item_dict_2d:
+                item_dict_2d[step] = self._caches_from_templates(self._step_templates(self._2d_templates[item_type], item_type, item_name, step), ui_fields, '2D')
 
-            if enabled and self._thread_var['type_filters']['3D']:
-                if step in self._3d_item_dict:
-                    self._set_hidden(False, self._3d_item_dict[step], self._thread_var['search_text'])
-                else:
-                    self._3d_item_dict[step] = self._caches_from_templates(self._3d_templates[self._thread_var['item_type']], ui_fields, self._thread_var['search_text'])
-            elif step in self._3d_item_dict:
-                self._set_hidden(True, self._3d_item_dict[step], self._thread_var['search_text'])
+            if step not in item_dict_3d:
+                item_dict_3d[step] = self._caches_from_templates(self._step_templates(self._3d_templates[item_type], item_type, item_name, step), ui_fields, '3D')
 
-        self.thread().terminate()
+        # A scan that skipped a storage root is not kept warm, the entity is scanned again when it is shown next
+        if self._scan_service.get_degraded():
+            self._warm_entities.pop(entity_key, None)
+            self._2d_item_dict.pop(entity_key, None)
+            self._3d_item_dict.pop(entity_key, None)
+        else:
+            self._warm_entities[entity_key] = self._items_memory(entity_key)
+            self._evict_warm_entities(entity_key)
+        self._save_snapshots()
 
-    ############################################################################
-    # Private methods
+        self._log_filesystem_stats()
+        self._log_memory_usage()
+        self._report_degraded_mounts()
+
+    def _check_cancelled(self):
+        if self._abort:
+            raise templatewalker.ScanCancelled()
 
-    def _caches_from_templates(self, templates, ui_fields, search_text):
+    def _caches_from_templates(self, templates, ui_fields, dimension):
         items = []
         for template_dict in templates:
+            self._check_cancelled()
             template = template_dict['cache_template']
             self._app.log_debug('Searching Template {}'.format(template))
             self._app.log_debug('With Fields {}'.format(ui_fields))
             
-            cache_paths = self._app.sgtk.abstract_paths_from_template(template, ui_fields)
-            self._app.log_debug('Found caches {}'.format(cache_paths))
-            
-            # different logic for renders
-            if 'AOV' in template.keys and 'RenderLayer' in template.keys:
-                # sort paths
-                cache_paths.sort()
+            parsed, skipped_versions = self._find_caches(template, ui_fields)
+            self._app.log_debug('Found caches {}'.format([cache_path for cache_path, fields in parsed]))
+
+            groups = aggregate.group_paths(parsed, self._is_render_template(template), self._thread_var['version_limit'])
+            template_items = self._items_from_groups(groups, template_dict, dimension, ui_fields, skipped_versions)
+
+            # Resolve linked files in bulk before the items reach the ui thread
+            self._resolve_links(template_items)
 
-                # Add caches to tree
-                top_level_item = None
+            for top_level_item in template_items:
+                self.add_item_sig.emit(top_level_item)
+                items.append(top_level_item)
+
+            self._progress.template_done(self._directories_listed(), len(template_items))
+            self.progress_sig.emit(self._progress.as_dict())
+        return items
+
+    def _aggregate_caches(self):
+        item_type = self._thread_var['item_type']
+
+        # Every step and template combination gets its own index, paths of different steps are never grouped together
+        templates = []
+        for step in self._thread_var['steps']:
+            for dimension, dimension_templates in (('2D', self._2d_templates[item_type]), ('3D', self._3d_templates[item_type])):
+                for template_dict in dimension_templates:
+                    templates.append({'template_dict': template_dict, 'dimension': dimension, 'step': step})
+
+        job_templates = []
+        for index, template in enumerate(templates):
+            job_templates.append(self._describe_template(index, template['template_dict']['cache_template']))
+
+        # Entities are listed, parsed and grouped one after the other, only one entity is held in memory before it is added.
+        # Version folders skipped by the listing, per entity and template index
+        self._skipped_versions = {}
+
+        for item_name in self._thread_var['item_names']:
+            self._check_cancelled()
+            job = {
+                'entity': item_name,
+                'templates': job_templates,
+                'parsed': {},
+                'version_limit': self._thread_var['version_limit']
+            }
+
+            self._skipped_versions[item_name] = {}
+            for index, template in enumerate(templates):
+                self._check_cancelled()
+
+                # Steps without a folder for this entity are not expanded
+                if not self._has_step_folder(template['template_dict']['cache_template'], item_type, item_name, template['step']):
+                    continue
+
+                ui_fields = {item_type: item_name, 'Step': template['step']}
+                parsed, skipped_versions = self._find_caches(template['template_dict']['cache_template'], ui_fields)
+                if parsed:
+                    job['parsed'][index] = parsed
+                    self._skipped_versions[item_name][index] = skipped_versions
+
+                self._progress.template_done(self._directories_listed())
+                self.progress_sig.emit(self._progress.as_dict())
+
+            self._add_entity(aggregate.group_entity(job), templates)
+
+    def _add_entity(self, result, templates):
+        entity_item = treeitems.EntityTreeItem(result['entity'], self._column_names)
+        skipped_versions = self._skipped_versions.pop(result['entity'], {})
+
+        groups_by_template = collections.defaultdict(list)
+        for group in result['groups']:
+            groups_by_template[group['template']].append(group)
+
+        for index in sorted(groups_by_template.keys()):
+            template = templates[index]
+            ui_fields = {self._thread_var['item_type']: result['entity'], 'Step': template['step']}
+            cache_items = self._items_from_groups(groups_by_template[index], template['template_dict'], template['dimension'], ui_fields, skipped_versions.get(index))
+            self._resolve_links(cache_items)
+            entity_item.addChildren(cache_items)
+
+        if entity_item.childCount():
+            entity_item.post_process()
+            self.add_entity_item_sig.emit(entity_item)
+
+            self._progress.add_items(entity_item.childCount(), self._directories_listed())
+            self.progress_sig.emit(self._progress.as_dict())
+
+    def _describe_template(self, index, template):
+        return {
+            'index': index,
+            'is_render': self._is_render_template(template)
+        }
+
+    def _start_progress(self):
+        # One unit of progress per template that is listed, warm steps of a single entity are not listed again
+        item_type = self._thread_var['item_type']
+
+        total = 0
+        if len(self._thread_var['item_names']) > 1:
+            for item_name in self._thread_var['item_names']:
+                for step in self._thread_var['steps']:
+                    total += len(self._step_templates(self._2d_templates[item_type], item_type, item_name, step))
+                    total += len(self._step_templates(self._3d_templates[item_type], item_type, item_name, step))
+        else:
+            item_name = self._thread_var['item_names'][0]
+            entity_key = (item_type, item_name, self._thread_var['version_limit'], self._thread_var['modified_window'])
+            for step in self._thread_var['steps']:
+                if step not in self._2d_item_dict.get(entity_key, {}):
+                    total += len(self._step_templates(self._2d_templates[item_type], item_type, item_name, step))
+                if step not in self._3d_item_dict.get(entity_key, {}):
+                    total += len(self._step_templates(self._3d_templates[item_type], item_type, item_name, step))
+
+        self._progress = scanprogress.ScanProgress(total, self._directories_listed())
+        self.progress_sig.emit(self._progress.as_dict())
+
+    def _directories_listed(self):
+        return self._filesystem.get_thread_stats()['misses'] + self._remote_directories
+
+    def _entity_steps(self, item_type, item_name):
+        steps = set()
+        for folder_steps in self._step_folders(item_type, item_name).values():
+            # Templates without a step folder can not be pruned, these are expanded for every step of the site
+            if folder_steps is None:
+                steps.update(self._site_steps())
+            else:
+                steps.update(folder_steps)
+        return sorted(steps)
+
+    def _step_folders(self, item_type, item_name):
+        # Steps on disk per cache template name, None for templates whose steps can not be listed
+        key = (item_type, item_name)
+        if key not in self._step_folder_dict:
+            listed = {}
+            step_folders = {}
+            for template_dict in self._2d_templates[item_type] + self._3d_templates[item_type]:
+                template = template_dict['cache_template']
+                step_template = self._step_folder_template(template)
+                if step_template is None:
+                    step_folders[template.name] = None
+                    continue
+
+                # Templates below the same step folder share a single listing.
+                # Parent templates have no name, the folder is known by its root and definition.
+                step_key = (step_template.root_path, step_template.definition)
+                if step_key not in listed:
+                    listed[step_key] = self._list_step_folders(step_template, item_type, item_name)
+                step_folders[template.name] = listed[step_key]
+
+            self._step_folder_dict[key] = step_folders
+        return self._step_folder_dict[key]
+
+    def _step_folder_template(self, template):
+        # Highest parent template that still contains the step, None when the step is only part of the file name
+        step_template = None
+        parent = template.parent
+        while parent is not None and 'Step' in parent.keys:
+            step_template = parent
+            parent = parent.parent
+        return step_template
+
+    def _list_step_folders(self, step_template, item_type, item_name):
+        entity_template = step_template.parent
+        if entity_template is None:
+            return None
+
+        steps = set()
+        for entity_path in self._abstract_paths(entity_template, {item_type: item_name}):
+            for name in self._filesystem.listdir(entity_path) or []:
+                try:
+                    fields = step_template.get_fields(os.path.join(entity_path, name))
+                except sgtk.TankError:
+                    continue
+
+                if fields.get('Step'):
+                    steps.add(fields['Step'])
+        return steps
+
+    def _has_step_folder(self, template, item_type, item_name, step):
+        steps = self._step_folders(item_type, item_name).get(template.name)
+        return steps is None or step in steps
+
+    def _step_templates(self, templates, item_type, item_name, step):
+        return [template_dict for template_dict in templates if self._has_step_folder(template_dict['cache_template'], item_type, item_name, step)]
+
+    def _site_steps(self):
+        if self._site_step_list is None:
+            shotgun_list = self._app.shotgun.find("Step", [], ['short_name'])
+            self._site_step_list = sorted(set(step['short_name'] for step in shotgun_list))
+        return self._site_step_list
+
+    def _is_render_template(self, template):
+        return 'AOV' in template.keys and 'RenderLayer' in template.keys
+
+    def _item_fields(self, cache_path, fields, template_dict, dimension):
+        fields = fields.copy()
+        fields['templates'] = template_dict
+        fields['dimension'] = dimension
+        fields['published'] = cache_path in self._publishes
+        return fields
+
+    def _touch_warm_entity(self, entity_key):
+        self._warm_entities[entity_key] = self._warm_entities.pop(entity_key, 0)
+        self._evict_warm_entities(entity_key)
+
+    def _evict_warm_entities(self, entity_key):
+        # Forget the least recently used entities, the entity that is scanned now always stays
+        while len(self._warm_entities) > 1:
+            if len(self._warm_entities) <= self._warm_entity_count and not self._ledger.over_budget('items'):
+                break
+
+            old_key = next(iter(self._warm_entities))
+            if old_key == entity_key:
+                break
+
+            del self._warm_entities[old_key]
+            self._2d_item_dict.pop(old_key, None)
+            self._3d_item_dict.pop(old_key, None)
+            self._step_folder_dict.pop(old_key[:2], None)
+            self._snapshot_groups.pop(old_key[:2], None)
+            self._warm_evictions += 1
+
+    def _items_memory(self, entity_key):
+        size = 0
+        for item_dict in (self._2d_item_dict, self._3d_item_dict):
+            for items in item_dict.get(entity_key, {}).values():
+                for item in items:
+                    size += item.get_memory_size()
+        return size
+
+    def _get_items_memory(self):
+        return sum(self._warm_entities.values()), len(self._warm_entities), self._warm_evictions
+
+    def _walk_templates(self, item_names, steps):
+        # Matches per template name, entity and step, templates that can not be walked are expanded on their own
+        self._walk_result = {}
+        if not steps:
+            return
+
+        item_type = self._thread_var['item_type']
+        fixed_fields = {item_type: set(item_names), 'Step': set(steps)}
+        walker = templatewalker.TemplateWalker(fixed_fields)
+
+        walked = []
+        walk_templates = []
+        for template_dict in self._2d_templates[item_type] + self._3d_templates[item_type]:
+            template = template_dict['cache_template']
+            if template in walked or item_type not in template.keys or 'Step' not in template.keys:
+                continue
+
+            key_types, sequence_formats = self._walk_key_types(template)
+            if key_types and walker.add_template(len(walked), template.root_path, template.definition, key_types, sequence_formats):
+                walk_templates.append({
+                    'index': len(walked),
+                    'root_path': template.root_path,
+                    'definition': template.definition,
+                    'key_types': key_types,
+                    'sequence_formats': sequence_formats
+                })
+                walked.append(template)
+
+        if not walked:
+            return
+
+        self._last_progress_emit = time.time()
+        modified_window = self._thread_var['scan_window']
+        walk = lambda: walker.walk(self._filesystem.listdir, self._thread_var['version_limit'], self._walk_progress, self._filesystem.stat, modified_window, self._is_cancelled)
+
+        # The same walk for the scan daemon, which walks it once for every Explorer on the workstation
+        walk_job = {
+            'templates': walk_templates,
+            'fixed_fields': dict((key, sorted(values)) for key, values in fixed_fields.items()),
+            'version_limit': self._thread_var['version_limit'],
+            'modified_window': modified_window
+        }
+        matches, skipped = self._scan_service.walk_templates(
+            [template.name for template in walked], fixed_fields, self._thread_var['version_limit'], walk, walk_job, self._walk_progress, modified_window)
+
+        for index, template in enumerate(walked):
+            for item_name in item_names:
+                for step in steps:
+                    self._walk_result[(template.name, item_name, step)] = ([], [])
+
+            for cache_path, fields in matches.get(index, []):
+                result = self._walk_result.get((template.name, fields.get(item_type), fields.get('Step')))
+                if result is not None and self._valid_fields(template, fields):
+                    result[0].append((cache_path, fields))
+
+            for version_fields in skipped.get(index, []):
+                result = self._walk_result.get((template.name, version_fields.get(item_type), version_fields.get('Step')))
+                if result is not None:
+                    result[1].append(version_fields)
+
+        self._app.log_debug('Walked {} templates in a single pass'.format(len(walked)))
+
+    def _walk_key_types(self, template):
+        # Key types for the walker, None for templates with keys the walker does not know
+        key_types = {}
+        sequence_formats = {}
+        for key_name, key in template.keys.items():
+            key_class = type(key).__name__
+            if key_class == 'SequenceKey':
+                key_types[key_name] = 'sequence'
+                try:
+                    sequence_formats[key_name] = key.str_from_value('FORMAT: %d')
+                except sgtk.TankError:
+                    sequence_formats[key_name] = '%04d'
+            elif key_class == 'IntegerKey':
+                key_types[key_name] = 'integer'
+            elif key_class == 'StringKey':
+                key_types[key_name] = 'string'
+            else:
+                return None, None
+        return key_types, sequence_formats
+
+    def _valid_fields(self, template, fields):
+        # The walker matches any folder name, the keys still apply their own filters and choices
+        for key_name, value in fields.items():
+            key = template.keys.get(key_name)
+            if key is not None and type(key).__name__ == 'StringKey' and not key.validate(value):
+                return False
+        return True
+
+    def _is_cancelled(self):
+        return self._abort
+
+    def _walk_progress(self, remote_directories=0):
+        # Called for every folder the walker lists, or with the folders the scan daemon listed since its last message.
+        # The progress is sent a few times per second, a walk streamed by the scan daemon is cancelled here.
+        if remote_directories:
+            self._check_cancelled()
+        self._remote_directories += remote_directories
+        now = time.time()
+        if now - self._last_progress_emit > 0.2:
+            self._last_progress_emit = now
+            self._progress.add_items(0, self._directories_listed())
+            self.progress_sig.emit(self._progress.as_dict())
+
+    def _find_caches(self, template, ui_fields):
+        # Paths with their fields, from the walk when the template was walked
+        walked = self._walk_result.get((template.name, ui_fields[self._thread_var['item_type']], ui_fields['Step']))
+        if walked is not None:
+            return walked
+
+        cache_paths, skipped_versions = self._list_cache_paths(template, ui_fields)
+        return [(cache_path, template.get_fields(cache_path)) for cache_path in cache_paths], skipped_versions
+
+    def _list_cache_paths(self, template, ui_fields):
+        # Listings are shared between views, a view asking for a listing that is in flight waits for it
+        return self._scan_service.list_cache_paths(template, ui_fields, self._thread_var['version_limit'], self._walk_cache_paths, self._thread_var['scan_window'])
+
+    def _walk_cache_paths(self, template, ui_fields):
+        # With a version limit or modified window and a template that stores versions in their own folder,
+        # the version folders are listed first and only the newest ones inside the window are walked.
+        version_limit = self._thread_var['version_limit']
+        modified_window = self._thread_var['scan_window']
+        version_template = self._version_folder_template(template)
+        if not (version_limit or modified_window) or not version_template:
+            return self._abstract_paths(template, ui_fields), []
+
+        version_folders = collections.defaultdict(list)
+        for version_path in self._abstract_paths(version_template, ui_fields):
+            if modified_window:
+                stat_result = self._filesystem.stat(version_path)
+                if stat_result is not None and not templatewalker.in_window(stat_result.st_mtime, modified_window):
+                    continue
+
+            version_fields = version_template.get_fields(version_path)
+            key = tuple(aggregate.group_key(version_fields, ('version',)))
+            version_folders[key].append(version_fields)
+
+        cache_paths = []
+        skipped_versions = []
+        for folders in version_folders.values():
+            folders.sort(key=lambda k: k['version'])
+            skipped_versions.extend(folders[:-version_limit])
+
+            for version_fields in folders[-version_limit:]:
+                fields = ui_fields.copy()
+                fields.update(version_fields)
+                cache_paths.extend(self._abstract_paths(template, fields))
+
+        return cache_paths, skipped_versions
+
+    def _version_folder_template(self, template):
+        # Highest parent template that still contains the version, None when the version is only part of the file name
+        version_template = None
+        parent = template.parent
+        while parent is not None and 'version' in parent.keys:
+            version_template = parent
+            parent = parent.parent
+        return version_template
+
+    def _items_from_groups(self, groups, template_dict, dimension, ui_fields, skipped_versions=None):
+        is_render = self._is_render_template(template_dict['cache_template'])
+
+        # Folders of all versions are read in parallel before the items check them one by one
+        directories = set()
+        for group in groups:
+            for version in group['versions']:
+                for cache_path, fields in version['entries']:
+                    directories.add(os.path.dirname(cache_path))
+        self._filesystem.prefetch(directories)
+
+        items = []
+        for group in groups:
+            if not group['versions']:
+                continue
+
+            top_level_item = self._top_level_item(group['versions'][0]['entries'][0], template_dict, dimension, is_render)
+            top_level_item.addChildren(self._version_items(group['versions'], template_dict, dimension, is_render))
+
+            # Only add top level item if it has children
+            if not top_level_item.childCount():
+                continue
+
+            top_level_item.post_process()
+            # Versions outside of the modified window were not scanned either, they are not gone
+            limited = self._add_load_more(top_level_item, group, template_dict, dimension, ui_fields, skipped_versions)
+            limited = limited or bool(self._thread_var['scan_window'])
+            self._record_group(top_level_item, group, template_dict, is_render, ui_fields, limited)
+            items.append(top_level_item)
+        return items
+
+    def _record_group(self, top_level_item, group, template_dict, is_render, ui_fields, limited):
+        # The change of the group since the baseline is a facet of the item, the group itself goes into the next snapshot
+        entity_key = (self._thread_var['item_type'], ui_fields[self._thread_var['item_type']])
+
+        first_fields = group['versions'][0]['entries'][0][1]
+        group_key = json.dumps([template_dict['cache_template'].name, aggregate.group_key(first_fields, aggregate.group_ignore_keys(is_render))])
+
+        # Folder mtimes come from the stats the scan already cached
+        versions = {}
+        for version in group['versions']:
+            for cache_path, fields in version['entries']:
+                stat_result = self._filesystem.stat(os.path.dirname(cache_path))
+                versions[cache_path] = (version['version'], stat_result.st_mtime if stat_result else None)
+
+        mtimes = [mtime for version, mtime in versions.values() if mtime is not None]
+        top_level_item.set_modified(max(mtimes) if mtimes else None)
+
+        record = snapshots.group_record(versions, limited)
+        self._snapshot_groups.setdefault(entity_key, {})[group_key] = record
+
+        baseline = self._get_baseline(entity_key)['groups']
+        top_level_item.set_change(snapshots.group_change(baseline.get(group_key) if baseline is not None else None, record))
+
+    def _get_baseline(self, entity_key):
+        if entity_key not in self._baselines:
+            self._baselines[entity_key] = {
+                'groups': self._snapshots.load(*entity_key),
+                'time': self._snapshots.get_time(*entity_key)
+            }
+        return self._baselines[entity_key]
+
+    def _save_snapshots(self):
+        # Changes of the scanned entities since the baseline, including the caches that are gone
+        item_type = self._thread_var['item_type']
+        for item_name in self._thread_var['item_names']:
+            entity_key = (item_type, item_name)
+            if entity_key not in self._snapshot_groups:
+                continue
+
+            groups = self._snapshot_groups[entity_key]
+            baseline = self._get_baseline(entity_key)
+
+            # Groups without a version in the modified window or on a storage root that did not answer were not scanned,
+            # they keep their record of the baseline
+            if (self._thread_var['scan_window'] or self._scan_service.get_degraded()) and baseline['groups']:
+                scanned_groups = groups
+                groups = dict(baseline['groups'])
+                groups.update(scanned_groups)
+
+            self.changes_sig.emit({
+                'entity': item_name,
+                'item_type': item_type,
+                'since': baseline['time'],
+                'changes': snapshots.diff(baseline['groups'], groups)
+            })
+
+            try:
+                self._snapshots.save(item_type, item_name, groups)
+            except (IOError, OSError) as e:
+                self._app.log_warning('Could not store the scan snapshot of {}: {}'.format(item_name, e))
+
+    def _top_level_item(self, entry, template_dict, dimension, is_render):
+        cache_path, fields = entry
+        fields = self._item_fields(cache_path, fields, template_dict, dimension)
+
+        # Create copy of fields without the keys that differ between the children
+        fields_no_ver = fields.copy()
+        fields_no_ver.pop('version', None)
+        fields_no_ver.pop('published', None)
+
+        if is_render:
+            fields_no_ver.pop('AOV', None)
+            fields_no_ver['isrendertoplevel'] = True
+            fields_no_ver['isversion'] = False
+            return treeitems.RenderTopLevelTreeItem(cache_path, fields_no_ver, self._column_names)
+
+        return treeitems.TopLevelTreeItem(cache_path, fields_no_ver, self._column_names)
+
+    def _version_items(self, versions, template_dict, dimension, is_render):
+        items = []
+        for version in versions:
+            if is_render:
                 version_item = None
-                aov_item = None
+                for cache_path, fields in version['entries']:
+                    fields = self._item_fields(cache_path, fields, template_dict, dimension)
 
-                for cache_path in cache_paths:
-                    fields = template.get_fields(cache_path)
-                    fields['templates'] = template_dict
-                    
                     # Fields for toplevel items
                     fields['isrendertoplevel'] = False
                     fields['isversion'] = False
-                    fields['published'] = cache_path in self._publishes
-                    
-                    # Create copy of fields to compare against, remove keys that can not be the same
-                    fields_no_ver = fields.copy()
-                    fields_no_ver.pop('version', None)
-                    fields_no_ver.pop('published', None)
-                    fields_no_ver.pop('AOV', None)
-                    fields_no_ver['isrendertoplevel'] = True
-
-                    if not top_level_item or top_level_item.get_fields() != fields_no_ver:
-                        if top_level_item and top_level_item.childCount():
-                            for index in range(top_level_item.childCount()):
-                                top_level_item.child(index).post_process()
-                            top_level_item.post_process()
-
-                            self.add_item_sig.emit(top_level_item)
-                            items.append(top_level_item)
-
-                        top_level_item = treeitems.RenderTopLevelTreeItem(cache_path, fields_no_ver, self._column_names)
-                        version_item = None
-
-                    if not version_item or version_item.get_fields()['version'] != fields['version']:
+
+                    if not version_item:
                         render_layer_fields = fields.copy()
                         render_layer_fields['isversion'] = True
                         version_item = treeitems.RenderTopLevelTreeItem(cache_path, render_layer_fields, self._column_names)
 
-                        top_level_item.addChild(version_item)
-                        
-                    aov_item = treeitems.AovTreeItem(cache_path, fields, self._column_names)
+                    aov_item = treeitems.AovTreeItem(cache_path, fields, self._column_names, self._dir_ctime(cache_path))
                     version_item.addChild(aov_item)
 
-                # Add the last element
-                if top_level_item and top_level_item.childCount():
-                    for index in range(top_level_item.childCount()):
-                        top_level_item.child(index).post_process()
-                    top_level_item.post_process()
-
-                    self.add_item_sig.emit(top_level_item)
-                    items.append(top_level_item)
-
-            # regular tree adding logic
+                if version_item:
+                    version_item.post_process()
+                    items.append(version_item)
             else:
-                # Sort based on basename of path instead of complete path
-                # This fixes some elements not being merged in the treeview
-                sort_list = []
-                for path in cache_paths:
-                    sort_list.append({'basename': os.path.basename(path), 'path': path})
-
-                sorted_list = sorted(sort_list, key=lambda k: k['basename'])
-
-                cache_paths = []
-                for item in sorted_list:
-                    cache_paths.append(item['path'])
-
-                # Add caches to tree
-                top_level_item = None
-                for cache_path in cache_paths:
-                    fields = template.get_fields(cache_path)
-                    fields['templates'] = template_dict
-                    fields['published'] = cache_path in self._publishes
-
-                    # Create copy of fields to compare against, remove keys that can not be the same
-                    fields_no_ver = fields.copy()
-                    fields_no_ver.pop('version', None)
-                    fields_no_ver.pop('published', None)
-
-                    if not top_level_item or top_level_item.get_fields() != fields_no_ver:
-                        # Only add top level item if it has children
-                        if top_level_item and top_level_item.childCount():
-                            top_level_item.post_process()
-                            self.add_item_sig.emit(top_level_item)
-                            items.append(top_level_item)
-
-                        top_level_item = treeitems.TopLevelTreeItem(cache_path, fields_no_ver, self._column_names)
+                for cache_path, fields in version['entries']:
+                    fields = self._item_fields(cache_path, fields, template_dict, dimension)
 
                     # Check if valid cache (remove duplicates when checking with templates that have and don't have {SEQ} key)
-                    if ('%04d' in cache_path and len(glob.glob(cache_path.replace('%04d', '*')))) or os.path.exists(cache_path):
-                        item = treeitems.TreeItem(cache_path, fields, self._column_names)
-                        top_level_item.addChild(item)
-
-                # Add the last element
-                if top_level_item and top_level_item.childCount():
-                    top_level_item.post_process()
-                    self.add_item_sig.emit(top_level_item)
-                    items.append(top_level_item)
+                    token = integrity.frame_token(os.path.basename(cache_path))
+                    if (token and len(self._filesystem.glob(cache_path.replace(token, '*')))) or self._filesystem.exists(cache_path):
+                        items.append(treeitems.TreeItem(cache_path, fields, self._column_names, self._dir_ctime(cache_path)))
         return items
 
-    def _set_hidden(self, hidden, cache_dict, search_text):
-        for item in cache_dict:
-            current_hidden_var = item.isHidden()
-
-            new_hidden_var = hidden
-            if search_text and search_text.lower() not in item.get_path().lower():
-                new_hidden_var = True
-
-            if current_hidden_var != new_hidden_var:
-                item.setHidden(new_hidden_var)
-                item.treeWidget().header().resizeSections(QtGui.QHeaderView.ResizeToContents)
\ No newline at end of file
+    def _add_load_more(self, top_level_item, group, template_dict, dimension, ui_fields, skipped_versions):
+        is_render = self._is_render_template(template_dict['cache_template'])
+        first_fields = group['versions'][0]['entries'][0][1]
+
+        # Skipped version folders that belong to this item
+        skipped = []
+        for version_fields in skipped_versions or []:
+            if all(first_fields.get(key) == value for key, value in version_fields.items() if key != 'version'):
+                skipped.append(version_fields)
+
+        if not group['older_versions'] and not skipped:
+            return False
+
+        top_level_item.addChild(treeitems.LoadMoreTreeItem(self._column_names, {
+            'template_dict': template_dict,
+            'dimension': dimension,
+            'ui_fields': ui_fields,
+            'older_versions': group['older_versions'],
+            'skipped_versions': skipped,
+            'group_key': aggregate.group_key(first_fields, aggregate.group_ignore_keys(is_render))
+        }))
+        return True
+
+    def _load_older_versions(self, placeholder):
+        data = placeholder.get_data()
+        template = data['template_dict']['cache_template']
+        is_render = self._is_render_template(template)
+
+        versions = list(data['older_versions'])
+
+        # Walk the version folders that were skipped by the scan, keeping only the paths of this item
+        parsed = []
+        for version_fields in data['skipped_versions']:
+            fields = data['ui_fields'].copy()
+            fields.update(version_fields)
+
+            for cache_path in self._abstract_paths(template, fields):
+                cache_fields = template.get_fields(cache_path)
+                if aggregate.group_key(cache_fields, aggregate.group_ignore_keys(is_render)) == data['group_key']:
+                    parsed.append((cache_path, cache_fields))
+
+        for group in aggregate.group_paths(parsed, is_render):
+            versions.extend(group['versions'])
+        versions.sort(key=lambda k: k['version'])
+
+        items = self._version_items(versions, data['template_dict'], data['dimension'], is_render)
+        self._resolve_links(items)
+        self.older_versions_sig.emit(placeholder, items)
+
+    def _resolve_links(self, items):
+        leaf_items = []
+        for item in items:
+            if isinstance(item, treeitems.TreeItem):
+                leaf_items.append(item)
+            else:
+                leaf_items.extend(treeitems.get_leaf_items(item))
+
+        # Candidate links of all items first, so their folders can be read in parallel
+        candidates = []
+        directories = set()
+        for item in leaf_items:
+            fields = item.get_fields()
+            templates = fields.get('templates')
+
+            work_paths = []
+            preview_path = None
+            if templates:
+                for work_template in templates['work_template']:
+                    path = self._apply_link_template(work_template, fields)
+                    if path:
+                        work_paths.append(path)
+                        directories.add(os.path.dirname(path))
+
+                if templates['preview_template']:
+                    preview_path = self._apply_link_template(templates['preview_template'], fields)
+                    if preview_path:
+                        directories.add(os.path.dirname(preview_path))
+
+            candidates.append((item, work_paths, preview_path))
+
+        self._filesystem.prefetch(directories)
+
+        for item, work_paths, preview_path in candidates:
+            links = []
+            for path in work_paths:
+                if self._filesystem.exists(path):
+                    links.append((path, self._dir_ctime(path), False))
+                    break
+
+            if preview_path and self._filesystem.exists(preview_path):
+                links.append((preview_path, self._dir_ctime(preview_path), True))
+
+            item.set_links(links)
+
+    def _apply_link_template(self, template, fields):
+        try:
+            return template.apply_fields(fields)
+        except sgtk.TankError as e:
+            self._app.log_debug('Could not resolve link {} with fields {}: {}'.format(template, fields, e))
+            return None
+
+    def _dir_ctime(self, path):
+        stat_result = self._filesystem.stat(os.path.dirname(path))
+        return stat_result.st_ctime if stat_result else None
+
+    def _abstract_paths(self, template, fields):
+        # sgtk lists the folders itself, the whole call runs under the call deadline of the storage root.
+        # A root that does not answer in time is skipped like a missing folder and reported as degraded after the scan.
+        try:
+            return self._filesystem.run(template.root_path, self._app.sgtk.abstract_paths_from_template, (template, fields))
+        except ioscheduler.MountTimeout:
+            return []
+
+    def _report_degraded_mounts(self):
+        # Folders on these roots read as missing until a later call answers in time
+        degraded = self._scan_service.get_degraded()
+        for root in degraded:
+            self._app.log_warning('Storage root {} is not responding, its folders were skipped by the scan'.format(root))
+        self.degraded_sig.emit(degraded)
+
+    def _log_memory_usage(self):
+        for layer in self._ledger.get_report():
+            budget = diskusage.format_size(layer['budget']) if layer['budget'] else 'unbounded'
+            self._app.log_debug('Memory {}: {} in {} entries, budget {}, {} evicted'.format(
+                layer['layer'], diskusage.format_size(layer['bytes']), layer['entries'], budget, layer['evictions']))
+
+    def _log_filesystem_stats(self):
+        # Misses are the actual round trips to disk for this scan
+        stats = self._filesystem.get_thread_stats()
+        self._app.log_debug('Filesystem cache {} hits, {} misses for {}'.format(stats['hits'], stats['misses'], ', '.join(self._thread_var['item_names'])))
+
+        scheduler = self._filesystem.get_scheduler()
+        if scheduler:
+            for root, mount_stats in sorted(scheduler.get_stats().items()):
+                self._app.log_debug('Mount {} concurrency {}/{}, latency {}'.format(root, mount_stats['allowed'], mount_stats['limit'], mount_stats['latency']))
@@ -1,10 +1,22 @@
 class ColumnNames():
     def __init__(self):
-        self._nice_names = ('Thumbnail', 'Published', 'Name', 'Version', 'Type', 'Department', 'Last Modified')
-        self._prog_names = ('thumb', 'pub', 'name', 'ver', 'type', 'depart', 'modif')
+        self._nice_names = ('Thumbnail', 'Published', 'Name', 'Version', 'Type', 'Department', 'Last Modified', 'Size')
+        self._prog_names = ('thumb', 'pub', 'name', 'ver', 'type', 'depart', 'modif', 'size')
+
+        # Providers of the lazy columns by prog name, their values are only computed for the rows in view
+        self._providers = {}
+    def add_column(self, name, nice_name, provider):
+        # provider(paths) returns the text of the column for every path, it is called on the column thread
+        self._prog_names += (name,)
+        self._nice_names += (nice_name,)
+        self._providers[name] = provider
     def index_name(self, name):
         return self._prog_names.index(name)
     def name_to_nice(self, name):
         return self._nice_names[self._prog_names.index(name)]
     def get_nice_names(self):
         return self._nice_names
+    def get_lazy_names(self):
+        return [name for name in self._prog_names if name in self._providers]
+    def get_provider(self, name):
+        return self._providers[name]
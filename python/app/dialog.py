@@ -1,17 +1,24 @@
 import os
-import sys
+import datetime
 import collections
-import glob
-
-sys.path.append(r'\\server01\shared\sharedPython\modules\pyseq')
-import pyseq
 
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
 import cachemanager
 import columnnames
+import diskusage
+import entitylist
+import facets
+import headerprobes
+import headerresizer
 import iconmanager
+import integrity
+import lazycolumns
+import publishdetails
+import rvlauncher
+import scanprogress
+import snapshots
 import treeitems
 
 ###########################################################################
@@ -22,6 +29,11 @@ import treeitems
 ###########################################################################
 
 class AppDialog(QtGui.QWidget):
+    size_request_sig = QtCore.Signal(object, int)
+    integrity_request_sig = QtCore.Signal(object, int)
+    lazy_column_request_sig = QtCore.Signal(object, int)
+    header_probe_request_sig = QtCore.Signal(object, int)
+    publish_details_request_sig = QtCore.Signal(object, int)
 
     @property
     def hide_tk_title_bar(self):
@@ -37,6 +49,9 @@ class AppDialog(QtGui.QWidget):
         self.image_types = ('exr', 'jpg', 'dpx', 'png', 'tiff', 'tif', 'tga')
         self.movie_types = ('mov', 'mp4')
         self.tab_types = ('Shot', 'Asset')
+        self.facet_names = ('Step', 'Type', 'Extension', 'Published', 'Change')
+        self.optional_columns = ('pubdate', 'pubversion', 'pubdesc')
+        self.modified_windows = (('Any time', 0), ('Last 24 hours', 24), ('Last 7 days', 7 * 24), ('Last 30 days', 30 * 24), ('Custom range', -1))
 
         # most of the useful accessors are available through the Application class instance
         # it is often handy to keep a reference to this. You can get it via the following method:
@@ -44,9 +59,12 @@ class AppDialog(QtGui.QWidget):
 
         # Get Managers
         self._column_names = columnnames.ColumnNames()
-        self._icon_manager = iconmanager.IconManager(self._column_names, self.image_types, self.movie_types)
+        self._rv_launcher = rvlauncher.RvLauncher(self._current_sgtk)
 
-        self._cache_manager = cachemanager.CacheManager(self._current_sgtk, self._column_names, self.image_types, self.tab_types)
+        # Scan data and disk access are shared with the other Explorer panels and dialogs of the app
+        self._scan_service = self._current_sgtk.get_scan_service()
+        self._icon_manager = iconmanager.IconManager(self._column_names, self.image_types, self.movie_types, self._scan_service.get_memory_ledger())
+        self._cache_manager = cachemanager.CacheManager(self._current_sgtk, self._scan_service, self._column_names, self.image_types, self.tab_types)
 
         self._cache_thread = QtCore.QThread()
         self._cache_manager.moveToThread(self._cache_thread)
@@ -55,6 +73,92 @@ class AppDialog(QtGui.QWidget):
         self._cache_thread.finished.connect(self._set_done_gui)
 
         self._cache_manager.add_item_sig.connect(self.add_item_to_tree)
+        self._cache_manager.add_entity_item_sig.connect(self.add_entity_to_tree)
+        self._cache_manager.older_versions_sig.connect(self._add_older_versions)
+        self._cache_manager.progress_sig.connect(self._set_progress)
+        self._cache_manager.steps_sig.connect(self._set_steps)
+        self._cache_manager.changes_sig.connect(self._add_changes)
+        self._cache_manager.degraded_sig.connect(self._set_degraded_mounts)
+        self._pending_load_more = []
+        self._progress = None
+
+        # Refresh asked for while a scan was running, 'force' for the refresh button.
+        # The scan is cancelled and the refresh runs once its thread finished, the ui thread never waits for it.
+        self._pending_refresh = None
+
+        # Changes since the last session per scanned entity, for the changes view
+        self._changes = collections.OrderedDict()
+
+        # Disk usage is computed on its own thread and summed up the tree as it arrives
+        self._disk_usage = diskusage.DiskUsageManager(self._cache_manager.get_filesystem(), self._scan_service.get_memory_ledger())
+        self._disk_usage_thread = QtCore.QThread()
+        self._disk_usage.moveToThread(self._disk_usage_thread)
+
+        self.size_request_sig.connect(self._disk_usage.compute_sizes)
+        self._disk_usage.size_sig.connect(self._set_item_size)
+        self._disk_usage_thread.start()
+        self._scan_service.get_memory_ledger().add_reporter('records', self._disk_usage.get_memory)
+
+        self._size_items = collections.defaultdict(list)
+        self._total_size = 0
+
+        # Image sequences are checked for missing and broken frames on their own thread
+        self._integrity = integrity.IntegrityManager(self._cache_manager.get_filesystem(), self._current_sgtk.get_setting('integrity_outlier_ratio'), self._scan_service.get_memory_ledger())
+        self._integrity_thread = QtCore.QThread()
+        self._integrity.moveToThread(self._integrity_thread)
+
+        self.integrity_request_sig.connect(self._integrity.check_sequences)
+        self._integrity.result_sig.connect(self._set_item_integrity)
+        self._integrity_thread.start()
+        self._scan_service.get_memory_ledger().add_reporter('records', self._integrity.get_memory)
+
+        self._integrity_items = collections.defaultdict(list)
+        self._detail_item = None
+
+        # Extra columns are computed on their own thread, only for the rows in view
+        filesystem = self._cache_manager.get_filesystem()
+        self._column_names.add_column('range', 'Frame Range', lazycolumns.frame_range_provider(filesystem))
+        self._column_names.add_column('res', 'Resolution', lazycolumns.resolution_provider(filesystem, self.image_types))
+        self._column_names.add_column('user', 'Publisher', lazycolumns.publish_detail_provider(self._scan_service, 'user'))
+        self._column_names.add_column('pubdate', 'Published At', lazycolumns.publish_detail_provider(self._scan_service, 'date'))
+        self._column_names.add_column('pubversion', 'Shotgun Version', lazycolumns.publish_detail_provider(self._scan_service, 'version'))
+        self._column_names.add_column('pubdesc', 'Description', lazycolumns.publish_detail_provider(self._scan_service, 'description'))
+
+        self._lazy_columns = lazycolumns.LazyColumnManager(self._column_names, filesystem, self._scan_service.get_memory_ledger())
+        self._lazy_columns_thread = QtCore.QThread()
+        self._lazy_columns.moveToThread(self._lazy_columns_thread)
+
+        self.lazy_column_request_sig.connect(self._lazy_columns.compute_values)
+        self._lazy_columns.value_sig.connect(self._set_item_column_value)
+        self._lazy_columns_thread.start()
+        self._scan_service.get_memory_ledger().add_reporter('records', self._lazy_columns.get_memory)
+
+        self._lazy_items = collections.defaultdict(list)
+
+        # File headers of the detail item are read on their own thread, only the first kilobytes of a file are touched
+        self._header_probes = headerprobes.HeaderProbeManager(filesystem, self._scan_service.get_memory_ledger())
+        self._header_probes_thread = QtCore.QThread()
+        self._header_probes.moveToThread(self._header_probes_thread)
+
+        self.header_probe_request_sig.connect(self._header_probes.probe_paths)
+        self._header_probes.probe_sig.connect(self._set_detail_header)
+        self._header_probes_thread.start()
+        self._scan_service.get_memory_ledger().add_reporter('records', self._header_probes.get_memory)
+
+        # Publish metadata of the detail item is queried on its own thread, together with the other versions of its group
+        self._publish_details = publishdetails.PublishDetailManager(self._scan_service)
+        self._publish_details_thread = QtCore.QThread()
+        self._publish_details.moveToThread(self._publish_details_thread)
+
+        self.publish_details_request_sig.connect(self._publish_details.fetch_details)
+        self._publish_details.details_sig.connect(self._set_detail_publish)
+        self._publish_details_thread.start()
+
+        # Facet index over the scanned items, filters are applied on it without rescanning
+        self._facet_index = facets.FacetIndex(self.facet_names)
+        self._visible_mask = 0
+        self._search_mask_cache = (None, None)
+        self._unchecked_facet_values = collections.defaultdict(set)
 
         # Setup UI
         self._setup_ui()
@@ -73,9 +177,19 @@ class AppDialog(QtGui.QWidget):
         refresh_but = QtGui.QPushButton()
         refresh_but.setFixedSize(25, 25)
         refresh_but.setIcon(QtGui.QIcon(self._icon_manager.get_pixmap('refresh')))
-        refresh_but.clicked.connect(self._refresh)
+        refresh_but.clicked.connect(self._force_refresh)
+
+        changes_but = QtGui.QPushButton('Changes')
+        changes_but.setFixedHeight(25)
+        changes_but.clicked.connect(self._show_changes)
+
+        memory_but = QtGui.QPushButton('Memory')
+        memory_but.setFixedHeight(25)
+        memory_but.clicked.connect(self._show_memory_usage)
 
         upper_bar.addWidget(title_lab)
+        upper_bar.addWidget(changes_but)
+        upper_bar.addWidget(memory_but)
         upper_bar.addWidget(refresh_but)
 
         # Side layout
@@ -84,25 +198,87 @@ class AppDialog(QtGui.QWidget):
 
         project_label = QtGui.QLabel(self._current_sgtk.context.project['name'])
 
-        shot_list_widget = QtGui.QListWidget()
-        shot_list_widget.currentItemChanged.connect(self._shot_asset_selected)
+        # Shots and assets are loaded page by page into lazily populated models.
+        # Selecting multiple shots or assets, or a whole group, scans them as an aggregate.
+        group_fields = self._current_sgtk.get_setting('entity_group_fields') or {}
 
-        asset_list_widget = QtGui.QListWidget()
-        asset_list_widget.currentItemChanged.connect(self._shot_asset_selected)
+        self._entity_search = QtGui.QLineEdit()
+        self._entity_search.setPlaceholderText('Search...')
+        self._entity_search.textEdited.connect(self._filter_entities)
 
-        self._tab_list_widgets = collections.OrderedDict([(self.tab_types[0], shot_list_widget), (self.tab_types[1], asset_list_widget)])
+        self._entity_group_check = QtGui.QCheckBox('Group')
+        self._entity_group_check.toggled.connect(self._group_entities)
+
+        entity_search_layout = QtGui.QHBoxLayout()
+        entity_search_layout.addWidget(self._entity_search)
+        entity_search_layout.addWidget(self._entity_group_check)
 
         self._tab_widget = QtGui.QTabWidget()
-        self._tab_widget.addTab(shot_list_widget, self.tab_types[0])
-        self._tab_widget.addTab(asset_list_widget, self.tab_types[1])
+        self._entity_views = collections.OrderedDict()
+        for item_type in self.tab_types:
+            entity_view = QtGui.QTreeView()
+            entity_view.setHeaderHidden(True)
+            entity_view.setRootIsDecorated(False)
+            entity_view.setUniformRowHeights(True)
+            entity_view.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+            entity_view.setModel(entitylist.EntityModel(entitylist.group_label(group_fields.get(item_type)), entity_view))
+            entity_view.selectionModel().selectionChanged.connect(self._shot_asset_selected)
+
+            self._entity_views[item_type] = entity_view
+            self._tab_widget.addTab(entity_view, item_type)
         self._tab_widget.currentChanged.connect(self._refresh)
 
+        # Only the newest versions are shown, older ones are loaded on demand
+        version_limit_layout = QtGui.QHBoxLayout()
+        self._version_limit_spin = QtGui.QSpinBox()
+        self._version_limit_spin.setRange(0, 999)
+        self._version_limit_spin.setSpecialValueText('All')
+        self._version_limit_spin.setKeyboardTracking(False)
+        self._version_limit_spin.valueChanged.connect(self._shot_asset_selected)
+
+        version_limit_layout.addWidget(QtGui.QLabel('Latest versions'))
+        version_limit_layout.addWidget(self._version_limit_spin)
+
+        # Folders last modified outside of the window are pruned by the scan before they are listed
+        modified_layout = QtGui.QHBoxLayout()
+        self._modified_combo = QtGui.QComboBox()
+        for label, hours in self.modified_windows:
+            self._modified_combo.addItem(label)
+        self._modified_combo.currentIndexChanged.connect(self._modified_window_changed)
+
+        self._modified_from_edit = QtGui.QDateEdit(QtCore.QDate.currentDate().addDays(-7))
+        self._modified_to_edit = QtGui.QDateEdit(QtCore.QDate.currentDate())
+        for date_edit in (self._modified_from_edit, self._modified_to_edit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setVisible(False)
+            date_edit.dateChanged.connect(self._shot_asset_selected)
+
+        modified_layout.addWidget(QtGui.QLabel('Modified'))
+        modified_layout.addWidget(self._modified_combo)
+        modified_layout.addWidget(self._modified_from_edit)
+        modified_layout.addWidget(self._modified_to_edit)
+
         self._current_state_label = QtGui.QLabel('Done')
 
+        # Scan progress, items found so far stay in the tree while the scan continues
+        self._progress_bar = QtGui.QProgressBar()
+        self._progress_bar.setTextVisible(True)
+        self._progress_bar.setRange(0, 1)
+        self._progress_bar.setValue(0)
+        self._progress_bar.setFormat('')
+        self._progress_detail_label = QtGui.QLabel()
+        self._total_size_label = QtGui.QLabel()
+
+        # Storage roots the last scan skipped because they did not answer in time
+        self._degraded_label = QtGui.QLabel()
+        self._degraded_label.setWordWrap(True)
+        self._degraded_label.setStyleSheet('color: orange')
+        self._degraded_label.hide()
+
         filter_widget = QtGui.QLabel('Filters')
 
         self._step_list_widget = QtGui.QListWidget()
-        self._step_list_widget.itemChanged.connect(self._fill_treewidget)
+        self._step_list_widget.itemChanged.connect(self._apply_filters)
 
         filter_buttons = QtGui.QHBoxLayout()
 
@@ -115,15 +291,54 @@ class AppDialog(QtGui.QWidget):
         filter_buttons.addWidget(none_button)
 
         self._type_list_widget = QtGui.QListWidget()
-        self._type_list_widget.itemChanged.connect(self._fill_treewidget)
+        self._type_list_widget.itemChanged.connect(self._apply_filters)
+
+        self._extension_list_widget = QtGui.QListWidget()
+        self._extension_list_widget.itemChanged.connect(self._apply_filters)
+
+        self._published_list_widget = QtGui.QListWidget()
+        self._published_list_widget.itemChanged.connect(self._apply_filters)
+
+        self._change_list_widget = QtGui.QListWidget()
+        self._change_list_widget.itemChanged.connect(self._apply_filters)
+
+        self._facet_list_widgets = collections.OrderedDict([
+            ('Step', self._step_list_widget),
+            ('Type', self._type_list_widget),
+            ('Extension', self._extension_list_widget),
+            ('Published', self._published_list_widget),
+            ('Change', self._change_list_widget)
+        ])
+
+        # Facet counts are refreshed once per batch of added items
+        self._facet_count_timer = QtCore.QTimer(self)
+        self._facet_count_timer.setSingleShot(True)
+        self._facet_count_timer.setInterval(16)
+        self._facet_count_timer.timeout.connect(self._update_facet_counts)
+
+        # Lazy columns are requested once scrolling, resizing or adding items settles
+        self._lazy_column_timer = QtCore.QTimer(self)
+        self._lazy_column_timer.setSingleShot(True)
+        self._lazy_column_timer.setInterval(100)
+        self._lazy_column_timer.timeout.connect(self._request_lazy_columns)
 
         side_bar.addWidget(project_label)
+        side_bar.addLayout(entity_search_layout)
         side_bar.addWidget(self._tab_widget)
+        side_bar.addLayout(version_limit_layout)
+        side_bar.addLayout(modified_layout)
         side_bar.addWidget(self._current_state_label)
+        side_bar.addWidget(self._progress_bar)
+        side_bar.addWidget(self._progress_detail_label)
+        side_bar.addWidget(self._degraded_label)
+        side_bar.addWidget(self._total_size_label)
         side_bar.addWidget(filter_widget)
         side_bar.addWidget(self._step_list_widget)
         side_bar.addLayout(filter_buttons)
         side_bar.addWidget(self._type_list_widget)
+        side_bar.addWidget(self._extension_list_widget)
+        side_bar.addWidget(self._published_list_widget)
+        side_bar.addWidget(self._change_list_widget)
 
         side_bar.setStretchFactor(self._tab_widget, 20)
 
@@ -136,14 +351,14 @@ class AppDialog(QtGui.QWidget):
         self._search_bar.setPlaceholderText('Search')
         if self._current_sgtk.engine.has_qt5:
             self._search_bar.setClearButtonEnabled(True)
-        self._search_bar.returnPressed.connect(self._fill_treewidget)
-        self._search_bar.textEdited.connect(self._fill_treewidget)
+        self._search_bar.returnPressed.connect(self._apply_filters)
+        self._search_bar.textEdited.connect(self._apply_filters)
 
         self._tree_widget = QtGui.QTreeWidget()
 
         self._tree_widget.setColumnCount(1)
         self._tree_widget.setHeaderLabels(self._column_names.get_nice_names())
-        self._tree_widget.setSelectionMode(QtGui.QAbstractItemView.SelectionMode.SingleSelection)
+        self._tree_widget.setSelectionMode(QtGui.QAbstractItemView.SelectionMode.ExtendedSelection)
         if self._current_sgtk.engine.has_qt5:
             self._tree_widget.header().setSectionsMovable(False)
         self._tree_widget.header().resizeSections(QtGui.QHeaderView.ResizeToContents)
@@ -156,10 +371,20 @@ class AppDialog(QtGui.QWidget):
             self._tree_widget.header().setSectionsClickable(True)
         self._tree_widget.header().setSortIndicator(self._column_names.index_name('modif'), QtCore.Qt.DescendingOrder)
 
+        # Optional columns start hidden, the header menu shows and hides the lazy columns
+        for name in self.optional_columns:
+            self._tree_widget.setColumnHidden(self._column_names.index_name(name), True)
+        self._tree_widget.header().setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self._tree_widget.header().customContextMenuRequested.connect(self._show_column_menu)
+
         self._tree_widget.itemDoubleClicked.connect(self._tree_item_double_clicked)
         self._tree_widget.itemExpanded.connect(self._item_expanded)
         self._tree_widget.itemCollapsed.connect(self._item_collapsed)
         self._tree_widget.itemClicked.connect(self._item_clicked)
+        self._tree_widget.verticalScrollBar().valueChanged.connect(self._schedule_lazy_columns)
+        self._tree_widget.verticalScrollBar().rangeChanged.connect(self._schedule_lazy_columns)
+
+        self._header_resizer = headerresizer.HeaderResizer(self._tree_widget)
 
         tree_layout.addWidget(self._search_bar)
         tree_layout.addWidget(self._tree_widget)
@@ -231,6 +456,7 @@ class AppDialog(QtGui.QWidget):
             ('Range', None),
             ('Department', None),
             ('Modified', None),
+            ('Size', None),
             ('Path', None)
         ])
 
@@ -246,6 +472,17 @@ class AppDialog(QtGui.QWidget):
         detail_layout.addLayout(detail_buttons)
         detail_layout.addLayout(self._detail_form_layout)
 
+        # Fields read from the file header, depending on the file type
+        self._detail_header_layout = QtGui.QFormLayout()
+        detail_layout.addLayout(self._detail_header_layout)
+
+        # Publish metadata and thumbnail, only for published items
+        self._detail_publish_thumbnail = QtGui.QLabel()
+        self._detail_publish_thumbnail.setAlignment(QtCore.Qt.AlignHCenter)
+        self._detail_publish_layout = QtGui.QFormLayout()
+        detail_layout.addLayout(self._detail_publish_layout)
+        detail_layout.addWidget(self._detail_publish_thumbnail)
+
         splitter_detail_widget.setLayout(detail_layout)
 
         main_splitter.addWidget(splitter_side_bar_widget)
@@ -262,26 +499,25 @@ class AppDialog(QtGui.QWidget):
         if index == -1:
             index = self._tab_widget.currentIndex()
         
-        current_item = self._tab_widget.currentWidget().currentItem()
-
-        if current_item:
-            # Filters
-            steps = {}
-            for index in range(self._step_list_widget.count()):
-                item = self._step_list_widget.item(index)
-                steps[item.text()] = bool(item.checkState())
-
-            type_filter = {}
-            for index in range(self._type_list_widget.count()):
-                item = self._type_list_widget.item(index)
-                type_filter[item.text()] = bool(item.checkState())
+        for item_type, entity_view in self._entity_views.items():
+            if entity_view == self._tab_widget.currentWidget():
+                break
 
+        item_names = self._selected_entities(entity_view)
+        if item_names:
             # Get caches
-            for type_dict in self._tab_list_widgets.items():
-                if type_dict[1] == self._tab_widget.currentWidget():
-                    item_type = type_dict[0]
-
-            self._cache_manager.set_thread_variables(current_item.text(), item_type, steps, type_filter, self._search_bar.text())
+            # All steps on disk are scanned, the filters are applied on the facet index afterwards
+            version_limit = self._version_limit_spin.value()
+            modified_window = self._modified_window()
+
+            # Show what is still warm from earlier scans of the entity right away, only the missing steps are scanned
+            if len(item_names) == 1:
+                self._set_steps(self._cache_manager.get_disk_steps(item_names[0], item_type))
+                self._add_warm_items(self._cache_manager.get_warm_items(item_names[0], item_type, version_limit, modified_window))
+                if self._cache_manager.is_warm(item_names[0], item_type, version_limit, modified_window):
+                    return
+
+            self._cache_manager.set_thread_variables(item_names, item_type, version_limit, modified_window)
             
             # Run get caches async
             if True:
@@ -292,18 +528,222 @@ class AppDialog(QtGui.QWidget):
                 self._cache_manager.get_caches()
 
     def _set_done_gui(self):
+        if self._pending_refresh:
+            force = self._pending_refresh == 'force'
+            self._pending_refresh = None
+            if force:
+                self._force_refresh()
+            else:
+                self._refresh()
+
+            # Warm entities are shown without a scan
+            if self._cache_thread.isRunning():
+                return
+
         self._current_state_label.setText('Done')
+
+        # A cancelled scan stops wherever it was, the bar is only completed for finished scans
+        if self._progress:
+            if self._progress['templates_done'] >= self._progress['templates_total']:
+                self._progress_bar.setRange(0, 1)
+                self._progress_bar.setValue(1)
+            self._progress_bar.setFormat('{} items in {}'.format(self._progress['items'], scanprogress.format_duration(self._progress['elapsed'])))
+        else:
+            self._progress_bar.setRange(0, 1)
+            self._progress_bar.setValue(1)
+            self._progress_bar.setFormat('')
+        self._progress = None
+
+        # Older versions requested while the thread was busy
+        while self._pending_load_more:
+            placeholder = self._pending_load_more.pop(0)
+            if placeholder.treeWidget():
+                self._load_older_versions(placeholder)
+                break
+
+    def _set_degraded_mounts(self, roots):
+        if roots:
+            self._degraded_label.setText('Not responding, skipped: {}'.format(', '.join(roots)))
+            self._degraded_label.setToolTip('Folders on these storage roots are tried again after {}s'.format(self._current_sgtk.get_setting('io_degraded_retry')))
+        self._degraded_label.setVisible(bool(roots))
+
+    def _load_older_versions(self, placeholder):
+        if self._cache_thread.isRunning():
+            if placeholder not in self._pending_load_more:
+                self._pending_load_more.append(placeholder)
+            return
+
+        placeholder.setDisabled(True)
+        self._cache_manager.set_load_more(placeholder)
+        self._set_processing_gui()
+        self._cache_thread.start()
+
+    def _add_older_versions(self, placeholder, items):
+        parent = placeholder.parent()
+        if not parent or not placeholder.treeWidget():
+            return
+
+        parent.removeChild(placeholder)
+        parent.addChildren(items)
+        self._icon_manager.set_icons(parent)
+
+        for item in items:
+            self._request_sizes(item)
+
+        self._header_resizer.schedule()
     
     def _set_processing_gui(self):
         self._current_state_label.setText('Processing...')
 
-    def _shot_asset_selected(self):
-        if self._cache_thread.isRunning():
-            self._cache_thread.terminate()
+        # Busy until the scanner reports how many templates it lists
+        self._progress = None
+        self._progress_bar.setRange(0, 0)
+        self._progress_bar.setFormat('')
+        self._progress_detail_label.setText('')
+
+    def _show_memory_usage(self):
+        # Debug view of the memory every cache layer holds, shared layers include the other Explorer views
+        report = self._scan_service.get_memory_ledger().get_report()
+
+        memory_dialog = QtGui.QDialog(self)
+        memory_dialog.setWindowTitle('Explorer Memory')
+        memory_dialog.setLayout(QtGui.QVBoxLayout())
+
+        headers = ('Layer', 'Used', 'Budget', 'Entries', 'Evicted')
+        table = QtGui.QTableWidget(len(report), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().hide()
+
+        for row, layer in enumerate(report):
+            budget = diskusage.format_size(layer['budget']) if layer['budget'] else 'Unbounded'
+            values = (layer['layer'].capitalize(), diskusage.format_size(layer['bytes']), budget, str(layer['entries']), str(layer['evictions']))
+            for column, value in enumerate(values):
+                table.setItem(row, column, QtGui.QTableWidgetItem(value))
+        table.resizeColumnsToContents()
+
+        memory_dialog.layout().addWidget(table)
+        memory_dialog.layout().addWidget(QtGui.QLabel('{} items in this view'.format(len(self._facet_index))))
+        memory_dialog.exec_()
+
+    def _add_changes(self, changes):
+        self._changes[(changes['item_type'], changes['entity'])] = changes
+
+    def _show_changes(self):
+        # Changes of every entity scanned in this session since the session before, including the caches that are gone
+        rows = []
+        for changes in self._changes.values():
+            since = datetime.datetime.fromtimestamp(changes['since']).strftime('%Y-%m-%d %H:%M') if changes['since'] else 'Never'
+            for change in changes['changes']:
+                rows.append((change['change'], changes['entity'], str(change['version']).zfill(3), since, change['path']))
+
+        changes_dialog = QtGui.QDialog(self)
+        changes_dialog.setWindowTitle('Explorer Changes')
+        changes_dialog.setLayout(QtGui.QVBoxLayout())
+        changes_dialog.resize(900, 500)
+
+        filter_layout = QtGui.QHBoxLayout()
+        change_combo = QtGui.QComboBox()
+        change_combo.addItems(['All', snapshots.CHANGE_NEW, snapshots.CHANGE_NEW_VERSION, snapshots.CHANGE_UPDATED, snapshots.CHANGE_REMOVED])
+        search_bar = QtGui.QLineEdit()
+        search_bar.setPlaceholderText('Search...')
+        filter_layout.addWidget(change_combo)
+        filter_layout.addWidget(search_bar)
+
+        headers = ('Change', 'Entity', 'Version', 'Last seen', 'Path')
+        table = QtGui.QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().hide()
+
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QtGui.QTableWidgetItem(value))
+        table.resizeColumnsToContents()
+        table.setSortingEnabled(True)
+
+        def apply_filters(*args):
+            change = change_combo.currentText()
+            text = search_bar.text().lower()
+            for row in range(table.rowCount()):
+                matches = change == 'All' or table.item(row, 0).text() == change
+                matches = matches and (not text or text in table.item(row, 1).text().lower() or text in table.item(row, 4).text().lower())
+                table.setRowHidden(row, not matches)
+
+        change_combo.currentIndexChanged.connect(apply_filters)
+        search_bar.textEdited.connect(apply_filters)
+
+        changes_dialog.layout().addLayout(filter_layout)
+        changes_dialog.layout().addWidget(table)
+        changes_dialog.layout().addWidget(QtGui.QLabel('{} changes in {} entities'.format(len(rows), len(self._changes))))
+        changes_dialog.exec_()
+
+    def _set_steps(self, steps):
+        # The step filters only list the steps that have a folder on disk for the selected entities
+        for step in steps:
+            self._add_facet_filter('Step', step)
+
+        if not self._facet_count_timer.isActive():
+            self._facet_count_timer.start()
+
+    def _set_progress(self, progress):
+        self._progress = progress
+
+        if progress['templates_total']:
+            self._progress_bar.setRange(0, progress['templates_total'])
+            self._progress_bar.setValue(progress['templates_done'])
+        self._progress_bar.setFormat('{}/{} templates - ETA {}'.format(progress['templates_done'], progress['templates_total'], scanprogress.format_duration(progress['eta'])))
+        self._progress_detail_label.setText('{} directories listed, {} items found'.format(progress['directories'], progress['items']))
+
+    def _modified_window(self):
+        # (since, until) in seconds since the epoch, or ('relative', hours) for a window that ends now, None scans everything.
+        # Relative windows stay the same while time passes, so warm scans are found again in the next minutes.
+        hours = self.modified_windows[self._modified_combo.currentIndex()][1]
+        if hours > 0:
+            return ('relative', hours)
+        elif hours < 0:
+            since = QtCore.QDateTime(self._modified_from_edit.date()).toTime_t()
+            until = QtCore.QDateTime(self._modified_to_edit.date().addDays(1)).toTime_t() - 1
+            return (since, until)
+        return None
+
+    def _modified_window_changed(self, index):
+        custom = self.modified_windows[index][1] < 0
+        self._modified_from_edit.setVisible(custom)
+        self._modified_to_edit.setVisible(custom)
+        self._shot_asset_selected()
+
+    def _shot_asset_selected(self, *args):
+        self._refresh()
 
+    def _force_refresh(self):
+        # Explicit refresh drops everything the shared scan results, the filesystem cache and the warm scan results know
+        if self._cancel_scan('force'):
+            return
+
+        self._scan_service.invalidate()
+        self._disk_usage.clear()
+        self._integrity.clear()
+        self._lazy_columns.clear()
+        self._header_probes.clear()
+        self._cache_manager.clear_cache()
         self._refresh()
 
+    def _cancel_scan(self, refresh):
+        # A running scan stops at its next folder, template or filesystem call, its finished steps stay warm.
+        # Returns True when the refresh has to wait for the thread to finish.
+        if not self._cache_thread.isRunning():
+            return False
+
+        self._cache_manager.cancel()
+        if self._pending_refresh != 'force':
+            self._pending_refresh = refresh
+        return True
+
     def _refresh(self, index = -1):
+        if self._cancel_scan('refresh'):
+            return
+
         # Reset Detail Tab
         self._detail_icon.setPixmap(None)
 
@@ -316,31 +756,81 @@ class AppDialog(QtGui.QWidget):
 
         for key in self._detail_dict:
             self._detail_dict[key].setText('')
+        self._header_probes.reset()
+        self._clear_detail_header()
+        self._publish_details.reset()
+        self._clear_detail_publish()
 
         # Reset Tree Widget
         self._tree_widget.invisibleRootItem().takeChildren()
-        self._cache_manager.clear_cache()
+        self._disk_usage.reset()
+        self._size_items.clear()
+        self._integrity.reset()
+        self._integrity_items.clear()
+        self._detail_item = None
+        self._lazy_columns.reset()
+        self._lazy_items.clear()
+        self._set_total_size(0)
+        self._header_resizer.reset()
+        self._facet_index.clear()
+        self._visible_mask = 0
+        self._clear_facet_filters('Step')
+        self._update_facet_counts()
         self._fill_treewidget(index=index)
 
     def _select_all_filters(self):
         self._step_list_widget.itemChanged.disconnect()
         for index in range(self._step_list_widget.count()):
             self._step_list_widget.item(index).setCheckState(QtCore.Qt.Checked)
-        self._step_list_widget.itemChanged.connect(self._fill_treewidget)
+        self._step_list_widget.itemChanged.connect(self._apply_filters)
 
-        self._fill_treewidget()
+        self._apply_filters()
 
     def _select_no_filters(self):
         self._step_list_widget.itemChanged.disconnect()
         for index in range(self._step_list_widget.count()):
             self._step_list_widget.item(index).setCheckState(QtCore.Qt.Unchecked)
-        self._step_list_widget.itemChanged.connect(self._fill_treewidget)
+        self._step_list_widget.itemChanged.connect(self._apply_filters)
+
+        self._apply_filters()
+
+    def _apply_filters(self, *args):
+        # Only items whose visibility changed are touched
+        mask = self._facet_index.match(self._get_facet_selection(), self._search_mask())
+        changed = mask ^ self._visible_mask
+
+        for index, item in self._facet_index.records(changed):
+            item.setHidden(not mask & (1 << index))
+
+        self._visible_mask = mask
+        self._update_facet_counts()
+
+        if changed:
+            self._header_resizer.schedule()
+            self._schedule_lazy_columns()
+
+    def _update_facet_counts(self):
+        counts = self._facet_index.counts(self._get_facet_selection(), self._search_mask())
 
-        self._fill_treewidget()
+        for facet, list_widget in self._facet_list_widgets.items():
+            list_widget.blockSignals(True)
+            for index in range(list_widget.count()):
+                item = list_widget.item(index)
+                value = item.data(QtCore.Qt.UserRole)
+                item.setText('{} ({})'.format(value, counts[facet].get(value, 0)))
+            list_widget.blockSignals(False)
 
     def _tree_item_double_clicked(self, item, column):
+        if isinstance(item, treeitems.EntityTreeItem):
+            return
+        elif isinstance(item, treeitems.LoadMoreTreeItem):
+            self._load_older_versions(item)
+            return
+
         if item.get_type() in self.image_types or item.get_type() in self.movie_types:
-            self._open_rv(item.get_preview_path())
+            # Holding control adds the media to the running rv session instead of replacing it
+            merge = bool(QtGui.QApplication.keyboardModifiers() & QtCore.Qt.ControlModifier)
+            self._rv_launcher.open([item.get_preview_path()], merge)
 
     def _item_expanded(self, item):
         item.item_expand()
@@ -348,12 +838,20 @@ class AppDialog(QtGui.QWidget):
         # Set icons for new items
         self._icon_manager.set_icons(item)
 
-        self._tree_widget.header().resizeSections(QtGui.QHeaderView.ResizeToContents)
+        self._header_resizer.schedule()
+        self._schedule_lazy_columns()
 
     def _item_collapsed(self, item):
-        self._tree_widget.header().resizeSections(QtGui.QHeaderView.ResizeToContents)
+        self._header_resizer.schedule()
 
     def _item_clicked(self, item, column):
+        if isinstance(item, treeitems.EntityTreeItem):
+            return
+        elif isinstance(item, treeitems.LoadMoreTreeItem):
+            self._load_older_versions(item)
+            return
+
+        clicked_item = item
         if not isinstance(item, treeitems.TreeItem):
             item = item.get_latest_child()
 
@@ -406,29 +904,124 @@ class AppDialog(QtGui.QWidget):
 
                 self._detail_dict[key].setText(text)
 
-        # Set Range if needed
-        # to do check the sequence range
-        if '%04d' in item.get_path():
-            cache_range = 'Invalid Sequence Object!'
-            sequences = pyseq.get_sequences(item.get_path().replace('%04d', '*'))
-            if len(sequences):
-                sequence = sequences[0]
-
-                if sequence.missing():
-                    cache_range = '[{}-{}], missing {}'.format(sequence.format('%s'), sequence.format('%e'), sequence.format('%M'))
-                else:
-                    if len(sequence) == 1:
-                        cache_range = str(sequence[0].digits[-1])
-                    else:
-                        cache_range = sequence.format('%R')
-            self._detail_dict['Range'].setText(cache_range)
-        else:
+        # Sizes of groups cover all their versions
+        size_text = diskusage.format_size(item.get_size())
+        if clicked_item is not item and clicked_item.get_size() is not None:
+            size_text = '{} ({} all versions)'.format(size_text, diskusage.format_size(clicked_item.get_size()))
+        self._detail_dict['Size'].setText(size_text)
+
+        # Set Range, sequences are filled in when their integrity check arrives
+        self._detail_item = item
+        self._set_detail_range(item)
+        self._request_header(item)
+        self._request_publish_details(item)
+
+    def _set_detail_range(self, item):
+        if not integrity.frame_token(os.path.basename(item.get_path())):
             self._detail_dict['Range'].setText('Single')
+        elif item.get_integrity() is None:
+            self._detail_dict['Range'].setText('Checking...')
+            self._request_integrity([item])
+        else:
+            self._detail_dict['Range'].setText(integrity.format_result(item.get_integrity()))
+
+    def _request_header(self, item):
+        # The other versions of the item are read along, they are likely clicked next
+        self._clear_detail_header()
+        if item.get_type() not in headerprobes.PROBE_TYPES:
+            return
+
+        paths = [item.get_path()]
+        parent = item.parent()
+        if isinstance(parent, treeitems.TopLevelTreeItem):
+            for child_index in range(parent.childCount()):
+                child = parent.child(child_index)
+                if isinstance(child, treeitems.TreeItem) and child.get_path() not in paths:
+                    paths.append(child.get_path())
+
+        self.header_probe_request_sig.emit(paths, self._header_probes.reset())
+
+    def _set_detail_header(self, path, fields):
+        if not self._detail_item or self._detail_item.get_path() != path:
+            return
+
+        self._clear_detail_header()
+        for name, value in fields:
+            label = QtGui.QLabel(value)
+            label.setWordWrap(True)
+            self._detail_header_layout.addRow(name, label)
+
+    def _request_publish_details(self, item):
+        self._clear_detail_publish()
+        generation = self._publish_details.reset()
+        if not item.get_published():
+            return
+
+        # Published versions of the group are queried along, they are likely clicked next
+        paths = [item.get_path()]
+        parent = item.parent()
+        if isinstance(parent, treeitems.TopLevelTreeItem):
+            for child_index in range(parent.childCount()):
+                child = parent.child(child_index)
+                if isinstance(child, treeitems.TreeItem) and child.get_published() and child.get_path() not in paths:
+                    paths.append(child.get_path())
+
+        self._detail_publish_layout.addRow('Publish', QtGui.QLabel('Loading...'))
+        self.publish_details_request_sig.emit(paths, generation)
+
+    def _set_detail_publish(self, path, details):
+        if not self._detail_item or self._detail_item.get_path() != path:
+            return
+
+        self._clear_detail_publish()
+        if not details:
+            self._detail_publish_layout.addRow('Publish', QtGui.QLabel('Not found in Shotgun'))
+            return
+
+        for name, key in (('Published by', 'user'), ('Published at', 'date'), ('Publish type', 'publish_type'), ('Shotgun version', 'version'), ('Description', 'description')):
+            if details.get(key):
+                label = QtGui.QLabel(details[key])
+                label.setWordWrap(True)
+                self._detail_publish_layout.addRow(name, label)
+
+        if details.get('thumbnail_path'):
+            pixmap = QtGui.QPixmap(details['thumbnail_path'])
+            if not pixmap.isNull():
+                self._detail_publish_thumbnail.setPixmap(pixmap.scaledToWidth(min(pixmap.width(), 240), QtCore.Qt.SmoothTransformation))
+
+    def _clear_detail_publish(self):
+        self._detail_publish_thumbnail.clear()
+        while self._detail_publish_layout.count():
+            layout_item = self._detail_publish_layout.takeAt(0)
+            if layout_item.widget():
+                layout_item.widget().deleteLater()
+
+    def _show_column_menu(self, position):
+        menu = QtGui.QMenu(self)
+        for name in self._column_names.get_lazy_names():
+            action = menu.addAction(self._column_names.name_to_nice(name))
+            action.setCheckable(True)
+            action.setChecked(not self._tree_widget.isColumnHidden(self._column_names.index_name(name)))
+            action.setData(name)
+
+        action = menu.exec_(self._tree_widget.header().mapToGlobal(position))
+        if action:
+            self._tree_widget.setColumnHidden(self._column_names.index_name(action.data()), not action.isChecked())
+            self._header_resizer.schedule()
+            self._schedule_lazy_columns()
+
+    def _clear_detail_header(self):
+        while self._detail_header_layout.count():
+            layout_item = self._detail_header_layout.takeAt(0)
+            if layout_item.widget():
+                layout_item.widget().deleteLater()
 
     def _detail_copy_path_clipboard(self):
-        clip_string = ''
+        paths = []
         for item in self._tree_widget.selectedItems():
-            clip_string += item.get_path()
+            if not isinstance(item, (treeitems.EntityTreeItem, treeitems.LoadMoreTreeItem)):
+                paths.append(item.get_path())
+        clip_string = '\n'.join(paths)
 
         if clip_string:
             QtGui.QGuiApplication.clipboard().setText(clip_string)
@@ -443,51 +1036,122 @@ class AppDialog(QtGui.QWidget):
         self._current_sgtk.log_info('Not yet implemented opening {}'.format(self._get_selected_path_by_type(['ma'])))
 
     def _detail_click_open_images(self):
-        self._open_rv(self._get_selected_path_by_type(self.image_types))
+        self._rv_launcher.open(self._get_selected_paths_by_type(self.image_types))
 
     def _detail_click_open_movie(self):
-        self._open_rv(self._get_selected_path_by_type(self.movie_types))
-
-    def _open_rv(self, path):
-        process = QtCore.QProcess(self)
-
-        # run the app
-        system = sys.platform
-        if system == "linux2":
-            program = 'rv'
-        elif system == 'win32':
-            possible_rv_s = glob.glob('C:/Program Files/Shotgun/RV-*/bin/rv.exe')
-            possible_rv_s.sort()
-
-            if len(possible_rv_s):
-                program = possible_rv_s[-1]
-            else:
-                self._current_sgtk.log_error('Could not find rv!')
-                return
-        else:
-            msg = "Platform '{}' is not supported.".format(system)
-            self._current_sgtk.log_error(msg)
-            return
-
-        process.startDetached(program, [path])
-        process.close()
+        self._rv_launcher.open(self._get_selected_paths_by_type(self.movie_types))
 
     ############################################################################
     # Public methods
 
     def add_item_to_tree(self, item):
         self._tree_widget.addTopLevelItem(item)
-        self._icon_manager.set_icon(item)
+        self._index_item(item)
         
         # Sort items
         self._tree_widget.sortItems(self._tree_widget.header().sortIndicatorSection(), self._tree_widget.header().sortIndicatorOrder())
 
-        # Resize header
-        self._tree_widget.header().resizeSections(QtGui.QHeaderView.ResizeToContents)
+        # Resize header once the current batch of items is added
+        self._header_resizer.schedule()
+
+    def add_entity_to_tree(self, entity_item):
+        self._tree_widget.addTopLevelItem(entity_item)
+        for child_index in range(entity_item.childCount()):
+            self._index_item(entity_item.child(child_index))
+        entity_item.setExpanded(True)
+
+        # Sort items
+        self._tree_widget.sortItems(self._tree_widget.header().sortIndicatorSection(), self._tree_widget.header().sortIndicatorOrder())
+
+        # Resize header once the current batch of items is added
+        self._header_resizer.schedule()
+
+    def navigate_to_context(self, context):
+        entity = context.entity
+        if not entity or entity['type'] not in self._entity_views:
+            self._current_sgtk.log_debug('Explorer can not navigate to context {}'.format(context))
+            return
+
+        # The search is cleared, the entity has to be in the list to be selected
+        if self._entity_search.text():
+            self._entity_search.clear()
+            self._filter_entities('')
+
+        # Names in the lists have their spaces replaced, see EntityPager
+        entity_view = self._entity_views[entity['type']]
+        index = entity_view.model().find(entity['name'].replace(' ', '-'))
+        if not index.isValid():
+            # The entity may be on a page that did not arrive yet
+            if entity['type'] in self._loading_entity_types:
+                self._pending_context = context
+            else:
+                self._current_sgtk.log_debug('Could not find {} {} in the explorer'.format(entity['type'], entity['name']))
+            return
+        self._pending_context = None
+
+        # Select the entity without a refresh per changed widget, then refresh once.
+        # A running scan for the previous entity is stopped, its finished steps stay warm.
+        self._tab_widget.blockSignals(True)
+        self._tab_widget.setCurrentWidget(entity_view)
+        self._tab_widget.blockSignals(False)
+
+        selection_model = entity_view.selectionModel()
+        selection_model.blockSignals(True)
+        if index.parent().isValid():
+            entity_view.expand(index.parent())
+        selection_model.setCurrentIndex(index, QtGui.QItemSelectionModel.ClearAndSelect)
+        entity_view.scrollTo(index)
+        selection_model.blockSignals(False)
+
+        self._shot_asset_selected()
 
     def closeEvent(self, event):
+        # A running scan quits its thread once it sees the cancel
+        if self._cache_thread.isRunning():
+            self._cache_manager.cancel()
         self._cache_thread.quit()
         self._cache_thread.wait()
+        self._entity_pager.stop()
+        self._entity_thread.quit()
+        self._entity_thread.wait()
+        self._disk_usage.reset()
+        self._disk_usage_thread.quit()
+        self._disk_usage_thread.wait()
+        self._integrity.reset()
+        self._integrity_thread.quit()
+        self._integrity_thread.wait()
+        self._lazy_columns.reset()
+        self._lazy_columns_thread.quit()
+        self._lazy_columns_thread.wait()
+        self._header_probes.reset()
+        self._header_probes_thread.quit()
+        self._header_probes_thread.wait()
+        self._publish_details.reset()
+        self._publish_details_thread.quit()
+        self._publish_details_thread.wait()
+        self._scan_service.get_memory_ledger().remove_reporter('records', self._header_probes.get_memory)
+        self._scan_service.get_memory_ledger().remove_reporter('records', self._lazy_columns.get_memory)
+        self._scan_service.get_memory_ledger().remove_reporter('records', self._disk_usage.get_memory)
+        self._scan_service.get_memory_ledger().remove_reporter('records', self._integrity.get_memory)
+
+        # Release all tree items and the cache layers of this view, the panel can stay docked for days
+        self._facet_count_timer.stop()
+        self._lazy_column_timer.stop()
+        self._header_resizer.stop()
+        self._pending_load_more = []
+        self._size_items.clear()
+        self._integrity_items.clear()
+        self._lazy_items.clear()
+        self._disk_usage.clear()
+        self._integrity.clear()
+        self._lazy_columns.clear()
+        self._header_probes.clear()
+        self._detail_item = None
+        self._facet_index.clear()
+        self._visible_mask = 0
+        self._tree_widget.clear()
+        self._cache_manager.release()
+        self._icon_manager.release()
 
         event.accept()
 
@@ -495,71 +1159,317 @@ class AppDialog(QtGui.QWidget):
     # Private methods
 
     def _get_selected_path_by_type(self, types):
-        items = self._tree_widget.selectedItems()
+        paths = self._get_selected_paths_by_type(types)
+        if paths:
+            return paths[0]
 
-        if len(items):
-            item = items[0]
+    def _get_selected_paths_by_type(self, types):
+        # One path per selected item, all of them are sent to rv as a single batch
+        paths = []
+        for item in self._tree_widget.selectedItems():
+            if isinstance(item, (treeitems.EntityTreeItem, treeitems.LoadMoreTreeItem)):
+                continue
 
-            if not isinstance(item, treeitems.TreeItem):
-                item = item.get_latest_child()
-            
-            # Check itself first
-            if item.get_type() in types:
-                return item.get_path()
-
-            # Then check children
-            if item.childCount():
-                type_dict = {}
-                for child_index in range(item.childCount()):
-                    child = item.child(child_index)
-
-                    type_dict[child.get_type()] = child.get_path()
-                
-                for type_click in types:
-                    if type_click in type_dict.keys():
-                        return type_dict[type_click]
+            path = self._get_path_by_type(item, types)
+            if path and path not in paths:
+                paths.append(path)
+        return paths
 
-    def _fill_shots_assets(self):
-        current_project = self._current_sgtk.context.project['name']
-        
-        for item_type in self.tab_types:
-            shotgun_items = self._current_sgtk.shotgun.find(item_type, [['project.Project.name', 'is', current_project]], ['code'])
+    def _get_path_by_type(self, item, types):
+        if not isinstance(item, treeitems.TreeItem):
+            item = item.get_latest_child()
 
-            items = []
-            for item in shotgun_items:
-                # If the shot code contains a space it means there is probably a '-', replace all spaces with this
-                # Fix for Shotgun doing weird things
-                items.append(item['code'].replace(' ', '-'))
-            items.sort()
-            self._tab_list_widgets[item_type].addItems(items)
+        # Check itself first
+        if item.get_type() in types:
+            return item.get_path()
+
+        # Then check the linked files, these are known without expanding the item
+        type_dict = {}
+        for path, modified, is_preview in item.get_links():
+            type_dict[path.split('.')[-1]] = path
+
+        for type_click in types:
+            if type_click in type_dict.keys():
+                return type_dict[type_click]
+
+    def _add_warm_items(self, items):
+        for item in items:
+            # Sizes are summed again from the (mtime cached) disk usage
+            item.clear_size()
+            self._tree_widget.addTopLevelItem(item)
+            self._index_item(item)
+
+        if items:
+            self._tree_widget.sortItems(self._tree_widget.header().sortIndicatorSection(), self._tree_widget.header().sortIndicatorOrder())
+            self._header_resizer.schedule()
+
+    def _index_item(self, item):
+        facet_values = self._get_facet_values(item)
+        for facet, value in facet_values.items():
+            self._add_facet_filter(facet, value)
+
+        index = self._facet_index.add(item, facet_values)
+
+        # Match the new item against the current filters only
+        item_mask = 1 << index
+        if self._search_bar.text() and self._search_bar.text().lower() not in item.get_path().lower():
+            item_mask = 0
+        item_mask = self._facet_index.match(self._get_facet_selection(), item_mask)
+        self._visible_mask |= item_mask
+
+        item.setHidden(not item_mask)
+        self._icon_manager.set_icon(item)
 
-    def _fill_filters(self):
-        # Step List
-        # Filter for shot as explorer currently does not support assets type
-        shotgun_list = self._current_sgtk.shotgun.find("Step", [], ['code', 'short_name', 'entity_type'])
-        step_list = []
-        for step in shotgun_list:
-            step_list.append(step['short_name'])
-        step_list = list(dict.fromkeys(step_list))
-        step_list.sort()
-
-        for step in step_list:
-            check_box = QtGui.QListWidgetItem()
-            check_box.setText(step)
-            check_box.setFlags(check_box.flags() | QtCore.Qt.ItemIsUserCheckable)
+        self._request_sizes(item)
+
+        if not self._facet_count_timer.isActive():
+            self._facet_count_timer.start()
+
+    def _request_sizes(self, item):
+        # Request the size of every cache below the item in the background
+        leaf_items = treeitems.get_leaf_items(item)
+        if isinstance(item, treeitems.TreeItem):
+            leaf_items = [item]
+
+        paths = []
+        for leaf_item in leaf_items:
+            if leaf_item.get_path() not in self._size_items:
+                paths.append(leaf_item.get_path())
+            self._size_items[leaf_item.get_path()].append(leaf_item)
+        if paths:
+            self.size_request_sig.emit(paths, self._disk_usage.get_generation())
+
+        self._request_integrity([leaf_item for leaf_item in leaf_items if leaf_item.get_type() in self.image_types])
+
+    def _request_integrity(self, items):
+        # Request an integrity check of every image sequence in the background
+        paths = []
+        for item in items:
+            path = item.get_path()
+            if not integrity.frame_token(os.path.basename(path)) or item.get_integrity() is not None:
+                continue
+
+            if path not in self._integrity_items:
+                paths.append(path)
+            if item not in self._integrity_items[path]:
+                self._integrity_items[path].append(item)
+        if paths:
+            self.integrity_request_sig.emit(paths, self._integrity.get_generation())
+
+    def _set_item_integrity(self, path, result):
+        for item in self._integrity_items.pop(path, []):
+            item.set_integrity(result)
+
+            if item is self._detail_item:
+                self._set_detail_range(item)
+
+    def _set_item_size(self, path, size):
+        items = self._size_items.pop(path, [])
+        for item in items:
+            item.add_size(size)
+
+        if items:
+            self._set_total_size(self._total_size + size)
+
+        self._header_resizer.schedule()
+
+    def _schedule_lazy_columns(self, *args):
+        if not self._lazy_column_timer.isActive():
+            self._lazy_column_timer.start()
+
+    def _request_lazy_columns(self):
+        # Request the lazy columns of the rows in view, values computed before are set right away
+        names = [name for name in self._column_names.get_lazy_names() if not self._tree_widget.isColumnHidden(self._column_names.index_name(name))]
+        if not names:
+            return
+
+        self._lazy_items.clear()
+        requests = collections.defaultdict(list)
+
+        height = self._tree_widget.viewport().height()
+        item = self._tree_widget.itemAt(0, 0)
+        while item and self._tree_widget.visualItemRect(item).top() < height:
+            if not isinstance(item, (treeitems.EntityTreeItem, treeitems.LoadMoreTreeItem)):
+                path = item.get_path()
+                for name in names:
+                    if item.get_column_value(name) is not None:
+                        continue
+
+                    value = self._lazy_columns.get_value(name, path)
+                    if value is not None:
+                        item.set_column_value(name, value)
+                        continue
+
+                    if item not in self._lazy_items[path]:
+                        self._lazy_items[path].append(item)
+                    requests[name].append(path)
+
+            item = self._tree_widget.itemBelow(item)
+
+        # Rows that went out of view are not computed anymore
+        generation = self._lazy_columns.reset()
+        if requests:
+            self.lazy_column_request_sig.emit(dict(requests), generation)
+
+    def _set_item_column_value(self, path, name, value):
+        for item in self._lazy_items.get(path, []):
+            item.set_column_value(name, value)
+
+        self._header_resizer.schedule()
+
+    def _set_total_size(self, size):
+        self._total_size = size
+        if size:
+            self._total_size_label.setText('Total size: {}'.format(diskusage.format_size(size)))
+        else:
+            self._total_size_label.setText('')
+
+    def _get_facet_values(self, item):
+        fields = item.get_fields()
+        published = 'Published' if item.get_published() else 'Unpublished'
+
+        return {
+            'Step': fields['Step'],
+            'Type': fields['dimension'],
+            'Extension': item.get_type(),
+            'Published': published,
+            'Change': item.get_change() or snapshots.CHANGE_UNCHANGED
+        }
+
+    def _get_facet_selection(self):
+        selection = {}
+        for facet, list_widget in self._facet_list_widgets.items():
+            values = set()
+            for index in range(list_widget.count()):
+                item = list_widget.item(index)
+                if item.checkState() == QtCore.Qt.Checked:
+                    values.add(item.data(QtCore.Qt.UserRole))
+            selection[facet] = values
+        return selection
+
+    def _search_mask(self):
+        search_text = self._search_bar.text().lower()
+        if not search_text:
+            return None
+
+        key = (search_text, len(self._facet_index))
+        if self._search_mask_cache[0] != key:
+            mask = 0
+            for index, item in self._facet_index.records():
+                if search_text in item.get_path().lower():
+                    mask |= 1 << index
+            self._search_mask_cache = (key, mask)
+
+        return self._search_mask_cache[1]
+
+    def _add_facet_filter(self, facet, value):
+        list_widget = self._facet_list_widgets[facet]
+        for index in range(list_widget.count()):
+            if list_widget.item(index).data(QtCore.Qt.UserRole) == value:
+                return
+
+        check_box = QtGui.QListWidgetItem()
+        check_box.setText(value)
+        check_box.setData(QtCore.Qt.UserRole, value)
+        check_box.setFlags(check_box.flags() | QtCore.Qt.ItemIsUserCheckable)
+        if value in self._unchecked_facet_values[facet]:
+            check_box.setCheckState(QtCore.Qt.Unchecked)
+        else:
             check_box.setCheckState(QtCore.Qt.Checked)
 
-            self._step_list_widget.addItem(check_box)
+        list_widget.blockSignals(True)
+        list_widget.addItem(check_box)
+        list_widget.sortItems()
+        list_widget.blockSignals(False)
+
+    def _clear_facet_filters(self, facet):
+        # Unchecked values stay unchecked when they are added again for the next entity
+        list_widget = self._facet_list_widgets[facet]
+        for index in range(list_widget.count()):
+            item = list_widget.item(index)
+            value = item.data(QtCore.Qt.UserRole)
+            if item.checkState() == QtCore.Qt.Checked:
+                self._unchecked_facet_values[facet].discard(value)
+            else:
+                self._unchecked_facet_values[facet].add(value)
+
+        list_widget.blockSignals(True)
+        list_widget.clear()
+        list_widget.blockSignals(False)
+
+    def _fill_shots_assets(self):
+        # Pages arrive from the entity thread, the lists can be used while the rest is loading
+        self._loading_entity_types = set(self.tab_types)
+        self._pending_context = None
+
+        self._entity_pager = entitylist.EntityPager(
+            self._current_sgtk,
+            self.tab_types,
+            self._current_sgtk.get_setting('entity_page_size') or 500,
+            self._current_sgtk.get_setting('entity_group_fields'))
+        self._entity_thread = QtCore.QThread()
+        self._entity_pager.moveToThread(self._entity_thread)
+
+        self._entity_thread.started.connect(self._entity_pager.fetch)
+        self._entity_pager.page_sig.connect(self._add_entity_page)
+        self._entity_pager.done_sig.connect(self._entity_type_loaded)
+        self._entity_thread.start()
+
+    def _add_entity_page(self, item_type, entities):
+        # The page is inserted into the rows of the model, the selection and the expanded groups stay as they are
+        entity_view = self._entity_views[item_type]
+        entity_view.model().add_entities(entities)
+
+        self._tab_widget.setTabText(self.tab_types.index(item_type), '{} ({})'.format(item_type, entity_view.model().get_count()))
+
+        if self._pending_context:
+            self.navigate_to_context(self._pending_context)
+
+    def _entity_type_loaded(self, item_type):
+        self._loading_entity_types.discard(item_type)
+
+        if self._pending_context and self._pending_context.entity['type'] == item_type:
+            self.navigate_to_context(self._pending_context)
+            self._pending_context = None
+
+    def _selected_entities(self, entity_view):
+        indexes = entity_view.selectionModel().selectedIndexes()
+        if not indexes and entity_view.currentIndex().isValid():
+            indexes = [entity_view.currentIndex()]
+        return entity_view.model().entity_names(indexes)
+
+    def _filter_entities(self, text):
+        for entity_view in self._entity_views.values():
+            entity_view.model().set_filter(text)
+
+    def _group_entities(self, grouped):
+        for entity_view in self._entity_views.values():
+            if entity_view.model().can_group():
+                entity_view.model().set_grouped(grouped)
+                entity_view.setRootIsDecorated(grouped)
+
+    def _fill_filters(self):
+        # Step List is filled per entity with the steps found on disk, see _set_steps
 
         # Type List (2D or 3D)
         type_list = ['2D', '3D']
 
         for filter_item in type_list:
-            check_box = QtGui.QListWidgetItem()
-            check_box.setText(filter_item)
-            check_box.setFlags(check_box.flags() | QtCore.Qt.ItemIsUserCheckable)
-            check_box.setCheckState(QtCore.Qt.Checked)
+            self._add_facet_filter('Type', filter_item)
+
+        # Published List
+        published_list = ['Published', 'Unpublished']
+
+        for filter_item in published_list:
+            self._add_facet_filter('Published', filter_item)
+
+        # Change List, since the last session that scanned the entity
+        change_list = [snapshots.CHANGE_NEW, snapshots.CHANGE_NEW_VERSION, snapshots.CHANGE_UPDATED, snapshots.CHANGE_UNCHANGED]
 
-            self._type_list_widget.addItem(check_box)
+        for filter_item in change_list:
+            self._add_facet_filter('Change', filter_item)
 
         self._type_list_widget.setFixedHeight(len(type_list) * 20)
+        self._published_list_widget.setFixedHeight(len(published_list) * 20)
+        self._change_list_widget.setFixedHeight(len(change_list) * 20)
+        self._update_facet_counts()
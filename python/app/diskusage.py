@@ -0,0 +1,116 @@
+import os
+import fnmatch
+
+from sgtk.platform.qt import QtCore
+
+import integrity
+import ioscheduler
+import memoryusage
+
+_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+def format_size(size):
+    if size is None:
+        return ''
+
+    size = float(size)
+    for unit in _UNITS:
+        if size < 1024.0 or unit == _UNITS[-1]:
+            break
+        size /= 1024.0
+
+    if unit == 'B':
+        return '{:d} {}'.format(int(size), unit)
+    return '{:.1f} {}'.format(size, unit)
+
+class DiskUsageManager(QtCore.QObject):
+    # Sizes are python ints, which do not fit a 32 bit signal argument
+    size_sig = QtCore.Signal(str, object)
+
+    def __init__(self, filesystem, ledger=None):
+        super(DiskUsageManager, self).__init__()
+
+        self._filesystem = filesystem
+        self._generation = 0
+
+        # Directory sizes keyed by path, stored with the mtime of the directory they were computed for.
+        # Kept until an explicit refresh, the oldest directories are evicted while the records budget is exceeded.
+        self._directory_cache = memoryusage.BoundedCache(ledger)
+
+    ############################################################################
+    # Public methods
+
+    def reset(self):
+        # Requests of earlier generations are skipped by the worker thread
+        self._generation += 1
+        return self._generation
+
+    def get_generation(self):
+        return self._generation
+
+    def get_memory(self):
+        return self._directory_cache.get_memory()
+
+    def clear(self):
+        self._directory_cache.clear()
+
+    def compute_sizes(self, paths, generation):
+        # Sizes wait for the foreground scans on the same mounts
+        self._filesystem.set_thread_priority(ioscheduler.PRIORITY_SIZE)
+
+        for path in paths:
+            if generation != self._generation:
+                return
+
+            self.size_sig.emit(path, self._path_size(path))
+
+    ############################################################################
+    # Private methods
+
+    def _path_size(self, path):
+        directory, name = os.path.split(path)
+        files, directories = self._directory_contents(directory)
+
+        # Sequences are summed over every frame in the directory
+        token = integrity.frame_token(name)
+        if token:
+            pattern = os.path.normcase(name.replace(token, '*'))
+            return sum(size for file_name, size in files.items() if fnmatch.fnmatchcase(os.path.normcase(file_name), pattern))
+
+        if name in directories:
+            return self._tree_size(path)
+
+        return files.get(name, 0)
+
+    def _tree_size(self, directory):
+        files, directories = self._directory_contents(directory)
+
+        size = sum(files.values())
+        for name in directories:
+            size += self._tree_size(os.path.join(directory, name))
+        return size
+
+    def _directory_contents(self, directory):
+        # A directory is only scanned again once its mtime changed
+        mtime = None
+        stat_result = self._filesystem.stat(directory)
+        if stat_result:
+            mtime = stat_result.st_mtime
+
+        cached = self._directory_cache.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        elif cached:
+            # The directory changed, do not trust a listing that was cached before the change
+            self._filesystem.invalidate(directory)
+
+        files = {}
+        directories = []
+        for name, is_dir, size in self._filesystem.scandir(directory) or []:
+            if is_dir:
+                directories.append(name)
+            else:
+                files[name] = size
+
+        self._directory_cache.put(directory, (mtime, files, directories))
+        return files, directories
@@ -0,0 +1,362 @@
+import bisect
+
+from sgtk.platform.qt import QtCore
+
+def group_label(field):
+    # sg_sequence.Sequence.episode is shown as Episode
+    if not field:
+        return None
+    name = field.split('.')[-1]
+    if name.startswith('sg_'):
+        name = name[3:]
+    return name.replace('_', ' ').title()
+
+class EntityPager(QtCore.QObject):
+    page_sig = QtCore.Signal(str, object)
+    done_sig = QtCore.Signal(str)
+
+    def __init__(self, app, item_types, page_size=500, group_fields=None):
+        super(EntityPager, self).__init__()
+
+        self._app = app
+        self._item_types = item_types
+        self._page_size = max(page_size, 1)
+        self._group_fields = group_fields or {}
+        self._stop = False
+
+    ############################################################################
+    # Public methods
+
+    def fetch(self):
+        # Entities are queried a page at a time, the lists fill up while the rest is still loading
+        filters = [['project.Project.name', 'is', self._app.context.project['name']]]
+        order = [{'field_name': 'code', 'direction': 'asc'}]
+
+        for item_type in self._item_types:
+            group_field = self._group_fields.get(item_type)
+            fields = ['code', 'sg_status_list']
+            if group_field:
+                fields.append(group_field)
+
+            page = 1
+            while not self._stop:
+                results = self._app.shotgun.find(item_type, filters, fields, order, limit=self._page_size, page=page)
+
+                entities = []
+                for result in results:
+                    if not result.get('code'):
+                        continue
+
+                    group = result.get(group_field) if group_field else None
+                    if isinstance(group, dict):
+                        group = group.get('name')
+
+                    # If the shot code contains a space it means there is probably a '-', replace all spaces with this
+                    # Fix for Shotgun doing weird things
+                    entities.append({
+                        'name': result['code'].replace(' ', '-'),
+                        'group': group or 'Ungrouped',
+                        'status': result.get('sg_status_list') or ''
+                    })
+
+                self.page_sig.emit(item_type, entities)
+                if len(results) < self._page_size:
+                    break
+                page += 1
+
+            self.done_sig.emit(item_type)
+
+    def stop(self):
+        self._stop = True
+
+class _Group(object):
+    def __init__(self, name, row):
+        self.name = name
+        self.row = row
+        self.names = []
+        self.fetched = 0
+
+class EntityModel(QtCore.QAbstractItemModel):
+    # Rows are handed to the view in batches as it scrolls, thousands of entities are never laid out at once
+    _BATCH_SIZE = 200
+
+    def __init__(self, group_label=None, parent=None):
+        super(EntityModel, self).__init__(parent)
+
+        self._group_label = group_label
+
+        # All entities by name, with the names sorted and lower cased for the filter
+        self._entities = {}
+        self._names = []
+        self._keys = []
+
+        self._filter = ''
+        self._grouped = False
+
+        # Filtered rows, names or groups when grouped, and the rows the view has been given so far
+        self._root = object()
+        self._rows = []
+        self._groups = []
+        self._fetched = 0
+
+    ############################################################################
+    # Public methods
+
+    def add_entities(self, entities):
+        # A page is inserted into the rows the view already has, expanded groups and the scroll position are kept
+        regroup = False
+        for entity in entities:
+            name = entity['name']
+            if name in self._entities:
+                regroup = regroup or self._entities[name]['group'] != entity['group']
+            else:
+                position = bisect.bisect_right(self._keys, name.lower())
+                self._names.insert(position, name)
+                self._keys.insert(position, name.lower())
+            self._entities[name] = entity
+
+        if regroup:
+            self._update_rows()
+        else:
+            self._insert_new_rows()
+
+    def set_filter(self, text):
+        if text.lower() != self._filter:
+            self._filter = text.lower()
+            self._update_rows()
+
+    def set_grouped(self, grouped):
+        if grouped != self._grouped:
+            self._grouped = grouped
+            self._update_rows()
+
+    def can_group(self):
+        return bool(self._group_label)
+
+    def get_count(self):
+        return len(self._entities)
+
+    def entity_names(self, indexes):
+        # Names of the selected entities, a selected group stands for all of its entities that pass the filter
+        names = []
+        for index in indexes:
+            if not index.isValid():
+                continue
+
+            node = index.internalPointer()
+            if node is self._root and self._grouped:
+                group_names = self._groups[index.row()].names
+            elif node is self._root:
+                group_names = [self._rows[index.row()]]
+            else:
+                group_names = [node.names[index.row()]]
+
+            for name in group_names:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def find(self, name):
+        # Index of an entity that passes the filter, the rows up to it are handed to the view first
+        if name not in self._entities:
+            return QtCore.QModelIndex()
+
+        if self._grouped:
+            for group in self._groups:
+                if name in group.names:
+                    row = group.names.index(name)
+                    self._fetch_rows(QtCore.QModelIndex(), group.row + 1)
+                    self._fetch_rows(self.createIndex(group.row, 0, self._root), row + 1)
+                    return self.createIndex(row, 0, group)
+            return QtCore.QModelIndex()
+
+        if name not in self._rows:
+            return QtCore.QModelIndex()
+
+        row = self._rows.index(name)
+        self._fetch_rows(QtCore.QModelIndex(), row + 1)
+        return self.createIndex(row, 0, self._root)
+
+    ############################################################################
+    # Model methods
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if column != 0 or row < 0:
+            return QtCore.QModelIndex()
+
+        if not parent.isValid():
+            if row < self._fetched:
+                return self.createIndex(row, column, self._root)
+        elif self._grouped and parent.internalPointer() is self._root:
+            group = self._groups[parent.row()]
+            if row < group.fetched:
+                return self.createIndex(row, column, group)
+        return QtCore.QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+
+        node = index.internalPointer()
+        if node is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, 0, self._root)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return self._fetched
+        if self._grouped and parent.internalPointer() is self._root:
+            return self._groups[parent.row()].fetched
+        return 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return bool(self._rows)
+        return self._grouped and parent.internalPointer() is self._root and bool(self._groups[parent.row()].names)
+
+    def canFetchMore(self, parent):
+        return self._fetch_total(parent) > self.rowCount(parent)
+
+    def fetchMore(self, parent):
+        self._fetch_rows(parent, self.rowCount(parent) + self._BATCH_SIZE)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+        if node is self._root and self._grouped:
+            group = self._groups[index.row()]
+            if role == QtCore.Qt.DisplayRole:
+                return '{} ({})'.format(group.name, len(group.names))
+            return None
+
+        name = self._rows[index.row()] if node is self._root else node.names[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return name
+        elif role == QtCore.Qt.ToolTipRole:
+            entity = self._entities[name]
+            lines = [name]
+            if self._group_label:
+                lines.append('{}: {}'.format(self._group_label, entity['group']))
+            if entity['status']:
+                lines.append('Status: {}'.format(entity['status']))
+            return '\n'.join(lines)
+        return None
+
+    ############################################################################
+    # Private methods
+
+    def _filtered_names(self):
+        if not self._filter:
+            return self._names
+
+        # Prefix matches come from a binary search over the sorted names, substring matches follow them
+        start = bisect.bisect_left(self._keys, self._filter)
+        end = bisect.bisect_left(self._keys, self._filter + u'\uffff')
+        prefix_names = self._names[start:end]
+        other_names = [name for name, key in zip(self._names, self._keys) if self._filter in key and not key.startswith(self._filter)]
+        return prefix_names + other_names
+
+    def _update_rows(self):
+        self.beginResetModel()
+
+        names = self._filtered_names()
+        if self._grouped:
+            groups = {}
+            for name in names:
+                group_name = self._entities[name]['group']
+                if group_name not in groups:
+                    groups[group_name] = _Group(group_name, 0)
+                groups[group_name].names.append(name)
+
+            self._groups = sorted(groups.values(), key=lambda k: k.name.lower())
+            for row, group in enumerate(self._groups):
+                group.row = row
+            self._rows = [group.name for group in self._groups]
+        else:
+            self._groups = []
+            self._rows = names
+
+        self._fetched = min(len(self._rows), self._BATCH_SIZE)
+        self.endResetModel()
+
+    def _insert_new_rows(self):
+        names = self._filtered_names()
+        if not self._grouped:
+            def insert_names(position, values):
+                self._rows[position:position] = values
+            self._merge_rows(QtCore.QModelIndex(), self._rows, names, insert_names)
+            return
+
+        group_names = {}
+        for name in names:
+            group_names.setdefault(self._entities[name]['group'], []).append(name)
+
+        def insert_groups(position, values):
+            self._rows[position:position] = values
+            self._groups[position:position] = [_Group(value, 0) for value in values]
+            for row, group in enumerate(self._groups):
+                group.row = row
+        self._merge_rows(QtCore.QModelIndex(), self._rows, sorted(group_names.keys(), key=lambda k: k.lower()), insert_groups)
+
+        for group in self._groups:
+            def insert_names(position, values, group=group):
+                group.names[position:position] = values
+            self._merge_rows(self.createIndex(group.row, 0, self._root), group.names, group_names[group.name], insert_names)
+
+        # Group rows show their entity count
+        if self._fetched:
+            self.dataChanged.emit(self.createIndex(0, 0, self._root), self.createIndex(self._fetched - 1, 0, self._root))
+
+    def _merge_rows(self, parent, rows, new_rows, insert):
+        # new_rows holds rows in the same order plus the new ones, which are inserted in runs.
+        # Runs past the rows the view was given are added quietly, the view fetches them when it scrolls there.
+        known = set(rows)
+        visible = not parent.isValid() or parent.row() < self._fetched
+
+        index = 0
+        while index < len(new_rows):
+            if new_rows[index] in known:
+                index += 1
+                continue
+
+            end = index
+            while end < len(new_rows) and new_rows[end] not in known:
+                end += 1
+
+            fetched = self.rowCount(parent)
+            if visible and (index < fetched or (index == fetched and fetched < self._BATCH_SIZE)):
+                self.beginInsertRows(parent, index, end - 1)
+                insert(index, new_rows[index:end])
+                if parent.isValid():
+                    self._groups[parent.row()].fetched += end - index
+                else:
+                    self._fetched += end - index
+                self.endInsertRows()
+            else:
+                insert(index, new_rows[index:end])
+            index = end
+
+    def _fetch_total(self, parent):
+        if not parent.isValid():
+            return len(self._rows)
+        if self._grouped and parent.internalPointer() is self._root:
+            return len(self._groups[parent.row()].names)
+        return 0
+
+    def _fetch_rows(self, parent, count):
+        current = self.rowCount(parent)
+        count = min(count, self._fetch_total(parent))
+        if count <= current:
+            return
+
+        self.beginInsertRows(parent, current, count - 1)
+        if parent.isValid():
+            self._groups[parent.row()].fetched = count
+        else:
+            self._fetched = count
+        self.endInsertRows()
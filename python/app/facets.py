@@ -0,0 +1,88 @@
+class FacetIndex(object):
+    def __init__(self, facet_names):
+        self._facet_names = tuple(facet_names)
+        self.clear()
+
+    ############################################################################
+    # Public methods
+
+    def clear(self):
+        self._records = []
+        self._all = 0
+
+        # Postings per facet value, stored as integer bitsets over the record indices
+        self._postings = dict((facet, {}) for facet in self._facet_names)
+
+    def add(self, record, values):
+        index = len(self._records)
+        bit = 1 << index
+
+        self._records.append(record)
+        self._all |= bit
+
+        for facet in self._facet_names:
+            postings = self._postings[facet]
+            value = values[facet]
+            postings[value] = postings.get(value, 0) | bit
+
+        return index
+
+    def __len__(self):
+        return len(self._records)
+
+    def get_facet_names(self):
+        return self._facet_names
+
+    def get_values(self, facet):
+        return sorted(self._postings[facet].keys())
+
+    def get_record(self, index):
+        return self._records[index]
+
+    def records(self, mask=None):
+        if mask is None:
+            mask = self._all
+
+        while mask:
+            lowest = mask & -mask
+            index = lowest.bit_length() - 1
+            mask ^= lowest
+
+            yield index, self._records[index]
+
+    def match(self, selection, mask=None):
+        # selection maps a facet to the values that are enabled, facets that are missing are not filtered
+        result = self._all
+        if mask is not None:
+            result &= mask
+
+        for facet, values in selection.items():
+            result &= self._facet_mask(facet, values)
+        return result
+
+    def counts(self, selection, mask=None):
+        # Count each value against the selection of the other facets only,
+        # so a disabled value still shows how many records enabling it would add
+        counts = {}
+        for facet in self._facet_names:
+            other_selection = dict((key, values) for key, values in selection.items() if key != facet)
+            other_mask = self.match(other_selection, mask)
+
+            counts[facet] = {}
+            for value, bits in self._postings[facet].items():
+                counts[facet][value] = popcount(bits & other_mask)
+        return counts
+
+    ############################################################################
+    # Private methods
+
+    def _facet_mask(self, facet, values):
+        postings = self._postings[facet]
+
+        result = 0
+        for value in values:
+            result |= postings.get(value, 0)
+        return result
+
+def popcount(bits):
+    return bin(bits).count('1')
@@ -0,0 +1,294 @@
+import os
+import glob
+import time
+import fnmatch
+import threading
+
+import ioscheduler
+import memoryusage
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+class FileSystem(object):
+    def __init__(self, ttl=30.0, scheduler=None, ledger=None):
+        self._ttl = ttl
+        self._lock = threading.RLock()
+
+        # Disk reads wait for a slot on their mount when a scheduler is given
+        self._scheduler = scheduler
+
+        # Directory listings and stats, stored with the time they were read
+        self._listings = {}
+        self._stats = {}
+        self._entries = {}
+        self._caches = {'listings': self._listings, 'stats': self._stats, 'entries': self._entries}
+
+        # Estimated bytes per cached entry, the oldest entries are evicted while the records budget is exceeded
+        self._ledger = ledger
+        self._entry_sizes = {}
+        self._bytes = 0
+        self._evictions = 0
+
+        # Hits and misses of all threads, and of each thread since it last reset its own counters
+        self._hits = 0
+        self._misses = 0
+        self._local = threading.local()
+
+    ############################################################################
+    # Public methods
+
+    def listdir(self, directory):
+        return self._listing(directory)[1]
+
+    def scandir(self, directory):
+        # Entries as (name, is_dir, size) from a single scandir pass, None if the directory can not be read
+        directory = os.path.normpath(directory)
+
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry and time.time() - entry[0] < self._ttl:
+                self._count(1, 0)
+                return entry[1]
+
+            self._count(0, 1)
+
+        return self._io(directory, self._load_entries, (directory,), None)
+
+    def exists(self, path):
+        # Answered from the listing of the parent, so siblings share a single round trip
+        directory, name = os.path.split(os.path.normpath(path))
+        if not name:
+            return self.stat(path) is not None
+
+        names = self._listing(directory)[2]
+        return os.path.normcase(name) in names
+
+    def stat(self, path):
+        path = os.path.normpath(path)
+
+        with self._lock:
+            entry = self._stats.get(path)
+            if entry and time.time() - entry[0] < self._ttl:
+                self._count(1, 0)
+                return entry[1]
+
+            self._count(0, 1)
+
+        return self._io(path, self._load_stat, (path,), None)
+
+    def getctime(self, path):
+        stat_result = self.stat(path)
+        if stat_result is None:
+            raise OSError('No such file or directory: {}'.format(path))
+        return stat_result.st_ctime
+
+    def getmtime(self, path):
+        stat_result = self.stat(path)
+        if stat_result is None:
+            raise OSError('No such file or directory: {}'.format(path))
+        return stat_result.st_mtime
+
+    def glob(self, pattern):
+        directory, name_pattern = os.path.split(pattern)
+
+        # Only the file name part is matched against the cached listing
+        if glob.has_magic(directory):
+            with self._lock:
+                self._count(0, 1)
+            return self._io(pattern, glob.glob, (pattern,), [])
+
+        names = self.listdir(directory)
+        if names is None:
+            return []
+
+        name_pattern = os.path.normcase(name_pattern)
+        return [os.path.join(directory, name) for name in names if fnmatch.fnmatchcase(os.path.normcase(name), name_pattern)]
+
+    def prefetch(self, directories, priority=None):
+        # Read the listings and stats of many directories at once, spread over the mounts they live on
+        if not self._scheduler:
+            return
+
+        now = time.time()
+        pending = set()
+        with self._lock:
+            for directory in directories:
+                directory = os.path.normpath(directory)
+                entry = self._listings.get(directory)
+                if entry and now - entry[0] < self._ttl:
+                    continue
+                pending.add(directory)
+            self._count(0, len(pending) * 2)
+
+        self._scheduler.map(sorted(pending), self._prefetch_directory, priority)
+
+    def run(self, path, func, args=()):
+        # Any other call that touches the disk under path, raises MountTimeout when the mount does not answer in time
+        if self._scheduler:
+            return self._scheduler.run(path, func, args)
+        return func(*args)
+
+    def get_degraded(self):
+        # Storage roots skipped since a call on them missed its deadline
+        if self._scheduler:
+            return self._scheduler.get_degraded()
+        return []
+
+    def set_thread_priority(self, priority):
+        if self._scheduler:
+            self._scheduler.set_thread_priority(priority)
+
+    def get_scheduler(self):
+        return self._scheduler
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                for cache in self._caches.values():
+                    cache.clear()
+                self._entry_sizes.clear()
+                self._bytes = 0
+                return
+
+            # Drop the path and everything below it
+            path = os.path.normpath(path)
+            prefix = os.path.join(path, '')
+            for name, cache in self._caches.items():
+                for key in list(cache.keys()):
+                    if key == path or key.startswith(prefix):
+                        self._drop(name, key)
+
+            # The listing of the parent does not know about the change either
+            self._drop('listings', os.path.dirname(path))
+            self._drop('entries', os.path.dirname(path))
+
+    def get_memory(self):
+        # Bytes, entries and evictions of the cached records
+        return self._bytes, len(self._entry_sizes), self._evictions
+
+    def get_stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
+
+    def get_thread_stats(self):
+        # Hits and misses of the calls the current thread made since reset_thread_stats,
+        # other threads that share the filesystem are not counted
+        return {'hits': getattr(self._local, 'hits', 0), 'misses': getattr(self._local, 'misses', 0)}
+
+    def reset_thread_stats(self):
+        self._local.hits = 0
+        self._local.misses = 0
+
+    ############################################################################
+    # Private methods
+
+    def _listing(self, directory):
+        directory = os.path.normpath(directory)
+
+        with self._lock:
+            entry = self._listings.get(directory)
+            if entry and time.time() - entry[0] < self._ttl:
+                self._count(1, 0)
+                return entry
+
+            self._count(0, 1)
+
+        return self._io(directory, self._load_listing, (directory,), (time.time(), None, set()))
+
+    def _count(self, hits, misses):
+        # Called with the lock held
+        self._hits += hits
+        self._misses += misses
+        self._local.hits = getattr(self._local, 'hits', 0) + hits
+        self._local.misses = getattr(self._local, 'misses', 0) + misses
+
+    def _io(self, path, func, args, timed_out):
+        # A mount that misses the call deadline reads like a missing path, the result is not cached so it is read again later
+        try:
+            return self.run(path, func, args)
+        except ioscheduler.MountTimeout:
+            return timed_out
+
+    def _load_listing(self, directory):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = None
+
+        # Keep a case normalized set of the names for membership checks
+        entry = (time.time(), names, set(os.path.normcase(name) for name in names or []))
+        self._store('listings', directory, entry)
+        return entry
+
+    def _load_stat(self, path):
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            stat_result = None
+
+        self._store('stats', path, (time.time(), stat_result))
+        return stat_result
+
+    def _load_entries(self, directory):
+        try:
+            entries = self._read_entries(directory)
+        except OSError:
+            entries = None
+
+        self._store('entries', directory, (time.time(), entries))
+        return entries
+
+    def _store(self, name, key, entry):
+        size = memoryusage.deep_size(key) + memoryusage.deep_size(entry)
+
+        with self._lock:
+            self._drop(name, key)
+            self._caches[name][key] = entry
+            self._entry_sizes[(name, key)] = size
+            self._bytes += size
+
+            if self._ledger and self._ledger.over_budget('records'):
+                self._evict()
+
+    def _drop(self, name, key):
+        self._caches[name].pop(key, None)
+        self._bytes -= self._entry_sizes.pop((name, key), 0)
+
+    def _evict(self):
+        # Oldest entries first, down to the share of the records layer the filesystem keeps. Only its own
+        # entries are evicted, the loop ends once they are gone even when other reporters keep the layer over budget.
+        target = self._ledger.get_share('records', self._bytes)
+        oldest = sorted((cache[key][0], name, key) for name, cache in self._caches.items() for key in cache)
+        for entry_time, name, key in oldest:
+            if self._bytes <= target:
+                break
+            self._drop(name, key)
+            self._evictions += 1
+
+    def _prefetch_directory(self, directory):
+        # Runs on a scheduler worker that already holds the slot of the mount
+        self._load_listing(directory)
+        self._load_stat(directory)
+
+    def _read_entries(self, directory):
+        entries = []
+        if _scandir:
+            for dir_entry in _scandir(directory):
+                if dir_entry.is_dir():
+                    entries.append((dir_entry.name, True, 0))
+                else:
+                    entries.append((dir_entry.name, False, dir_entry.stat().st_size))
+        else:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.isdir(path):
+                    entries.append((name, True, 0))
+                else:
+                    entries.append((name, False, os.path.getsize(path)))
+        return entries
@@ -0,0 +1,460 @@
+import os
+import mmap
+import struct
+
+from sgtk.platform.qt import QtCore
+
+import integrity
+import ioscheduler
+import memoryusage
+
+PROBE_TYPES = ('exr', 'abc', 'vdb', 'mov', 'mp4')
+
+# EXR headers are read in one go, the other formats are mapped and only the pages that are touched are read
+_EXR_HEADER_BYTES = 64 * 1024
+
+_EXR_MAGIC = 20000630
+_EXR_MULTIPART = 0x1000
+_EXR_COMPRESSIONS = ('None', 'RLE', 'ZIPS', 'ZIP', 'PIZ', 'PXR24', 'B44', 'B44A', 'DWAA', 'DWAB')
+_EXR_PIXEL_TYPES = ('uint', 'half', 'float')
+
+_OGAWA_DATA = 0x8000000000000000
+_ABC_ACYCLIC = 1e300
+
+_VDB_MAGIC = 0x56444220
+
+class _Reader(object):
+    # Little endian reads from a string or a memory map, reads past the end raise ValueError
+    def __init__(self, data, big_endian=False):
+        self._data = data
+        self._prefix = '>' if big_endian else '<'
+        self.pos = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def seek(self, pos):
+        if pos < 0 or pos > len(self._data):
+            raise ValueError('Seek past the end of the header')
+        self.pos = pos
+
+    def read(self, size):
+        if size < 0 or self.pos + size > len(self._data):
+            raise ValueError('Read past the end of the header')
+        data = self._data[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def unpack(self, fmt):
+        fmt = self._prefix + fmt
+        values = struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+        return values[0] if len(values) == 1 else values
+
+    def cstring(self):
+        end = self._data.find(b'\x00', self.pos)
+        if end < 0:
+            raise ValueError('Unterminated string in the header')
+        return _text(self.read(end - self.pos + 1)[:-1])
+
+def probe(path):
+    # Header fields of a file as a list of (name, text), empty for unsupported or unreadable files
+    extension = path.split('.')[-1].lower()
+
+    fields = []
+    try:
+        with open(path, 'rb') as probe_file:
+            if extension == 'exr':
+                _probe_exr(_Reader(probe_file.read(_EXR_HEADER_BYTES)), fields)
+                return fields
+
+            if not os.fstat(probe_file.fileno()).st_size:
+                return fields
+
+            mapped = mmap.mmap(probe_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if extension == 'abc':
+                    _probe_abc(_Reader(mapped), fields)
+                elif extension == 'vdb':
+                    _probe_vdb(_Reader(mapped), fields)
+                elif extension in ('mov', 'mp4'):
+                    _probe_mov(_Reader(mapped, big_endian=True), fields)
+            finally:
+                mapped.close()
+    except (IOError, OSError, ValueError, UnicodeError, struct.error):
+        # Truncated or foreign files keep the fields found up to the error
+        pass
+    return fields
+
+def _text(data):
+    return data.decode('utf-8', 'replace')
+
+def _frames(value):
+    return '{:g}'.format(round(value, 3))
+
+############################################################################
+# EXR
+
+def _probe_exr(reader, fields):
+    if reader.unpack('i') != _EXR_MAGIC:
+        return
+
+    flags = reader.unpack('i')
+
+    # Multi part files have a header per part, the list ends with an empty header
+    parts = []
+    while True:
+        parts.append(_exr_header(reader))
+        if not flags & _EXR_MULTIPART or reader.read(1) == b'\x00':
+            break
+        reader.seek(reader.pos - 1)
+
+    header = parts[0]
+    display_window = header.get('displayWindow')
+    data_window = header.get('dataWindow')
+
+    if len(parts) > 1:
+        fields.append(('Parts', str(len(parts))))
+    if display_window:
+        fields.append(('Resolution', '{}x{}'.format(display_window[2] - display_window[0] + 1, display_window[3] - display_window[1] + 1)))
+    if data_window:
+        if data_window == display_window:
+            fields.append(('Data Window', 'Full'))
+        else:
+            fields.append(('Data Window', '{} {} - {} {}'.format(*data_window)))
+    if 'compression' in header:
+        compression = header['compression']
+        fields.append(('Compression', _EXR_COMPRESSIONS[compression] if compression < len(_EXR_COMPRESSIONS) else str(compression)))
+
+    # Layers are the channel prefixes, or the part names of multi part files
+    channels = []
+    layers = []
+    for part in parts:
+        for channel_name, pixel_type in part.get('channels', []):
+            channels.append(pixel_type)
+
+            layer = part.get('name') or ''
+            if '.' in channel_name:
+                layer = '.'.join(filter(None, (layer, channel_name.rsplit('.', 1)[0])))
+            layer = layer or 'rgba'
+            if layer not in layers:
+                layers.append(layer)
+
+    if channels:
+        pixel_types = sorted(set(channels), key=channels.index)
+        fields.append(('Channels', '{} ({})'.format(len(channels), ', '.join(pixel_types))))
+        fields.append(('AOVs', ', '.join(layers)))
+
+def _exr_header(reader):
+    header = {}
+    while True:
+        name = reader.cstring()
+        if not name:
+            return header
+
+        type_name = reader.cstring()
+        size = reader.unpack('i')
+        end = reader.pos + size
+
+        if type_name == 'chlist':
+            header['channels'] = _exr_channels(reader, end)
+        elif type_name == 'compression':
+            header['compression'] = reader.unpack('B')
+        elif type_name == 'box2i':
+            header[name] = reader.unpack('4i')
+        elif type_name == 'string':
+            header[name] = _text(reader.read(size))
+        reader.seek(end)
+
+def _exr_channels(reader, end):
+    channels = []
+    while reader.pos < end:
+        channel_name = reader.cstring()
+        if not channel_name:
+            break
+
+        pixel_type = reader.unpack('i')
+        reader.read(12)
+        channels.append((channel_name, _EXR_PIXEL_TYPES[pixel_type] if 0 <= pixel_type < len(_EXR_PIXEL_TYPES) else str(pixel_type)))
+    return channels
+
+############################################################################
+# Alembic
+
+def _probe_abc(reader, fields):
+    magic = reader.read(5)
+    if magic.startswith(b'\x89HDF'):
+        fields.append(('Format', 'HDF5'))
+        return
+    elif magic != b'Ogawa':
+        return
+
+    fields.append(('Format', 'Ogawa'))
+
+    # The archive group holds the versions, the top object, the archive metadata and the time samplings
+    reader.seek(8)
+    archive = _ogawa_group(reader, reader.unpack('Q'))
+    if len(archive) < 5:
+        return
+
+    metadata = {}
+    for pair in _text(_ogawa_data(reader, archive[3])).split(';'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            metadata[key] = value
+    if metadata.get('_ai_Application'):
+        fields.append(('Application', metadata['_ai_Application']))
+
+    # The time sampling with the most samples describes the animation
+    samplings = _Reader(_ogawa_data(reader, archive[4]))
+    best = None
+    while samplings.pos < len(samplings):
+        max_samples, time_per_cycle, sample_count = samplings.unpack('IdI')
+        times = samplings.unpack('{}d'.format(sample_count)) if sample_count else ()
+        if not isinstance(times, tuple):
+            times = (times,)
+        if times and (best is None or max_samples > best[0]):
+            best = (max_samples, time_per_cycle, times)
+
+    if not best:
+        return
+
+    max_samples, time_per_cycle, times = best
+    fields.append(('Samples', str(max_samples)))
+    if max_samples < 2:
+        return
+
+    if time_per_cycle >= _ABC_ACYCLIC:
+        # Acyclic samples have no frame rate, their times are shown in seconds
+        last = times[min(max_samples, len(times)) - 1]
+        fields.append(('Time Range', '{}s - {}s'.format(_frames(times[0]), _frames(last))))
+    else:
+        index = max_samples - 1
+        last = times[index % len(times)] + index // len(times) * time_per_cycle
+        fields.append(('Frame Range', '{}-{}'.format(_frames(times[0] / time_per_cycle), _frames(last / time_per_cycle))))
+        fields.append(('FPS', _frames(1.0 / time_per_cycle)))
+
+def _ogawa_group(reader, offset):
+    if not offset or offset & _OGAWA_DATA:
+        return []
+
+    reader.seek(offset)
+    count = reader.unpack('Q')
+    return [reader.unpack('Q') for index in range(count)]
+
+def _ogawa_data(reader, offset):
+    offset &= ~_OGAWA_DATA
+    if not offset:
+        return b''
+
+    reader.seek(offset)
+    return reader.read(reader.unpack('Q'))
+
+############################################################################
+# OpenVDB
+
+def _probe_vdb(reader, fields):
+    if reader.unpack('q') != _VDB_MAGIC:
+        return
+
+    version = reader.unpack('I')
+    if version >= 211:
+        fields.append(('Library', '{}.{}'.format(*reader.unpack('II'))))
+
+    has_offsets = reader.unpack('B') if version >= 212 else 0
+
+    # Older files store the uuid in another layout
+    if version < 218:
+        return
+    reader.read(36)
+
+    for index in range(reader.unpack('I')):
+        name = _vdb_string(reader)
+        type_name = _vdb_string(reader)
+        value = reader.read(reader.unpack('I'))
+        if name == 'creator' and type_name == 'string':
+            fields.append(('Creator', _text(value)))
+
+    if not has_offsets:
+        return
+
+    # Grid descriptors point to the next one, the grid data in between is skipped
+    grids = []
+    for index in range(reader.unpack('i')):
+        name = _vdb_string(reader).split(u'\x1e')[0]
+        grid_type = _vdb_string(reader)
+        if version >= 216:
+            _vdb_string(reader)
+        grid_position, block_position, end_position = reader.unpack('qqq')
+
+        if grid_type.startswith('Tree_'):
+            grid_type = grid_type.split('_')[1]
+        grids.append('{} ({})'.format(name, grid_type))
+        reader.seek(end_position)
+
+    fields.append(('Grids', ', '.join(grids)))
+
+def _vdb_string(reader):
+    return _text(reader.read(reader.unpack('I')))
+
+############################################################################
+# QuickTime and MP4
+
+def _probe_mov(reader, fields):
+    moov = _mov_atoms(reader, 0, len(reader)).get(b'moov')
+    if not moov:
+        return
+
+    atoms = _mov_atoms(reader, *moov[0])
+    if b'mvhd' in atoms:
+        reader.seek(atoms[b'mvhd'][0][0])
+        if reader.unpack('B'):
+            reader.read(3 + 16)
+            timescale, duration = reader.unpack('IQ')
+        else:
+            reader.read(3 + 8)
+            timescale, duration = reader.unpack('II')
+        if timescale:
+            fields.append(('Duration', '{}s'.format(_frames(float(duration) / timescale))))
+
+    # Only the first video track is described
+    for start, end in atoms.get(b'trak', []):
+        track = _mov_atoms(reader, start, end)
+        mdia = _mov_atoms(reader, *track[b'mdia'][0]) if b'mdia' in track else {}
+        if b'hdlr' not in mdia:
+            continue
+
+        reader.seek(mdia[b'hdlr'][0][0] + 8)
+        if reader.read(4) != b'vide':
+            continue
+
+        if b'tkhd' in track:
+            reader.seek(track[b'tkhd'][0][1] - 8)
+            width, height = reader.unpack('II')
+            fields.append(('Resolution', '{}x{}'.format(width >> 16, height >> 16)))
+
+        timescale = 0
+        if b'mdhd' in mdia:
+            reader.seek(mdia[b'mdhd'][0][0])
+            reader.read(4 + (16 if reader.unpack('B') else 8) - 1)
+            timescale = reader.unpack('I')
+
+        minf = _mov_atoms(reader, *mdia[b'minf'][0]) if b'minf' in mdia else {}
+        stbl = _mov_atoms(reader, *minf[b'stbl'][0]) if b'stbl' in minf else {}
+        if b'stsd' in stbl:
+            reader.seek(stbl[b'stsd'][0][0] + 12)
+            fields.append(('Codec', _text(reader.read(4)).strip()))
+
+        if b'stts' in stbl:
+            reader.seek(stbl[b'stts'][0][0] + 4)
+            entries = [reader.unpack('II') for index in range(reader.unpack('I'))]
+            if entries:
+                fields.append(('Frames', str(sum(count for count, delta in entries))))
+                if timescale and entries[0][1]:
+                    fields.append(('FPS', _frames(float(timescale) / entries[0][1])))
+        break
+
+def _mov_atoms(reader, start, end):
+    # Content ranges of the atoms between start and end by type, only the atom headers are read
+    atoms = {}
+    position = start
+    while position + 8 <= end:
+        reader.seek(position)
+        size, atom_type = reader.unpack('I4s')
+        header = 8
+        if size == 1:
+            size = reader.unpack('Q')
+            header = 16
+        elif size == 0:
+            size = end - position
+
+        if size < header:
+            break
+        atoms.setdefault(atom_type, []).append((position + header, min(position + size, end)))
+        position += size
+    return atoms
+
+class HeaderProbeManager(QtCore.QObject):
+    probe_sig = QtCore.Signal(str, object)
+
+    def __init__(self, filesystem, ledger=None):
+        super(HeaderProbeManager, self).__init__()
+
+        self._filesystem = filesystem
+        self._generation = 0
+
+        # Header fields per probed file, stored with the mtime of the file they were read for.
+        # A file probed again replaces its entry, the oldest entries are evicted while the records budget is exceeded.
+        self._cache = memoryusage.BoundedCache(ledger)
+
+    ############################################################################
+    # Public methods
+
+    def reset(self):
+        # Requests of earlier generations are skipped by the worker thread
+        self._generation += 1
+        return self._generation
+
+    def get_generation(self):
+        return self._generation
+
+    def get_memory(self):
+        return self._cache.get_memory()
+
+    def clear(self):
+        self._cache.clear()
+
+    def probe_paths(self, paths, generation):
+        # Headers are read on the scheduler workers, in parallel within the limits of every mount
+        self._filesystem.set_thread_priority(ioscheduler.PRIORITY_PREFETCH)
+
+        pending = []
+        for path in paths:
+            if generation != self._generation:
+                return
+
+            probe_path = self._probe_path(path)
+            if not probe_path:
+                self.probe_sig.emit(path, [])
+                continue
+
+            stat_result = self._filesystem.stat(probe_path)
+            mtime = stat_result.st_mtime if stat_result else None
+
+            cached = self._cache.get(probe_path)
+            if cached and cached[0] == mtime:
+                self.probe_sig.emit(path, cached[1])
+            else:
+                pending.append((path, probe_path, mtime))
+
+        if not pending or generation != self._generation:
+            return
+
+        probe_paths = [probe_path for path, probe_path, mtime in pending]
+        scheduler = self._filesystem.get_scheduler()
+        if scheduler:
+            results = scheduler.map(probe_paths, probe)
+        else:
+            results = [probe(probe_path) for probe_path in probe_paths]
+
+        for (path, probe_path, mtime), fields in zip(pending, results):
+            # Headers on a mount that timed out are not cached, they are read again once the mount answers
+            if fields is None:
+                fields = []
+            else:
+                self._cache.put(probe_path, (mtime, fields))
+
+            if generation == self._generation:
+                self.probe_sig.emit(path, fields)
+
+    ############################################################################
+    # Private methods
+
+    def _probe_path(self, path):
+        # Sequences are probed on their first frame
+        if not integrity.frame_token(os.path.basename(path)):
+            return path
+
+        result = integrity.sequence_frames(self._filesystem, path)
+        if not result['frames']:
+            return None
+        return integrity.frame_path(path, result['first'])
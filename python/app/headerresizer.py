@@ -0,0 +1,95 @@
+from sgtk.platform.qt import QtCore, QtGui
+
+class HeaderResizer(QtCore.QObject):
+    def __init__(self, tree_widget, sample_size=200, padding=16, interval=16):
+        super(HeaderResizer, self).__init__(tree_widget)
+
+        self._tree_widget = tree_widget
+        self._sample_size = sample_size
+        self._padding = padding
+        self._widths = {}
+
+        # Coalesce all resize requests of a batch into a single pass, at most once per frame
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.resize)
+
+    ############################################################################
+    # Public methods
+
+    def schedule(self, *args):
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def reset(self):
+        self._widths.clear()
+        self.schedule()
+
+    def stop(self):
+        self._timer.stop()
+        self._widths.clear()
+
+    def resize(self):
+        header = self._tree_widget.header()
+        font_metrics = QtGui.QFontMetrics(self._tree_widget.font())
+        icon_width = self._icon_width()
+        items = self._sample_items()
+
+        for column in range(header.count()):
+            if header.isSectionHidden(column):
+                continue
+
+            width = header.sectionSizeHint(column)
+            for item, depth in items:
+                item_width = font_metrics.width(item.text(column))
+                if not item.icon(column).isNull():
+                    item_width += icon_width
+                if column == 0:
+                    item_width += self._tree_widget.indentation() * (depth + 1)
+
+                width = max(width, item_width + self._padding)
+
+            # Only grow columns, this keeps the layout stable while scrolling through samples
+            width = max(width, self._widths.get(column, 0))
+            self._widths[column] = width
+
+            if header.sectionSize(column) != width:
+                header.resizeSection(column, width)
+
+    ############################################################################
+    # Private methods
+
+    def _icon_width(self):
+        icon_size = self._tree_widget.iconSize()
+        if icon_size.isValid() and icon_size.width() > 0:
+            return icon_size.width()
+        return self._tree_widget.style().pixelMetric(QtGui.QStyle.PM_SmallIconSize)
+
+    def _sample_items(self):
+        # Walk the visible rows starting at the top of the viewport, hidden and collapsed items are skipped by itemBelow
+        item = self._tree_widget.itemAt(0, 0)
+        if not item:
+            item = self._first_visible_top_level_item()
+
+        items = []
+        while item and len(items) < self._sample_size:
+            items.append((item, self._depth(item)))
+            item = self._tree_widget.itemBelow(item)
+
+        return items
+
+    def _first_visible_top_level_item(self):
+        for index in range(self._tree_widget.topLevelItemCount()):
+            item = self._tree_widget.topLevelItem(index)
+            if not item.isHidden():
+                return item
+        return None
+
+    def _depth(self, item):
+        depth = 0
+        parent = item.parent()
+        while parent:
+            depth += 1
+            parent = parent.parent()
+        return depth
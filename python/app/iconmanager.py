@@ -1,30 +1,64 @@
 import os
+import collections
 
 from sgtk.platform.qt import QtCore, QtGui
 
+import treeitems
+
 class IconManager(QtGui.QPixmapCache):
-    def __init__(self, column_names, image_types, movie_types):
+    def __init__(self, column_names, image_types, movie_types, ledger=None):
         super(IconManager, self).__init__()
         self._column_names = column_names
         self._image_types = image_types
         self._movie_types = movie_types
 
         self._label_height = 50
-        self._thumb_dict = {}
 
-        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "resources"))
-        svg_files = ('refresh', 'check', 'cross', 'image', 'houdini', 'maya', 'nuke', 'arnold', 'video', 'clipboard', 'openvdb', 'obj', 'alembic', 'geometry')
+        self._base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "resources"))
+        self._svg_files = ('refresh', 'check', 'cross', 'image', 'houdini', 'maya', 'nuke', 'arnold', 'video', 'clipboard', 'openvdb', 'obj', 'alembic', 'geometry')
 
-        for svg in svg_files:
-            image = QtGui.QPixmap(os.path.join(base_path, '{}.svg'.format(svg)))
-            key = self.insert(image.scaledToHeight(self._label_height, QtCore.Qt.SmoothTransformation))
+        # Pixmaps are loaded on first use as (cache key, bytes), the least recently used are dropped over the pixmaps budget
+        self._thumb_dict = collections.OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
 
-            self._thumb_dict[svg] = key
+        self._ledger = ledger
+        if self._ledger:
+            self._ledger.add_reporter('pixmaps', self.get_memory)
 
     def get_pixmap(self, name):
-        if name in self._thumb_dict.keys():
-            return self.find(self._thumb_dict[name])
-        return None
+        if name not in self._svg_files:
+            return None
+
+        entry = self._thumb_dict.pop(name, None)
+        pixmap = self.find(entry[0]) if entry else None
+
+        # Load the pixmap again when it was never loaded or the pixmap cache of the host dropped it
+        if pixmap is None or pixmap.isNull():
+            if entry:
+                self._bytes -= entry[1]
+
+            image = QtGui.QPixmap(os.path.join(self._base_path, '{}.svg'.format(name)))
+            pixmap = image.scaledToHeight(self._label_height, QtCore.Qt.SmoothTransformation)
+            entry = (self.insert(pixmap), pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+            self._bytes += entry[1]
+
+        self._thumb_dict[name] = entry
+        self._evict(name)
+        return pixmap
+
+    def get_memory(self):
+        return self._bytes, len(self._thumb_dict), self._evictions
+
+    def release(self):
+        # Remove our pixmaps from the pixmap cache the host application shares with us
+        for key, size in self._thumb_dict.values():
+            self.remove(key)
+        self._thumb_dict.clear()
+        self._bytes = 0
+
+        if self._ledger:
+            self._ledger.remove_reporter('pixmaps', self.get_memory)
 
     def get_icon_name(self, ext):
         thumb = None
@@ -69,4 +103,16 @@ class IconManager(QtGui.QPixmapCache):
         for child_index in range(item.childCount()):
             child = item.child(child_index)
 
-            self.set_icon(child)
\ No newline at end of file
+            if not isinstance(child, treeitems.LoadMoreTreeItem):
+                self.set_icon(child)
+
+    def _evict(self, name):
+        while self._ledger and self._ledger.over_budget('pixmaps') and len(self._thumb_dict) > 1:
+            old_name = next(iter(self._thumb_dict))
+            if old_name == name:
+                break
+
+            key, size = self._thumb_dict.pop(old_name)
+            self.remove(key)
+            self._bytes -= size
+            self._evictions += 1
@@ -0,0 +1,166 @@
+import os
+import re
+
+from sgtk.platform.qt import QtCore
+
+import ioscheduler
+import memoryusage
+
+# Frame number of a sequence name as the sequence key of its template formats it, %04d, %05d or %d
+_FRAME_TOKEN = re.compile('%(0\\d+)?d')
+
+def frame_token(name):
+    # The frame format in a sequence name, None for names that are not a sequence
+    match = _FRAME_TOKEN.search(name)
+    return match.group(0) if match else None
+
+def check_frames(files, name, outlier_ratio=0.5):
+    # Check the frames of a sequence name against the files of its directory, files maps file names to sizes
+    prefix, suffix = name.split(frame_token(name), 1)
+    regex = re.compile('^{}(-?\\d+){}$'.format(re.escape(prefix), re.escape(suffix)), re.IGNORECASE if os.name == 'nt' else 0)
+
+    frames = {}
+    for file_name, size in files.items():
+        match = regex.match(file_name)
+        if match:
+            frames[int(match.group(1))] = size
+
+    result = {'frames': len(frames), 'first': None, 'last': None, 'missing': [], 'zero_byte': [], 'undersized': []}
+    if not frames:
+        return result
+
+    numbers = sorted(frames.keys())
+    result['first'] = numbers[0]
+    result['last'] = numbers[-1]
+    result['missing'] = sorted(set(range(numbers[0], numbers[-1] + 1)) - set(numbers))
+    result['zero_byte'] = [frame for frame in numbers if not frames[frame]]
+
+    # Truncated frames are much smaller than the median frame of the sequence
+    sizes = sorted(size for size in frames.values() if size)
+    if len(sizes) >= 3:
+        median = sizes[len(sizes) // 2]
+        result['undersized'] = [frame for frame in numbers if frames[frame] and frames[frame] < median * outlier_ratio]
+
+    return result
+
+def sequence_frames(filesystem, path, outlier_ratio=0.5):
+    # Frames of a sequence path from the cached listing of its directory, None for paths that are not a sequence
+    directory, name = os.path.split(path)
+    if not frame_token(name):
+        return None
+
+    files = {}
+    for file_name, is_dir, size in filesystem.scandir(directory) or []:
+        if not is_dir:
+            files[file_name] = size
+    return check_frames(files, name, outlier_ratio)
+
+def frame_path(path, frame):
+    directory, name = os.path.split(path)
+    token = frame_token(name)
+    return os.path.join(directory, name.replace(token, token % frame, 1))
+
+def has_problems(result):
+    return bool(result and (result['missing'] or result['zero_byte'] or result['undersized']))
+
+def format_frames(frames):
+    # Consecutive frames are shown as ranges, 1001-1003, 1007
+    ranges = []
+    for frame in frames:
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1][1] = frame
+        else:
+            ranges.append([frame, frame])
+
+    return ', '.join(str(first) if first == last else '{}-{}'.format(first, last) for first, last in ranges)
+
+def format_result(result):
+    if not result or not result['frames']:
+        return 'Invalid Sequence Object!'
+
+    if result['first'] == result['last']:
+        text = str(result['first'])
+    else:
+        text = '[{}-{}]'.format(result['first'], result['last'])
+
+    if result['missing']:
+        text += ', missing {}'.format(format_frames(result['missing']))
+    if result['zero_byte']:
+        text += ', zero byte {}'.format(format_frames(result['zero_byte']))
+    if result['undersized']:
+        text += ', undersized {}'.format(format_frames(result['undersized']))
+    return text
+
+class IntegrityManager(QtCore.QObject):
+    result_sig = QtCore.Signal(str, object)
+
+    def __init__(self, filesystem, outlier_ratio=0.5, ledger=None):
+        super(IntegrityManager, self).__init__()
+
+        self._filesystem = filesystem
+        self._outlier_ratio = outlier_ratio
+        self._generation = 0
+
+        # Results per sequence path and the directory mtime they were checked for.
+        # Kept until an explicit refresh, the oldest are evicted while the records budget is exceeded.
+        self._results = memoryusage.BoundedCache(ledger)
+        self._directory_mtimes = memoryusage.BoundedCache(ledger)
+
+    ############################################################################
+    # Public methods
+
+    def reset(self):
+        # Requests of earlier generations are skipped by the worker thread
+        self._generation += 1
+        return self._generation
+
+    def get_generation(self):
+        return self._generation
+
+    def get_memory(self):
+        results = self._results.get_memory()
+        directory_mtimes = self._directory_mtimes.get_memory()
+        return tuple(result + directory_mtime for result, directory_mtime in zip(results, directory_mtimes))
+
+    def clear(self):
+        self._results.clear()
+        self._directory_mtimes.clear()
+
+    def check_sequences(self, paths, generation):
+        # Integrity checks wait for the foreground scans on the same mounts
+        self._filesystem.set_thread_priority(ioscheduler.PRIORITY_SIZE)
+
+        for path in paths:
+            if generation != self._generation:
+                return
+
+            self.result_sig.emit(path, self._check_sequence(path))
+
+    ############################################################################
+    # Private methods
+
+    def _check_sequence(self, path):
+        directory, name = os.path.split(path)
+
+        mtime = None
+        stat_result = self._filesystem.stat(directory)
+        if stat_result:
+            mtime = stat_result.st_mtime
+
+        cached = self._results.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        # Frames were written since the directory was listed, do not trust the cached listing
+        if directory in self._directory_mtimes and self._directory_mtimes.get(directory) != mtime:
+            self._filesystem.invalidate(directory)
+        self._directory_mtimes.put(directory, mtime)
+
+        files = {}
+        for file_name, is_dir, size in self._filesystem.scandir(directory) or []:
+            if not is_dir:
+                files[file_name] = size
+
+        result = check_frames(files, name, self._outlier_ratio)
+        self._results.put(path, (mtime, result))
+        return result
@@ -0,0 +1,330 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+
+# Priority classes, lower values are served first
+PRIORITY_FOREGROUND = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_SIZE = 2
+PRIORITY_THUMBNAIL = 3
+
+class MountTimeout(IOError):
+    # A call that missed its deadline, or a call on a mount that is degraded since an earlier call missed it
+    def __init__(self, root):
+        super(MountTimeout, self).__init__('Storage root {} is not responding'.format(root))
+        self.root = root
+
+class _Call(object):
+    # A call run on a worker under the call timeout, the caller waits for done
+    def __init__(self, func, args, probe):
+        self.func = func
+        self.args = args
+        self.probe = probe
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.start = None
+        self.expired = False
+
+class _Mount(object):
+    def __init__(self, root, limit):
+        self.root = root
+        self.limit = limit
+
+        # Concurrency currently allowed, lowered while the mount is slow
+        self.allowed = limit
+        self.active = 0
+        self.latency = None
+        self.adjusted = 0.0
+
+        # Heap of [priority, sequence, call] for the workers
+        self.waiting = []
+
+        # Set once a call missed its deadline. Calls fail right away until the retry time,
+        # then a single probe call is let through and the mount is healthy again when it answers in time.
+        self.degraded_since = None
+        self.retry_time = 0.0
+        self.probing = False
+
+class IoScheduler(object):
+    def __init__(self, mount_limits=None, default_limit=4, slow_latency=0.25, worker_count=8, call_timeout=0, retry_interval=30.0):
+        self._default_limit = max(default_limit, 1)
+        self._slow_latency = slow_latency
+        self._worker_count = max(worker_count, 1)
+
+        # Seconds a call may take before its caller gets a MountTimeout, 0 runs calls without a deadline
+        self._call_timeout = call_timeout
+        self._retry_interval = retry_interval
+
+        # Configured roots, longest first so nested mounts win over their parents
+        self._mount_limits = {}
+        for root, limit in (mount_limits or {}).items():
+            self._mount_limits[os.path.normcase(os.path.normpath(root))] = max(int(limit), 1)
+        self._roots = sorted(self._mount_limits.keys(), key=len, reverse=True)
+
+        self._condition = threading.Condition()
+        self._mounts = {}
+        self._sequence = itertools.count()
+        self._local = threading.local()
+        self._workers = []
+        self._shutdown = False
+
+        # Calls the workers are running under the call timeout, checked by the reaper
+        self._running = {}
+        self._reaper = None
+
+    ############################################################################
+    # Public methods
+
+    def set_thread_priority(self, priority):
+        # Priority of the calls made by the current thread that do not pass one
+        self._local.priority = priority
+
+    def get_thread_priority(self):
+        return getattr(self._local, 'priority', PRIORITY_FOREGROUND)
+
+    def run(self, path, func, args=(), priority=None):
+        # Run the call on a worker once the mount of path has a free slot, the caller waits for it.
+        # A caller that stops waiting leaves nothing queued or running on the mount.
+        # With a call timeout MountTimeout is raised when the call misses its deadline.
+        if priority is None:
+            priority = self.get_thread_priority()
+
+        # Calls made by a task on a worker already hold the slot of their mount
+        if getattr(self._local, 'worker', False):
+            return func(*args)
+
+        mount = self._get_mount(path)
+        with self._condition:
+            call = self._queue_call(mount, func, args, priority)
+            self._condition.notify_all()
+        if call is None:
+            raise MountTimeout(mount.root)
+
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def map(self, paths, func, priority=None):
+        # Run func(path) for all paths on the worker threads, the mounts are read in parallel within their limits.
+        # Paths on a mount that does not answer within the call timeout get None.
+        if priority is None:
+            priority = self.get_thread_priority()
+
+        if not paths:
+            return []
+
+        with self._condition:
+            calls = [self._queue_call(self._get_mount(path), func, (path,), priority) for path in paths]
+            self._condition.notify_all()
+
+        results = []
+        for call in calls:
+            if call is None:
+                results.append(None)
+                continue
+
+            call.done.wait()
+            if isinstance(call.error, MountTimeout):
+                results.append(None)
+            elif call.error is not None:
+                raise call.error
+            else:
+                results.append(call.result)
+        return results
+
+    def get_stats(self):
+        with self._condition:
+            stats = {}
+            for root, mount in self._mounts.items():
+                stats[root] = {
+                    'limit': mount.limit,
+                    'allowed': mount.allowed,
+                    'active': mount.active,
+                    'waiting': len(mount.waiting),
+                    'latency': mount.latency,
+                    'degraded': mount.degraded_since
+                }
+            return stats
+
+    def get_degraded(self):
+        # Roots of the mounts that missed a deadline and have not answered in time since
+        with self._condition:
+            return sorted(root for root, mount in self._mounts.items() if mount.degraded_since is not None)
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+        # Workers stuck on a hung mount are daemon threads, they are not waited for long
+        for worker in list(self._workers):
+            worker.join(1.0)
+        if self._reaper:
+            self._reaper.join(1.0)
+        self._workers = []
+        self._reaper = None
+
+    ############################################################################
+    # Private methods
+
+    def _get_mount(self, path):
+        root, limit = self._mount_root(path)
+
+        with self._condition:
+            mount = self._mounts.get(root)
+            if mount is None:
+                mount = _Mount(root, limit)
+                self._mounts[root] = mount
+            return mount
+
+    def _mount_root(self, path):
+        path = os.path.normcase(os.path.normpath(path))
+        for root in self._roots:
+            if path == root or path.startswith(os.path.join(root, '')):
+                return root, self._mount_limits[root]
+
+        # Unconfigured paths are grouped by drive and first folder
+        drive, rest = os.path.splitdrive(path)
+        parts = [part for part in rest.split(os.sep) if part]
+        return drive + os.sep + (parts[0] if parts else ''), self._default_limit
+
+    def _queue_call(self, mount, func, args, priority):
+        # Queue a call for the workers, None when the mount is degraded and not due for a probe
+        probe = False
+        if mount.degraded_since is not None:
+            if mount.probing or time.time() < mount.retry_time:
+                return None
+            mount.probing = True
+            probe = True
+
+        self._start_workers()
+        call = _Call(func, args, probe)
+        heapq.heappush(mount.waiting, [priority, next(self._sequence), call])
+        return call
+
+    def _start_workers(self):
+        if self._workers or self._shutdown:
+            return
+
+        for index in range(self._worker_count):
+            self._add_worker()
+
+        if self._call_timeout:
+            self._reaper = threading.Thread(target=self._reap, name='IoScheduler-reaper')
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _add_worker(self):
+        worker = threading.Thread(target=self._work, name='IoScheduler-{}'.format(len(self._workers)))
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def _work(self):
+        self._local.worker = True
+        while True:
+            with self._condition:
+                while True:
+                    if self._shutdown:
+                        return
+
+                    mount = self._next_mount()
+                    if mount:
+                        break
+                    self._condition.wait()
+
+                call = heapq.heappop(mount.waiting)[2]
+                mount.active += 1
+                call.start = time.time()
+                if self._call_timeout:
+                    self._running[call] = mount
+
+            try:
+                call.result = call.func(*call.args)
+            except Exception as e:
+                call.error = e
+            finally:
+                self._release(mount, time.time() - call.start)
+
+            with self._condition:
+                self._running.pop(call, None)
+
+                # The caller was released when the call expired and a new worker took this one's place
+                if call.expired:
+                    if len(self._workers) > self._worker_count:
+                        self._workers.remove(threading.current_thread())
+                        return
+                    continue
+
+                if call.probe:
+                    mount.degraded_since = None
+                    mount.probing = False
+            call.done.set()
+
+    def _reap(self):
+        # Python can not cancel a blocked filesystem call. Its caller gets a MountTimeout instead,
+        # the stuck worker keeps the slot of its mount until the call returns and a new worker is started.
+        while True:
+            with self._condition:
+                if self._shutdown:
+                    return
+
+                now = time.time()
+                for call, mount in list(self._running.items()):
+                    if now - call.start > self._call_timeout:
+                        self._expire(call, mount, now)
+                self._condition.wait(min(self._call_timeout / 4.0, 0.5))
+
+    def _expire(self, call, mount, now):
+        del self._running[call]
+        call.expired = True
+        call.error = MountTimeout(mount.root)
+        call.done.set()
+
+        if mount.degraded_since is None:
+            mount.degraded_since = now
+        mount.retry_time = now + self._retry_interval
+        mount.probing = False
+
+        # Queued calls of the mount would wait behind the stuck ones, they fail right away
+        for entry in mount.waiting:
+            entry[2].error = MountTimeout(mount.root)
+            entry[2].done.set()
+        mount.waiting = []
+
+        self._add_worker()
+
+    def _next_mount(self):
+        # Mount with a free slot and a waiting call, served by priority across mounts
+        best = None
+        for mount in self._mounts.values():
+            if not mount.waiting or mount.active >= mount.allowed:
+                continue
+            if best is None or mount.waiting[0][:2] < best.waiting[0][:2]:
+                best = mount
+        return best
+
+    def _release(self, mount, latency):
+        with self._condition:
+            mount.active -= 1
+
+            if mount.latency is None:
+                mount.latency = latency
+            else:
+                mount.latency = mount.latency * 0.8 + latency * 0.2
+
+            # Back off one slot at a time while the mount is slow, and recover once it is fast again
+            now = time.time()
+            if now - mount.adjusted > 1.0:
+                if mount.latency > self._slow_latency and mount.allowed > 1:
+                    mount.allowed -= 1
+                    mount.adjusted = now
+                elif mount.latency < self._slow_latency / 2 and mount.allowed < mount.limit:
+                    mount.allowed += 1
+                    mount.adjusted = now
+
+            self._condition.notify_all()
@@ -0,0 +1,119 @@
+import os
+
+from sgtk.platform.qt import QtCore, QtGui
+
+import integrity
+import ioscheduler
+import memoryusage
+
+def frame_range_provider(filesystem):
+    def provide(paths):
+        values = []
+        for path in paths:
+            result = integrity.sequence_frames(filesystem, path)
+            if not result or not result['frames']:
+                values.append('')
+            elif result['first'] == result['last']:
+                values.append(str(result['first']))
+            else:
+                values.append('{}-{}'.format(result['first'], result['last']))
+        return values
+    return provide
+
+def resolution_provider(filesystem, image_types):
+    def provide(paths):
+        values = []
+        for path in paths:
+            if path.split('.')[-1].lower() not in image_types:
+                values.append('')
+                continue
+
+            # Sequences are read from their first frame
+            image_path = path
+            if integrity.frame_token(os.path.basename(path)):
+                result = integrity.sequence_frames(filesystem, path)
+                if not result['frames']:
+                    values.append('')
+                    continue
+                image_path = integrity.frame_path(path, result['first'])
+
+            # Only the header is read, formats Qt has no reader for stay empty
+            reader = QtGui.QImageReader(image_path)
+            scheduler = filesystem.get_scheduler()
+            if scheduler:
+                try:
+                    size = scheduler.run(image_path, reader.size)
+                except ioscheduler.MountTimeout:
+                    values.append('')
+                    continue
+            else:
+                size = reader.size()
+
+            values.append('{}x{}'.format(size.width(), size.height()) if size.isValid() else '')
+        return values
+    return provide
+
+def publish_detail_provider(scan_service, key):
+    # The publish columns of the rows in view share one query, the columns after the first read the cached details
+    def provide(paths):
+        return [(details or {}).get(key) or '' for details in scan_service.get_publish_details(paths)]
+    return provide
+
+class LazyColumnManager(QtCore.QObject):
+    value_sig = QtCore.Signal(str, str, str)
+
+    # Paths per provider call, a new viewport request is picked up between batches
+    _BATCH_SIZE = 25
+
+    def __init__(self, column_names, filesystem, ledger=None):
+        super(LazyColumnManager, self).__init__()
+
+        self._column_names = column_names
+        self._filesystem = filesystem
+        self._generation = 0
+
+        # Values by column name and path, kept until an explicit refresh or until the records budget evicts them
+        self._values = memoryusage.BoundedCache(ledger)
+
+    ############################################################################
+    # Public methods
+
+    def reset(self):
+        # Requests of earlier generations are skipped by the worker thread, the rows they were for may be out of view
+        self._generation += 1
+        return self._generation
+
+    def get_generation(self):
+        return self._generation
+
+    def get_value(self, name, path):
+        return self._values.get((name, path))
+
+    def clear(self):
+        self._values.clear()
+
+    def get_memory(self):
+        return self._values.get_memory()
+
+    def compute_values(self, requests, generation):
+        # requests maps lazy column names to the paths of the rows in view
+        self._filesystem.set_thread_priority(ioscheduler.PRIORITY_PREFETCH)
+
+        for name, paths in requests.items():
+            provider = self._column_names.get_provider(name)
+
+            for start in range(0, len(paths), self._BATCH_SIZE):
+                if generation != self._generation:
+                    return
+
+                # The values can be cleared or evicted in the meantime, the batch emits what it read itself
+                batch = paths[start:start + self._BATCH_SIZE]
+                values = dict((path, self._values.get((name, path))) for path in batch)
+                missing = [path for path in batch if values[path] is None]
+                if missing:
+                    for path, value in zip(missing, provider(missing)):
+                        values[path] = value
+                        self._values.put((name, path), value)
+
+                for path in batch:
+                    self.value_sig.emit(path, name, values[path])
@@ -0,0 +1,179 @@
+import collections
+import sys
+import threading
+
+# Rough cost of the Qt side of a QTreeWidgetItem, which python does not see
+TREE_ITEM_OVERHEAD = 512
+
+LAYERS = ('items', 'records', 'publishes', 'pixmaps')
+
+def deep_size(obj, seen=None):
+    # Size of an object and the containers below it, objects shared within one call are counted once
+    if seen is None:
+        seen = set()
+
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += deep_size(value, seen)
+    return size
+
+def megabytes(value):
+    return int((value or 0) * 1024 * 1024)
+
+class MemoryLedger(object):
+    def __init__(self, budgets=None):
+        self._lock = threading.Lock()
+
+        # Budgets in bytes per layer, 0 is unbounded
+        self._budgets = dict((layer, 0) for layer in LAYERS)
+        self._budgets.update(budgets or {})
+
+        # Reporters per layer, called for the bytes, entries and evictions of the part they own.
+        # Reporters only read counters, so they are cheap enough to call after every insert.
+        self._reporters = dict((layer, []) for layer in LAYERS)
+
+    ############################################################################
+    # Public methods
+
+    def get_budget(self, layer):
+        return self._budgets[layer]
+
+    def over_budget(self, layer):
+        budget = self._budgets[layer]
+        return bool(budget) and self.get_layer_size(layer) > budget
+
+    def get_share(self, layer, size):
+        # Bytes a reporter owning size bytes of an over budget layer keeps. Reporters below an equal split of a bit less
+        # than the budget keep what they hold, the larger ones split the rest, so one large reporter does not make
+        # the others flush everything they hold.
+        budget = self._budgets[layer]
+        if not budget:
+            return size
+
+        with self._lock:
+            reporters = list(self._reporters[layer])
+        sizes = sorted(reporter()[0] for reporter in reporters)
+
+        remaining = budget * 0.8
+        for index, reporter_size in enumerate(sizes):
+            cap = remaining / (len(sizes) - index)
+            if reporter_size > cap:
+                return int(min(size, cap))
+            remaining -= reporter_size
+        return size
+
+    def get_layer_size(self, layer):
+        with self._lock:
+            reporters = list(self._reporters[layer])
+        return sum(reporter()[0] for reporter in reporters)
+
+    def add_reporter(self, layer, reporter):
+        with self._lock:
+            self._reporters[layer].append(reporter)
+
+    def remove_reporter(self, layer, reporter):
+        with self._lock:
+            if reporter in self._reporters[layer]:
+                self._reporters[layer].remove(reporter)
+
+    def get_report(self):
+        with self._lock:
+            reporters = dict((layer, list(reporters)) for layer, reporters in self._reporters.items())
+
+        report = []
+        for layer in LAYERS:
+            size = 0
+            entries = 0
+            evictions = 0
+            for reporter in reporters[layer]:
+                reporter_size, reporter_entries, reporter_evictions = reporter()
+                size += reporter_size
+                entries += reporter_entries
+                evictions += reporter_evictions
+
+            report.append({
+                'layer': layer,
+                'bytes': size,
+                'entries': entries,
+                'budget': self._budgets[layer],
+                'evictions': evictions
+            })
+        return report
+
+class BoundedCache(object):
+    def __init__(self, ledger=None, layer='records'):
+        self._ledger = ledger
+        self._layer = layer
+        self._lock = threading.Lock()
+
+        # Values in insertion order with their estimated size, the oldest go first while the layer is over budget
+        self._values = collections.OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._evictions = 0
+
+    ############################################################################
+    # Public methods
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._values
+
+    def put(self, key, value):
+        size = deep_size((key, value))
+
+        with self._lock:
+            self._drop(key)
+            self._values[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+
+        if self._ledger and self._ledger.over_budget(self._layer):
+            self._evict(key)
+
+    def pop(self, key):
+        with self._lock:
+            value = self._values.get(key)
+            self._drop(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def get_memory(self):
+        return self._bytes, len(self._values), self._evictions
+
+    ############################################################################
+    # Private methods
+
+    def _drop(self, key):
+        # Called with the lock held
+        self._values.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self, kept):
+        # The value that was just stored is kept, eviction stops once nothing else is left
+        target = self._ledger.get_share(self._layer, self._bytes)
+        with self._lock:
+            for key in list(self._values.keys()):
+                if self._bytes <= target:
+                    break
+                if key == kept:
+                    continue
+                self._drop(key)
+                self._evictions += 1
@@ -0,0 +1,34 @@
+from sgtk.platform.qt import QtCore
+
+class PublishDetailManager(QtCore.QObject):
+    details_sig = QtCore.Signal(str, object)
+
+    def __init__(self, scan_service):
+        super(PublishDetailManager, self).__init__()
+
+        self._scan_service = scan_service
+        self._generation = 0
+
+    ############################################################################
+    # Public methods
+
+    def reset(self):
+        # Requests of earlier generations are skipped, the detail item changed in the meantime
+        self._generation += 1
+        return self._generation
+
+    def get_generation(self):
+        return self._generation
+
+    def fetch_details(self, paths, generation):
+        # The first path is the detail item, the other versions of its group are queried in the same batch
+        if generation != self._generation:
+            return
+
+        details = self._scan_service.get_publish_details(paths)[0]
+        if generation != self._generation:
+            return
+
+        if details:
+            details = dict(details, thumbnail_path=self._scan_service.get_publish_thumbnail(details))
+        self.details_sig.emit(paths[0], details)
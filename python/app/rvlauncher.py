@@ -0,0 +1,77 @@
+import os
+import sys
+import glob
+import distutils.spawn
+
+from sgtk.platform.qt import QtCore
+
+# Resolved executables are shared by every Explorer window of the session
+_executable_cache = {}
+
+class RvLauncher(object):
+    def __init__(self, app, tag='tk-multi-explorer'):
+        self._app = app
+        self._tag = tag
+
+    ############################################################################
+    # Public methods
+
+    def open(self, paths, merge=False):
+        paths = [path for path in paths if path]
+        if not paths:
+            return
+
+        # rvpush sends the media to the RV session with our tag, and starts that session if it is not running
+        rvpush = self.get_rvpush_path()
+        if rvpush:
+            command = 'merge' if merge else 'set'
+            if QtCore.QProcess.startDetached(rvpush, ['-tag', self._tag, command] + paths):
+                return
+            self._app.log_warning('Could not run rvpush, starting a new rv session instead.')
+
+        rv = self.get_rv_path()
+        if rv:
+            QtCore.QProcess.startDetached(rv, paths)
+
+    def get_rv_path(self):
+        if 'rv' not in _executable_cache:
+            _executable_cache['rv'] = self._find_rv()
+        return _executable_cache['rv']
+
+    def get_rvpush_path(self):
+        if 'rvpush' not in _executable_cache:
+            _executable_cache['rvpush'] = self._find_rvpush()
+        return _executable_cache['rvpush']
+
+    ############################################################################
+    # Private methods
+
+    def _find_rv(self):
+        system = sys.platform
+        if system.startswith('linux'):
+            return 'rv'
+        elif system == 'win32':
+            possible_rv_s = glob.glob('C:/Program Files/Shotgun/RV-*/bin/rv.exe')
+            possible_rv_s.sort()
+
+            if len(possible_rv_s):
+                return possible_rv_s[-1]
+
+            self._app.log_error('Could not find rv!')
+        else:
+            self._app.log_error("Platform '{}' is not supported.".format(system))
+        return None
+
+    def _find_rvpush(self):
+        rv = self.get_rv_path()
+        if not rv:
+            return None
+
+        # rvpush is installed next to rv
+        if os.path.isabs(rv):
+            rvpush = os.path.join(os.path.dirname(rv), 'rvpush.exe' if sys.platform == 'win32' else 'rvpush')
+            if os.path.exists(rvpush):
+                return rvpush
+            return None
+
+        return distutils.spawn.find_executable('rvpush')
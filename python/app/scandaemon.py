@@ -0,0 +1,416 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import collections
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import filesystem
+import ioscheduler
+import memoryusage
+import templatewalker
+
+# The daemon runs in a plain python interpreter, keep this module free of sgtk and Qt imports like the aggregate module.
+# One daemon per workstation is started with: python scandaemon.py --port 47811
+# Every Explorer with the same scan_daemon_port then shares its walks, publishes and listings.
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 47811
+
+# Matches per message of a streamed walk
+_CHUNK_SIZE = 2000
+
+class DaemonError(Exception):
+    pass
+
+def send_message(stream, message):
+    # Messages are json, one per line
+    stream.write((json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8'))
+    stream.flush()
+
+def read_message(stream):
+    line = stream.readline()
+    if not line:
+        raise EOFError('Connection closed')
+    return native(json.loads(line.decode('utf-8')))
+
+def native(value):
+    # Python 2 reads json strings as unicode, the Explorer works with str
+    if str is bytes:
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        elif isinstance(value, list):
+            return [native(item) for item in value]
+        elif isinstance(value, dict):
+            return dict((native(key), native(item)) for key, item in value.items())
+    return value
+
+class _Flight(object):
+    # Messages of a result, every connection that asks for it reads them from the start while they are added.
+    # A flight that every connection left before it was done is cancelled, its walk stops at the next folder.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.messages = []
+        self.done = False
+        self.readers = 0
+        self.cancelled = False
+
+    def add(self, message, done=False):
+        with self.condition:
+            self.messages.append(message)
+            self.done = done
+            self.condition.notify_all()
+
+    def join(self):
+        with self.condition:
+            self.readers += 1
+
+    def leave(self):
+        with self.condition:
+            self.readers -= 1
+            if not self.readers and not self.done:
+                self.cancelled = True
+
+    def read(self, position):
+        with self.condition:
+            while position >= len(self.messages) and not self.done:
+                self.condition.wait(1.0)
+            return self.messages[position:], self.done
+
+class ScanDaemon(object):
+    def __init__(self, ttl=30.0, mount_limits=None, default_limit=4, records_budget=0, call_timeout=0, lease_timeout=60.0):
+        self._ttl = ttl
+
+        # Seconds a connection may hold a lease without putting its value, the next waiting connection gets it then
+        self._lease_timeout = lease_timeout
+
+        # The daemon has its own filesystem cache, shared by every Explorer that connects
+        self._ledger = memoryusage.MemoryLedger({'records': records_budget})
+        self._scheduler = ioscheduler.IoScheduler(mount_limits, default_limit, call_timeout=call_timeout)
+        self._filesystem = filesystem.FileSystem(ttl, self._scheduler, self._ledger)
+        self._ledger.add_reporter('records', self._filesystem.get_memory)
+
+        # Finished results with the time they were stored, and the results that are being computed
+        self._lock = threading.Lock()
+        self._results = {}
+        self._flights = {}
+        self._stats = {'computed': 0, 'shared': 0, 'cached': 0}
+
+        self._server = None
+        self._server_thread = None
+
+    ############################################################################
+    # Public methods
+
+    def start(self, port=DEFAULT_PORT, host='127.0.0.1'):
+        # Only local connections are served, returns the port that was bound
+        self._server = _Server((host, port), _Handler)
+        self._server.scan_daemon = self
+        self._server_thread = threading.Thread(target=self._server.serve_forever, name='ExplorerScanDaemon')
+        self._server_thread.daemon = True
+        self._server_thread.start()
+        return self._server.server_address[1]
+
+    def wait(self):
+        while self._server_thread and self._server_thread.is_alive():
+            self._server_thread.join(1.0)
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._scheduler.shutdown()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, results=len(self._results), in_flight=len(self._flights))
+        stats['filesystem'] = self._filesystem.get_stats()
+        return stats
+
+    def handle(self, message, connection, rfile, wfile):
+        op = message.get('op')
+        if op == 'ping':
+            send_message(wfile, {'version': PROTOCOL_VERSION, 'pid': os.getpid()})
+        elif op == 'stats':
+            send_message(wfile, self.get_stats())
+        elif op == 'invalidate':
+            with self._lock:
+                self._results.clear()
+            self._filesystem.invalidate()
+            send_message(wfile, {'done': True})
+        elif op == 'walk':
+            flight, owner = self._flight(message['key'])
+            if owner:
+                worker = threading.Thread(target=self._walk, args=(message['key'], message['job'], flight))
+                worker.daemon = True
+                worker.start()
+            self._stream(flight, wfile)
+        elif op == 'get':
+            self._get(message['key'], connection, rfile, wfile)
+        else:
+            send_message(wfile, {'error': 'Unknown operation {}'.format(op)})
+
+    ############################################################################
+    # Private methods
+
+    def _flight(self, key):
+        # The flight of a result, owner is set when the caller has to compute it
+        with self._lock:
+            now = time.time()
+            for old_key in [old_key for old_key, entry in self._results.items() if now - entry[0] >= self._ttl]:
+                del self._results[old_key]
+
+            entry = self._results.get(key)
+            if entry:
+                self._stats['cached'] += 1
+                return entry[1], False
+
+            # A cancelled walk is still winding down, the next connection starts over
+            flight = self._flights.get(key)
+            if flight and not flight.cancelled:
+                self._stats['shared'] += 1
+                return flight, False
+
+            self._stats['computed'] += 1
+            flight = _Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def _finish(self, key, flight, keep):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if keep:
+                self._results[key] = (time.time(), flight)
+
+    def _stream(self, flight, wfile):
+        # A connection that was closed or cancelled by its Explorer fails on the next write and leaves the flight
+        flight.join()
+        try:
+            position = 0
+            done = False
+            while not done:
+                messages, done = flight.read(position)
+                position += len(messages)
+                for message in messages:
+                    send_message(wfile, message)
+        finally:
+            flight.leave()
+
+    def _walk(self, key, job, flight):
+        walker = templatewalker.TemplateWalker(dict((field, set(values)) for field, values in job['fixed_fields'].items()))
+        for template in job['templates']:
+            walker.add_template(template['index'], template['root_path'], template['definition'], template['key_types'], template['sequence_formats'])
+
+        # Folders listed since the last progress message, sent a few times per second
+        progress = {'listed': 0, 'time': time.time()}
+
+        def on_directory():
+            progress['listed'] += 1
+            if time.time() - progress['time'] > 0.2:
+                flight.add({'progress': progress['listed']})
+                progress['listed'] = 0
+                progress['time'] = time.time()
+
+        try:
+            modified_window = tuple(job['modified_window']) if job.get('modified_window') else None
+            matches, skipped = walker.walk(self._filesystem.listdir, job['version_limit'], on_directory, self._filesystem.stat, modified_window, lambda: flight.cancelled)
+        except templatewalker.ScanCancelled:
+            flight.add({'error': 'Walk cancelled'}, True)
+            self._finish(key, flight, False)
+            return
+        except Exception as e:
+            flight.add({'error': 'Walk failed: {}'.format(e)}, True)
+            self._finish(key, flight, False)
+            return
+
+        if progress['listed']:
+            flight.add({'progress': progress['listed']})
+
+        found = [[index, path, fields] for index, values in matches.items() for path, fields in values]
+        for start in range(0, len(found), _CHUNK_SIZE):
+            flight.add({'matches': found[start:start + _CHUNK_SIZE]})
+        flight.add({'skipped': [[index, fields] for index, values in skipped.items() for fields in values]})
+
+        # Folders on roots that missed the call timeout read as missing, such a walk is not kept for the other sessions
+        degraded = self._filesystem.get_degraded()
+        flight.add({'done': True, 'degraded': degraded}, True)
+        self._finish(key, flight, not degraded)
+
+    def _get(self, key, connection, rfile, wfile):
+        # Results only the Explorer can compute, the first connection gets a lease and puts the value when it has it.
+        # When it disconnects or does not put a value within the lease timeout, the next waiting connection gets the lease.
+        while True:
+            flight, owner = self._flight(key)
+            if not owner:
+                # A get flight ends with its only message
+                messages, done = flight.read(0)
+                if 'value' in messages[-1]:
+                    send_message(wfile, messages[-1])
+                    return
+                continue
+
+            try:
+                send_message(wfile, {'lease': True})
+                connection.settimeout(self._lease_timeout)
+                message = read_message(rfile)
+            except (EOFError, ValueError, socket.error):
+                message = {}
+
+            if message.get('op') == 'put':
+                flight.add({'value': message['value']}, True)
+                self._finish(key, flight, True)
+                send_message(wfile, {'done': True})
+            else:
+                flight.add({'retry': True}, True)
+                self._finish(key, flight, False)
+            return
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            message = read_message(self.rfile)
+            self.server.scan_daemon.handle(message, self.connection, self.rfile, self.wfile)
+        except (EOFError, ValueError, KeyError, socket.error):
+            pass
+
+    def finish(self):
+        # Output still buffered for a connection the Explorer closed can not be flushed any more
+        try:
+            socketserver.StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+class DaemonClient(object):
+    # Explorer side of the daemon. Every call raises DaemonError when the daemon can not be used,
+    # after a failure the daemon is not asked again for a while and the Explorer scans in process.
+    def __init__(self, port, host='127.0.0.1', connect_timeout=1.0, read_timeout=300.0, retry_interval=30.0, get_timeout=75.0):
+        self._address = (host, port)
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+
+        # A get waits at most for the lease timeout of the daemon before it gets the value or the lease itself
+        self._get_timeout = get_timeout
+        self._retry_interval = retry_interval
+        self._failed = None
+
+    ############################################################################
+    # Public methods
+
+    def available(self):
+        return self._failed is None or time.time() - self._failed > self._retry_interval
+
+    def ping(self):
+        return self._request({'op': 'ping'}, lambda rfile, wfile: read_message(rfile))
+
+    def invalidate(self):
+        return self._request({'op': 'invalidate'}, lambda rfile, wfile: read_message(rfile))
+
+    def walk(self, key, job, on_progress=None, on_degraded=None):
+        # Streams the walk of job, returns the matches and skipped versions like TemplateWalker.walk.
+        # on_degraded gets the storage roots the daemon skipped during the walk.
+        def receive(rfile, wfile):
+            matches = collections.defaultdict(list)
+            skipped = collections.defaultdict(list)
+            while True:
+                message = read_message(rfile)
+                if 'progress' in message:
+                    if on_progress:
+                        on_progress(message['progress'])
+                elif 'matches' in message:
+                    for index, path, fields in message['matches']:
+                        matches[index].append((path, fields))
+                elif 'skipped' in message:
+                    for index, fields in message['skipped']:
+                        skipped[index].append(fields)
+                elif 'error' in message:
+                    raise DaemonError(message['error'])
+                elif message.get('done'):
+                    if message.get('degraded') and on_degraded:
+                        on_degraded(message['degraded'])
+                    return matches, skipped
+        return self._request({'op': 'walk', 'key': key, 'job': job}, receive)
+
+    def get(self, key, compute):
+        # The value of key from the daemon, computed here when no other Explorer has it or is computing it
+        def receive(rfile, wfile):
+            message = read_message(rfile)
+            if 'value' in message:
+                return message['value']
+
+            value = compute()
+            send_message(wfile, {'op': 'put', 'value': value})
+            read_message(rfile)
+            return value
+        return self._request({'op': 'get', 'key': key}, receive, self._get_timeout)
+
+    ############################################################################
+    # Private methods
+
+    def _request(self, message, receive, read_timeout=None):
+        if not self.available():
+            raise DaemonError('Scan daemon on port {} is not available'.format(self._address[1]))
+
+        try:
+            connection = socket.create_connection(self._address, self._connect_timeout)
+        except socket.error as e:
+            self._failed = time.time()
+            raise DaemonError('Could not connect to the scan daemon on port {}: {}'.format(self._address[1], e))
+
+        connection.settimeout(read_timeout or self._read_timeout)
+        rfile = connection.makefile('rb')
+        wfile = connection.makefile('wb')
+        try:
+            send_message(wfile, message)
+            result = receive(rfile, wfile)
+            self._failed = None
+            return result
+        except (EOFError, ValueError, socket.error) as e:
+            self._failed = time.time()
+            raise DaemonError('Scan daemon request failed: {}'.format(e))
+        finally:
+            # Files of the socket keep it open, a lease is only given up once the connection is shut down
+            rfile.close()
+            wfile.close()
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan daemon shared by the Explorer sessions on this workstation.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--ttl', type=float, default=30.0, help='Seconds a walk or listing is shared')
+    parser.add_argument('--io-concurrency', type=int, default=4, help='Filesystem calls at once per storage root')
+    parser.add_argument('--memory-budget', type=float, default=64.0, help='Megabytes of cached directory listings')
+    parser.add_argument('--io-timeout', type=float, default=15.0, help='Seconds a filesystem call may take before its storage root is skipped')
+    parser.add_argument('--lease-timeout', type=float, default=60.0, help='Seconds a session may compute a shared result before another session takes over')
+    args = parser.parse_args(argv)
+
+    daemon = ScanDaemon(args.ttl, None, args.io_concurrency, memoryusage.megabytes(args.memory_budget), args.io_timeout, args.lease_timeout)
+    port = daemon.start(args.port)
+    sys.stdout.write('Explorer scan daemon listening on 127.0.0.1:{}\n'.format(port))
+    sys.stdout.flush()
+
+    try:
+        daemon.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import time
+
+class ScanProgress(object):
+    def __init__(self, templates_total, directories_start=0):
+        self._templates_total = templates_total
+        self._templates_done = 0
+        self._items = 0
+        self._directories_start = directories_start
+        self._directories = 0
+        self._start_time = time.time()
+
+    ############################################################################
+    # Public methods
+
+    def template_done(self, directories, items=0):
+        self._templates_done += 1
+        self.add_items(items, directories)
+
+    def add_items(self, items, directories):
+        self._items += items
+
+        # The filesystem is shared with other views, which may reset its counters
+        self._directories = max(directories - self._directories_start, self._directories)
+
+    def get_elapsed(self):
+        return time.time() - self._start_time
+
+    def get_eta(self):
+        # Remaining templates at the throughput of the templates done so far, None until there is a throughput
+        if not self._templates_done:
+            return None
+
+        remaining = max(self._templates_total - self._templates_done, 0)
+        return self.get_elapsed() / self._templates_done * remaining
+
+    def as_dict(self):
+        return {
+            'templates_done': self._templates_done,
+            'templates_total': self._templates_total,
+            'directories': self._directories,
+            'items': self._items,
+            'elapsed': self.get_elapsed(),
+            'eta': self.get_eta()
+        }
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--'
+
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return '{}s'.format(seconds)
+    elif seconds < 3600:
+        return '{}m {:02d}s'.format(seconds // 60, seconds % 60)
+    return '{}h {:02d}m'.format(seconds // 3600, seconds % 3600 // 60)
@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import threading
+
+import sgtk
+
+import filesystem
+import ioscheduler
+import memoryusage
+import scandaemon
+import templatewalker
+
+# Metadata fields of a PublishedFile shown by the Explorer, and the ids per query
+PUBLISH_DETAIL_FIELDS = ['path', 'created_by', 'created_at', 'version', 'description', 'image', 'published_file_type']
+_PUBLISH_DETAIL_BATCH = 500
+
+class ScanService(object):
+    def __init__(self, app):
+        self._app = app
+        self._lock = threading.RLock()
+        self._ttl = self._app.get_setting('filesystem_cache_ttl')
+
+        # Memory of every cache layer is reported to the ledger, each layer evicts its oldest entries over budget
+        self._ledger = memoryusage.MemoryLedger({
+            'items': memoryusage.megabytes(self._app.get_setting('memory_budget_items')),
+            'records': memoryusage.megabytes(self._app.get_setting('memory_budget_records')),
+            'publishes': memoryusage.megabytes(self._app.get_setting('memory_budget_publishes')),
+            'pixmaps': memoryusage.megabytes(self._app.get_setting('memory_budget_pixmaps'))
+        })
+
+        # Disk reads are scheduled per mount root, foreground scans go before size work.
+        # Calls on a mount that misses the call timeout fail until the mount answers again.
+        self._scheduler = ioscheduler.IoScheduler(
+            self._app.get_setting('io_mount_concurrency'),
+            self._app.get_setting('io_concurrency') or 1,
+            self._app.get_setting('io_slow_latency'),
+            call_timeout=self._app.get_setting('io_call_timeout'),
+            retry_interval=self._app.get_setting('io_degraded_retry'))
+
+        # Filesystem access shared by every Explorer view of the app
+        self._filesystem = filesystem.FileSystem(self._ttl, self._scheduler, self._ledger)
+
+        # Resolved templates per entity type, publishes and listed cache paths
+        self._templates = {}
+        self._results = {}
+        self._result_sizes = {}
+        self._records_bytes = 0
+        self._records_evictions = 0
+        self._publishes_bytes = 0
+        self._publishes_evictions = 0
+
+        # Publish metadata per published path, queried for the rows in view and the detail item only.
+        # Paths another thread is querying right now are waited for instead of queried again.
+        self._publish_details = {}
+        self._publish_details_bytes = 0
+        self._publish_details_pending = set()
+        self._publish_details_condition = threading.Condition(self._lock)
+
+        self._ledger.add_reporter('records', self._filesystem.get_memory)
+        self._ledger.add_reporter('records', self._get_records_memory)
+        self._ledger.add_reporter('publishes', self._get_publishes_memory)
+
+        # Scans that are running right now, other views wait for these instead of scanning again.
+        # A waiting scan asks the cancel check of its thread, so it stops waiting when its view cancels it.
+        self._in_flight = {}
+        self._local = threading.local()
+
+        # Walks, publishes and listings are shared with the other Explorer sessions on the workstation through the scan daemon.
+        # Without a daemon, or when it stops answering, everything is scanned in process.
+        daemon_port = self._app.get_setting('scan_daemon_port')
+        self._daemon = scandaemon.DaemonClient(daemon_port) if daemon_port else None
+        self._daemon_scope = None
+
+        # Storage roots the scan daemon skipped, with the time until they count as skipped
+        self._remote_degraded = {}
+        self._degraded_retry = self._app.get_setting('io_degraded_retry')
+
+    ############################################################################
+    # Public methods
+
+    def get_filesystem(self):
+        return self._filesystem
+
+    def get_templates(self, item_type):
+        with self._lock:
+            if item_type not in self._templates:
+                self._templates[item_type] = self._resolve_templates(item_type)
+            return self._templates[item_type]
+
+    def get_publishes(self):
+        publishes = self._shared('publishes', lambda: self._daemon_get('publishes', self._find_publishes, lambda publishes: sorted(publishes.items()), dict))
+
+        # Publishes over budget are only used by the scan that asked for them, the next scan queries them again
+        with self._lock:
+            if self._ledger.over_budget('publishes') and 'publishes' in self._results:
+                self._drop_result('publishes')
+                self._publishes_evictions += 1
+        return publishes
+
+    def get_publish_details(self, paths):
+        # Metadata of the published paths as dicts, None for paths that were not published.
+        # Paths that were not asked for before are queried by publish id, in as few queries as possible.
+        publishes = self.get_publishes()
+
+        with self._lock:
+            missing = [path for path in set(paths) if path in publishes and path not in self._publish_details and path not in self._publish_details_pending]
+            waiting = [path for path in set(paths) if path in self._publish_details_pending]
+            self._publish_details_pending.update(missing)
+
+        if missing:
+            details = dict((path, {}) for path in missing)
+            try:
+                paths_by_id = dict((publishes[path], path) for path in missing)
+                ids = sorted(paths_by_id.keys())
+                for start in range(0, len(ids), _PUBLISH_DETAIL_BATCH):
+                    filters = [['id', 'in', ids[start:start + _PUBLISH_DETAIL_BATCH]]]
+                    for publish_file in self._app.shotgun.find('PublishedFile', filters, PUBLISH_DETAIL_FIELDS):
+                        details[paths_by_id[publish_file['id']]] = self._publish_detail(publish_file)
+            finally:
+                with self._publish_details_condition:
+                    self._publish_details.update(details)
+                    self._publish_details_bytes += memoryusage.deep_size(details)
+                    self._publish_details_pending.difference_update(missing)
+                    self._publish_details_condition.notify_all()
+
+        with self._publish_details_condition:
+            while any(path in self._publish_details_pending for path in waiting):
+                self._publish_details_condition.wait(0.5)
+
+            result = [self._publish_details.get(path) if path in publishes else None for path in paths]
+
+            # Details over budget are dropped all at once, they are queried again for the rows in view
+            if self._ledger.over_budget('publishes') and self._publish_details:
+                self._publish_details.clear()
+                self._publish_details_bytes = 0
+                self._publishes_evictions += 1
+        return result
+
+    def get_publish_thumbnail(self, details):
+        # Local copy of the thumbnail of a publish, downloaded once into the cache location of the app
+        if not details or not details.get('thumbnail'):
+            return None
+
+        thumbnail_path = os.path.join(self._app.cache_location, 'thumbnails', 'PublishedFile_{}.jpg'.format(details['id']))
+        if not os.path.exists(thumbnail_path):
+            try:
+                if not os.path.isdir(os.path.dirname(thumbnail_path)):
+                    os.makedirs(os.path.dirname(thumbnail_path))
+                sgtk.util.shotgun.download_url(self._app.shotgun, details['thumbnail'], thumbnail_path)
+            except Exception as e:
+                self._app.log_debug('Could not download the thumbnail of publish {}: {}'.format(details['id'], e))
+                return None
+        return thumbnail_path
+
+    def get_memory_ledger(self):
+        return self._ledger
+
+    def get_degraded(self):
+        # Storage roots skipped by the scans of this process or by the scan daemon
+        now = time.time()
+        with self._lock:
+            remote = [root for root, until in self._remote_degraded.items() if until > now]
+        return sorted(set(self._filesystem.get_degraded()) | set(remote))
+
+    def set_thread_cancelled(self, cancelled):
+        # Cancel check of the scan running on the current thread
+        self._local.cancelled = cancelled
+
+    def list_cache_paths(self, template, ui_fields, version_limit, lister, modified_window=None):
+        # lister does the actual listing for the first view that asks, the result is shared with the others
+        key = ('paths', template.name, tuple(sorted(ui_fields.items())), version_limit, modified_window)
+        return self._shared(key, lambda: self._daemon_get(key, lambda: lister(template, ui_fields), list, tuple))
+
+    def walk_templates(self, template_names, fixed_fields, version_limit, walk, walk_job=None, on_progress=None, modified_window=None):
+        # Walks of the same templates and fields are shared like the listings.
+        # With a walk job the scan daemon walks, and streams the progress and matches back.
+        fields_key = tuple(sorted((key, tuple(sorted(values))) for key, values in fixed_fields.items()))
+        key = ('walk', tuple(template_names), fields_key, version_limit, modified_window)
+        if walk_job is None or not self._daemon:
+            return self._shared(key, walk)
+        return self._shared(key, lambda: self._daemon_walk(key, walk_job, walk, on_progress))
+
+    def invalidate(self):
+        with self._lock:
+            for key in list(self._results.keys()):
+                self._drop_result(key)
+            self._publish_details.clear()
+            self._publish_details_bytes = 0
+
+            # Scans that are running keep their result to themselves, the next scan reads from disk again
+            self._in_flight.clear()
+        self._filesystem.invalidate()
+
+        # A refresh reads from disk again in every Explorer that uses the daemon
+        if self._daemon and self._daemon.available():
+            try:
+                self._daemon.invalidate()
+            except scandaemon.DaemonError as e:
+                self._app.log_debug('Could not invalidate the scan daemon: {}'.format(e))
+
+    def shutdown(self):
+        self._scheduler.shutdown()
+
+        with self._lock:
+            for key in list(self._results.keys()):
+                self._drop_result(key)
+            self._templates.clear()
+            self._publish_details.clear()
+            self._publish_details_bytes = 0
+        self._filesystem.invalidate()
+
+    ############################################################################
+    # Private methods
+
+    def _shared(self, key, compute):
+        with self._lock:
+            entry = self._results.get(key)
+            if entry and time.time() - entry[0] < self._ttl:
+                return entry[1]
+
+            in_flight = self._in_flight.get(key)
+            if not in_flight:
+                in_flight = threading.Event()
+                self._in_flight[key] = in_flight
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            self._app.log_debug('Waiting for a running scan of {}'.format(key))
+
+            # Scans are cancelled cooperatively, the owner always sets the event once it is done or cancelled
+            cancelled = getattr(self._local, 'cancelled', None)
+            while not in_flight.wait(0.5):
+                if cancelled and cancelled():
+                    raise templatewalker.ScanCancelled()
+
+            with self._lock:
+                entry = self._results.get(key)
+                if entry:
+                    return entry[1]
+
+            # The owner was cancelled or failed, this scan computes the result itself
+            return self._shared(key, compute)
+
+        try:
+            value = compute()
+            size = memoryusage.deep_size(value)
+            with self._lock:
+                # A refresh while the scan ran dropped its entry, the result may predate the refresh
+                if self._in_flight.get(key) is in_flight:
+                    self._store_result(key, value, size)
+            return value
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+            in_flight.set()
+
+    def _daemon_key(self, key):
+        # Sessions of other projects or configurations can use the same daemon
+        if self._daemon_scope is None:
+            self._daemon_scope = [self._app.context.project['name'], self._app.sgtk.pipeline_configuration.get_path()]
+        return json.dumps(self._daemon_scope + [key])
+
+    def _daemon_get(self, key, compute, encode, decode):
+        # Values only an Explorer can compute, the daemon hands out the value of another session or lets this one compute it
+        if not self._daemon or not self._daemon.available():
+            return compute()
+
+        computed = []
+        def compute_encoded():
+            computed.append(compute())
+            return encode(computed[0])
+
+        try:
+            return decode(self._daemon.get(self._daemon_key(key), compute_encoded))
+        except scandaemon.DaemonError as e:
+            self._app.log_debug('Scanning {} in process: {}'.format(key, e))
+            return computed[0] if computed else compute()
+
+    def _daemon_walk(self, key, walk_job, walk, on_progress):
+        if not self._daemon.available():
+            return walk()
+
+        try:
+            return self._daemon.walk(self._daemon_key(key), walk_job, on_progress, self._add_remote_degraded)
+        except scandaemon.DaemonError as e:
+            self._app.log_debug('Walking in process: {}'.format(e))
+            return walk()
+
+    def _add_remote_degraded(self, roots):
+        with self._lock:
+            for root in roots:
+                self._remote_degraded[root] = time.time() + self._degraded_retry
+
+    def _store_result(self, key, value, size):
+        self._drop_result(key)
+        self._results[key] = (time.time(), value)
+        self._result_sizes[key] = size
+
+        if key == 'publishes':
+            self._publishes_bytes = size
+            return
+
+        self._records_bytes += size
+
+        # Oldest listings and walks go first, the result that was just stored is kept
+        if self._ledger.over_budget('records'):
+            target = self._ledger.get_share('records', self._records_bytes)
+            for entry_time, old_key in sorted(((entry[0], old_key) for old_key, entry in self._results.items()), key=lambda k: k[0]):
+                if self._records_bytes <= target:
+                    break
+                if old_key in (key, 'publishes'):
+                    continue
+                self._drop_result(old_key)
+                self._records_evictions += 1
+
+    def _drop_result(self, key):
+        self._results.pop(key, None)
+        size = self._result_sizes.pop(key, 0)
+        if key == 'publishes':
+            self._publishes_bytes = 0
+        else:
+            self._records_bytes -= size
+
+    def _get_records_memory(self):
+        return self._records_bytes, len(self._result_sizes) - int('publishes' in self._result_sizes), self._records_evictions
+
+    def _get_publishes_memory(self):
+        entries = int('publishes' in self._result_sizes) + len(self._publish_details)
+        return self._publishes_bytes + self._publish_details_bytes, entries, self._publishes_evictions
+
+    def _find_publishes(self):
+        # Publish id per published path, the metadata is queried by id for the rows in view
+        publishes = {}
+        for publish_file in self._app.shotgun.find('PublishedFile', [['project.Project.name', 'is', self._app.context.project['name']]], ['path']):
+            publishes[publish_file['path']['local_path'].replace('/', os.sep)] = publish_file['id']
+        return publishes
+
+    def _publish_detail(self, publish_file):
+        created_at = publish_file.get('created_at')
+        return {
+            'id': publish_file['id'],
+            'user': (publish_file.get('created_by') or {}).get('name') or '',
+            'date': created_at.strftime('%Y-%m-%d %H:%M') if created_at else '',
+            'version': (publish_file.get('version') or {}).get('name') or '',
+            'description': publish_file.get('description') or '',
+            'publish_type': (publish_file.get('published_file_type') or {}).get('name') or '',
+            'thumbnail': publish_file.get('image')
+        }
+
+    def _resolve_templates(self, item_type):
+        templates = []
+
+        # Get templates in from shot and asset context
+        search_dict = self._app.shotgun.find_one(item_type, [['project.Project.name', 'is', self._app.context.project['name']]], ['code'])
+        search_dict['project'] = self._app.context.project
+
+        entity_context = self._app.sgtk.context_from_entity_dictionary(search_dict)
+
+        # Statically add the tk-houdini engine as I could not get this to work with the tk-desktop engine
+        # Still contacting support about it :(
+        settings = sgtk.platform.find_app_settings('tk-houdini', self._app.name, self._app.sgtk, entity_context)
+        self._app.log_debug('Scan Service Settings {}'.format(settings))
+
+        if settings:
+            for output_profile in settings[0]["settings"]["templates"]:
+                cache_template = self._app.get_template_by_name(output_profile['cache_template'])
+
+                work_template = []
+                if output_profile['work_template']:
+                    for template_name in output_profile['work_template']:
+                        work_template.append(self._app.get_template_by_name(template_name))
+
+                preview_template = ''
+                if output_profile['preview_template']:
+                    preview_template = self._app.get_template_by_name(output_profile['preview_template'])
+
+                templates.append({'cache_template': cache_template, 'work_template': work_template, 'preview_template': preview_template})
+        else:
+            self._app.log_error("Could not find settings for the cachemanager. App will not work!")
+
+        return templates
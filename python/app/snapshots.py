@@ -0,0 +1,120 @@
+import os
+import re
+import json
+import time
+
+# Keep this module free of sgtk and Qt imports, like the aggregate module.
+
+SNAPSHOT_FORMAT = 1
+
+CHANGE_NEW = 'New'
+CHANGE_NEW_VERSION = 'New version'
+CHANGE_UPDATED = 'Updated'
+CHANGE_UNCHANGED = 'Unchanged'
+CHANGE_REMOVED = 'Removed'
+
+# Change of a group is its most important path change, a group that lost some of its paths was updated
+_CHANGE_ORDER = (CHANGE_NEW, CHANGE_NEW_VERSION, CHANGE_UPDATED)
+
+def group_record(versions, limited):
+    # versions maps the paths of a group to (version, mtime of their folder), limited is set when the version limit hid older versions
+    return {'versions': dict((path, list(value)) for path, value in versions.items()), 'limited': bool(limited)}
+
+def group_change(old_record, record):
+    if old_record is None:
+        return CHANGE_NEW
+
+    changes = set(change['change'] for change in _record_changes(old_record, record))
+    for change in _CHANGE_ORDER:
+        if change in changes:
+            return change
+    return CHANGE_UPDATED if changes else CHANGE_UNCHANGED
+
+def diff(old_groups, groups):
+    # Changes per path between two snapshots, unchanged paths are left out.
+    # Paths whose folder mtime did not change are not compared any further.
+    old_groups = old_groups or {}
+
+    changes = []
+    for key in sorted(set(old_groups.keys()) | set(groups.keys())):
+        changes.extend(_record_changes(old_groups.get(key), groups.get(key)))
+    return changes
+
+def _record_changes(old_record, record):
+    old_versions = old_record['versions'] if old_record else {}
+    versions = record['versions'] if record else {}
+
+    newest_old = max([value[0] for value in old_versions.values()] or [0])
+    oldest = min([value[0] for value in versions.values()] or [0])
+
+    changes = []
+    for path, (version, mtime) in sorted(versions.items()):
+        old_value = old_versions.get(path)
+        if old_value is None:
+            if not old_record:
+                change = CHANGE_NEW
+            elif version > newest_old:
+                change = CHANGE_NEW_VERSION
+            else:
+                change = CHANGE_UPDATED
+        elif old_value[1] != mtime:
+            change = CHANGE_UPDATED
+        else:
+            continue
+        changes.append({'change': change, 'path': path, 'version': version})
+
+    for path, (version, mtime) in sorted(old_versions.items()):
+        if path in versions:
+            continue
+
+        # Versions below the version limit were not scanned, they are not gone
+        if record and record['limited'] and version < oldest:
+            continue
+        changes.append({'change': CHANGE_REMOVED, 'path': path, 'version': version})
+    return changes
+
+class SnapshotStore(object):
+    def __init__(self, directory):
+        self._directory = directory
+
+    ############################################################################
+    # Public methods
+
+    def load(self, item_type, entity):
+        # Groups of the last snapshot of the entity, None when the entity was never scanned or the snapshot is unreadable
+        try:
+            with open(self._path(item_type, entity)) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if snapshot.get('format') != SNAPSHOT_FORMAT:
+            return None
+        return snapshot['groups']
+
+    def get_time(self, item_type, entity):
+        try:
+            return os.path.getmtime(self._path(item_type, entity))
+        except OSError:
+            return None
+
+    def save(self, item_type, entity, groups):
+        # Written next to the old snapshot first, so a crash never leaves half a snapshot behind
+        path = self._path(item_type, entity)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        with open(temp_path, 'w') as snapshot_file:
+            json.dump({'format': SNAPSHOT_FORMAT, 'time': time.time(), 'groups': groups}, snapshot_file, separators=(',', ':'))
+
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    ############################################################################
+    # Private methods
+
+    def _path(self, item_type, entity):
+        return os.path.join(self._directory, '{}_{}.json'.format(item_type, re.sub(r'[^\w.-]', '_', entity)))
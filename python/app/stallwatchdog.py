@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import threading
+import traceback
+
+from sgtk.platform.qt import QtCore
+
+# Frames below this folder are call sites of the Explorer, the frames above them are the call that blocked
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StallWatchdog(QtCore.QObject):
+    # The ui thread is sampled while its heartbeat is late, the samples are only kept for stalls over the threshold
+    _MIN_INTERVAL = 0.02
+
+    def __init__(self, app, threshold):
+        super(StallWatchdog, self).__init__()
+
+        self._app = app
+        self._threshold = threshold
+        self._interval = max(threshold / 4.0, self._MIN_INTERVAL)
+        self._report_path = os.path.join(app.cache_location, 'stall_reports', 'explorer_{}.txt'.format(os.getpid()))
+
+        # The watchdog is created on the ui thread, the heartbeat timer runs in its event loop
+        self._ui_thread_id = threading.current_thread().ident
+        self._last_beat = None
+        self._heartbeat = QtCore.QTimer(self)
+        self._heartbeat.setInterval(int(self._interval * 1000))
+        self._heartbeat.timeout.connect(self._beat)
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+        # Stalled seconds, stall count, worst stall and blocking calls per call site
+        self._sites = {}
+        self._stall_count = 0
+        self._stalled_time = 0.0
+        self._started = None
+
+    ############################################################################
+    # Public methods
+
+    def start(self):
+        self._started = time.time()
+        self._heartbeat.start()
+
+        self._monitor = threading.Thread(target=self._watch, name='ExplorerStallWatchdog')
+        self._monitor.daemon = True
+        self._monitor.start()
+        self._app.log_debug('Stall watchdog reports ui stalls over {}s to {}'.format(self._threshold, self._report_path))
+
+    def stop(self):
+        self._heartbeat.stop()
+        self._stop_event.set()
+        if self._monitor:
+            self._monitor.join()
+            self._monitor = None
+        self._write_report()
+
+    def get_report_path(self):
+        return self._report_path
+
+    def get_sites(self):
+        # Call sites ranked by the seconds the ui thread was stalled in them
+        with self._lock:
+            sites = [dict(site, site=key) for key, site in self._sites.items()]
+        return sorted(sites, key=lambda k: k['time'], reverse=True)
+
+    ############################################################################
+    # Private methods
+
+    def _beat(self):
+        self._last_beat = time.time()
+
+    def _watch(self):
+        samples = []
+        stall_time = 0.0
+        while not self._stop_event.wait(self._interval):
+            # Nothing is measured until the event loop runs, the startup of the host is not a stall
+            last_beat = self._last_beat
+            if last_beat is None:
+                continue
+
+            overdue = time.time() - last_beat - self._interval
+            if overdue > self._interval:
+                frame = sys._current_frames().get(self._ui_thread_id)
+                if frame is not None:
+                    samples.append(traceback.extract_stack(frame))
+                stall_time = overdue
+            elif samples:
+                if stall_time >= self._threshold:
+                    self._add_stall(stall_time, samples)
+                samples = []
+
+    def _add_stall(self, stall_time, samples):
+        # Every sample stands for an equal part of the stall
+        sample_time = stall_time / len(samples)
+        stall_sites = {}
+        for stack in samples:
+            site, call = self._split_stack(stack)
+            stall_sites.setdefault(site, []).append(call)
+
+        with self._lock:
+            self._stall_count += 1
+            self._stalled_time += stall_time
+
+            for site, calls in stall_sites.items():
+                entry = self._sites.setdefault(site, {'time': 0.0, 'stalls': 0, 'worst': 0.0, 'calls': {}})
+                site_time = sample_time * len(calls)
+                entry['time'] += site_time
+                entry['stalls'] += 1
+                entry['worst'] = max(entry['worst'], site_time)
+                for call in calls:
+                    entry['calls'][call] = entry['calls'].get(call, 0) + 1
+
+        worst_site = max(stall_sites.items(), key=lambda k: len(k[1]))[0]
+        self._app.log_warning('Ui thread stalled for {:.2f}s in {}'.format(stall_time, self._format_site(worst_site)))
+        self._write_report()
+
+    def _split_stack(self, stack):
+        # The innermost frame of the Explorer is the call site, the innermost frame overall is the call that blocked
+        site = None
+        for filename, lineno, function, text in reversed(stack):
+            if os.path.abspath(filename).startswith(_APP_ROOT):
+                site = (os.path.relpath(filename, _APP_ROOT), lineno, function, text or '')
+                break
+
+        filename, lineno, function, text = stack[-1]
+        call = '{}:{} {}'.format(os.path.basename(filename), lineno, function)
+        if site is None:
+            site = ('<outside the explorer>', 0, function, text or '')
+        return site, call
+
+    def _format_site(self, site):
+        filename, lineno, function, text = site
+        if not lineno:
+            return filename
+        return '{}:{} in {}'.format(filename, lineno, function)
+
+    def _write_report(self):
+        sites = self.get_sites()
+        with self._lock:
+            stall_count = self._stall_count
+            stalled_time = self._stalled_time
+
+        lines = [
+            'Explorer ui stalls over {}s since {}'.format(self._threshold, time.ctime(self._started or time.time())),
+            '{} stalls, {:.2f}s stalled in total'.format(stall_count, stalled_time),
+            ''
+        ]
+        for rank, site in enumerate(sites, 1):
+            lines.append('{}. {}  {:.2f}s in {} stalls, worst {:.2f}s'.format(
+                rank, self._format_site(site['site']), site['time'], site['stalls'], site['worst']))
+            if site['site'][3]:
+                lines.append('    {}'.format(site['site'][3]))
+
+            calls = sorted(site['calls'].items(), key=lambda k: k[1], reverse=True)
+            total = float(sum(count for call, count in calls))
+            for call, count in calls[:3]:
+                lines.append('    {:3.0f}% blocked in {}'.format(count / total * 100, call))
+            lines.append('')
+
+        # Written next to the old report first, like the scan snapshots
+        temp_path = '{}.tmp'.format(self._report_path)
+        try:
+            if not os.path.isdir(os.path.dirname(self._report_path)):
+                os.makedirs(os.path.dirname(self._report_path))
+            with open(temp_path, 'w') as report_file:
+                report_file.write('\n'.join(lines))
+            if os.path.exists(self._report_path):
+                os.remove(self._report_path)
+            os.rename(temp_path, self._report_path)
+        except (IOError, OSError) as e:
+            self._app.log_warning('Could not write the stall report {}: {}'.format(self._report_path, e))
@@ -0,0 +1,255 @@
+import os
+import re
+import time
+import collections
+
+# Keep this module free of sgtk and Qt imports, like the aggregate module.
+
+_INTEGER_PATTERN = r'\d+'
+_SEQUENCE_PATTERN = r'\d+'
+_STRING_PATTERN = r'[^/]+?'
+
+class ScanCancelled(Exception):
+    # Raised by a walk whose cancelled callback returns True, the cache manager stops its scan with it as well
+    pass
+
+def segment_patterns(definition, key_types, fixed_fields=None):
+    # Regular expression per folder level of a template definition.
+    # Fixed fields only match their given values, a fixed field can be a single value or a collection of values.
+    # Returns None when an optional [] section spans several folder levels, those templates can not be walked.
+    fixed_fields = fixed_fields or {}
+
+    patterns = []
+    pattern = ''
+    used_keys = set()
+    depth = 0
+    for token in re.split(r'(\{[^}]+\}|\[|\]|/)', definition.replace('\\', '/').strip('/')):
+        if not token:
+            continue
+        elif token == '/':
+            if depth:
+                return None
+            patterns.append('^{}$'.format(pattern))
+            pattern = ''
+            used_keys = set()
+        elif token == '[':
+            depth += 1
+            pattern += '(?:'
+        elif token == ']':
+            depth -= 1
+            pattern += ')?'
+        elif token.startswith('{'):
+            key = token[1:-1]
+            if key in used_keys:
+                pattern += '(?P={})'.format(key)
+                continue
+
+            if key in fixed_fields:
+                values = fixed_fields[key]
+                if isinstance(values, (list, tuple, set, frozenset)):
+                    values = sorted(values)
+                else:
+                    values = [values]
+                key_pattern = '|'.join(re.escape(str(value)) for value in values) or '(?!)'
+            elif key_types.get(key) == 'sequence':
+                key_pattern = _SEQUENCE_PATTERN
+            elif key_types.get(key) == 'integer':
+                key_pattern = _INTEGER_PATTERN
+            else:
+                key_pattern = _STRING_PATTERN
+
+            pattern += '(?P<{}>{})'.format(key, key_pattern)
+            used_keys.add(key)
+        else:
+            pattern += re.escape(token)
+
+    patterns.append('^{}$'.format(pattern))
+    return patterns
+
+def resolve_window(modified_window):
+    # Relative windows are ('relative', hours) and end now, they are resolved to (since, None) when they are used.
+    # They start on the minute, so scans within the same minute share their listings.
+    if modified_window and modified_window[0] == 'relative':
+        return (int(time.time()) // 60 * 60 - modified_window[1] * 3600, None)
+    return modified_window
+
+def in_window(mtime, modified_window):
+    # modified_window is (since, until) in seconds since the epoch, either end can be None
+    since, until = modified_window
+    return (since is None or mtime >= since) and (until is None or mtime <= until)
+
+class _Node(object):
+    def __init__(self, pattern=None):
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE if os.name == 'nt' else 0) if pattern else None
+        self.children = collections.OrderedDict()
+
+        # Templates ending at this node, and all templates below it
+        self.leaves = []
+        self.templates = []
+
+        # Versions of the templates below are stored in the folders matched by this node
+        self.version_folder = False
+
+class TemplateWalker(object):
+    def __init__(self, fixed_fields=None):
+        self._fixed_fields = fixed_fields or {}
+
+        # A trie per root path, shared folder levels of different templates are listed once
+        self._roots = collections.OrderedDict()
+        self._key_types = {}
+        self._sequence_formats = {}
+
+    ############################################################################
+    # Public methods
+
+    def add_template(self, index, root_path, definition, key_types, sequence_formats=None):
+        # Returns False when the template can not be walked and has to be expanded on its own
+        patterns = segment_patterns(definition, key_types, self._fixed_fields)
+        if not patterns:
+            return False
+
+        self._key_types[index] = key_types
+        self._sequence_formats[index] = sequence_formats or {}
+
+        node = self._roots.setdefault(os.path.normpath(root_path), _Node())
+        node.templates.append(index)
+
+        version_found = False
+        for level, pattern in enumerate(patterns):
+            node = node.children.setdefault(pattern, _Node(pattern))
+            node.templates.append(index)
+
+            # The highest folder with the version holds all versions of a cache
+            if not version_found and '(?P<version>' in pattern:
+                version_found = True
+                if level < len(patterns) - 1:
+                    node.version_folder = True
+
+        node.leaves.append(index)
+        return True
+
+    def walk(self, listdir, version_limit=0, on_directory=None, stat=None, modified_window=None, cancelled=None):
+        # Walk all roots once, listdir returns the names in a folder or None.
+        # Returns the matches as {index: [(path, fields)]} and the version folders skipped by the version limit as {index: [fields]}.
+        # With a modified window, stat returns the stat result of a folder or None, folders outside the window are not listed.
+        # cancelled is asked before every folder, the walk raises ScanCancelled once it returns True.
+        matches = collections.defaultdict(list)
+        skipped = collections.defaultdict(list)
+        seen = set()
+
+        if not stat:
+            modified_window = None
+
+        stack = [(node, root_path, {}) for root_path, node in reversed(list(self._roots.items()))]
+        while stack:
+            if cancelled and cancelled():
+                raise ScanCancelled()
+
+            node, path, fields = stack.pop()
+
+            # A folder that only holds caches gets a newer mtime when a cache is written to it
+            if modified_window and modified_window[0] is not None and node.children and not any(child.children for child in node.children.values()):
+                stat_result = stat(path)
+                if stat_result is not None and stat_result.st_mtime < modified_window[0]:
+                    continue
+
+            names = listdir(path)
+            if on_directory:
+                on_directory()
+            if not names:
+                continue
+
+            for child in node.children.values():
+                child_matches = []
+                for name in names:
+                    match = child.regex.match(name)
+                    if not match:
+                        continue
+
+                    child_fields = self._merge_fields(fields, match.groupdict(), child.templates[0])
+                    if child_fields is not None:
+                        child_matches.append((name, match, child_fields))
+
+                # The mtime of a version folder is the time its version was written
+                if modified_window and child.version_folder:
+                    child_matches = [child_match for child_match in child_matches if self._modified_in(stat, os.path.join(path, child_match[0]), modified_window)]
+
+                if version_limit and child.version_folder:
+                    child_matches = self._limit_versions(child, child_matches, version_limit, skipped)
+
+                for name, match, child_fields in child_matches:
+                    child_path = os.path.join(path, name)
+
+                    for index in child.leaves:
+                        leaf_path, leaf_fields = self._abstract_path(index, path, name, match, child_fields)
+                        if (index, leaf_path) not in seen:
+                            seen.add((index, leaf_path))
+                            matches[index].append((leaf_path, leaf_fields))
+
+                    if child.children:
+                        stack.append((child, child_path, child_fields))
+
+        return matches, skipped
+
+    ############################################################################
+    # Private methods
+
+    def _merge_fields(self, fields, values, index):
+        key_types = self._key_types[index]
+
+        merged = fields.copy()
+        for key, value in values.items():
+            if value is None:
+                continue
+
+            if key_types.get(key) == 'integer':
+                value = int(value)
+            elif key_types.get(key) == 'sequence':
+                continue
+
+            # Keys that appear on several folder levels have to agree
+            if key in merged and merged[key] != value:
+                return None
+            merged[key] = value
+        return merged
+
+    def _modified_in(self, stat, path, modified_window):
+        stat_result = stat(path)
+        return stat_result is None or in_window(stat_result.st_mtime, modified_window)
+
+    def _limit_versions(self, node, child_matches, version_limit, skipped):
+        # Only the newest version folders of every cache are walked, the others are reported as skipped
+        groups = collections.OrderedDict()
+        for child_match in child_matches:
+            fields = child_match[2]
+            key = tuple(sorted((key, value) for key, value in fields.items() if key != 'version'))
+            groups.setdefault(key, []).append(child_match)
+
+        kept = []
+        for group in groups.values():
+            group.sort(key=lambda k: k[2].get('version'))
+            kept.extend(group[-version_limit:])
+            for child_match in group[:-version_limit]:
+                for index in node.templates:
+                    skipped[index].append(child_match[2])
+        return kept
+
+    def _abstract_path(self, index, path, name, match, fields):
+        # Frame numbers are replaced by the sequence format, so a sequence is a single path like abstract_paths_from_template returns
+        sequence_formats = self._sequence_formats[index]
+
+        # Spans are replaced from the right, so the offsets of the spans before them still point into the original name
+        fields = fields.copy()
+        spans = []
+        for key, key_format in sequence_formats.items():
+            if match.groupdict().get(key) is None:
+                continue
+
+            spans.append((match.span(key), key_format))
+            fields[key] = key_format
+
+        for (start, end), key_format in sorted(spans, reverse=True):
+            name = name[:start] + key_format + name[end:]
+
+        return os.path.join(path, name), fields
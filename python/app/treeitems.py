@@ -1,13 +1,129 @@
 import os
+import sys
 from datetime import datetime
 
 from sgtk.platform.qt import QtGui
 
-class TopLevelTreeItem(QtGui.QTreeWidgetItem):
+import diskusage
+import integrity
+import memoryusage
+
+class BaseTreeItem(QtGui.QTreeWidgetItem):
+    def __init__(self, column_names):
+        super(BaseTreeItem, self).__init__()
+        self._column_names = column_names
+        self._size = None
+        self._warnings = {}
+
+        # Values of the lazy columns, filled in once the row has been in view
+        self._column_values = {}
+
+    def __lt__(self, other):
+        tree_widget = self.treeWidget()
+        if tree_widget and tree_widget.sortColumn() == self._column_names.index_name('size'):
+            return (self.get_size() or 0) < (other.get_size() or 0)
+        return super(BaseTreeItem, self).__lt__(other)
+
+    def add_size(self, size):
+        # Sizes arrive per cache from the disk usage thread and are summed up the tree
+        self._size = (self._size or 0) + size
+        self.setText(self._column_names.index_name('size'), diskusage.format_size(self._size))
+
+        parent = self.parent()
+        if isinstance(parent, BaseTreeItem):
+            parent.add_size(size)
+
+    def get_size(self):
+        return self._size
+
+    def set_column_value(self, name, value):
+        self._column_values[name] = value
+        self.setText(self._column_names.index_name(name), value)
+
+    def get_column_value(self, name):
+        return self._column_values.get(name)
+
+    def set_warning(self, source, text):
+        # Warnings are kept per source, a parent shows that one of its children has a warning
+        if text:
+            self._warnings[source] = text
+        else:
+            self._warnings.pop(source, None)
+
+        brush = QtGui.QBrush(QtGui.QColor(230, 140, 40)) if self._warnings else QtGui.QBrush()
+        tool_tip = '\n'.join(self._warnings.values())
+        for column in range(len(self._column_names.get_nice_names())):
+            self.setForeground(column, brush)
+            self.setToolTip(column, tool_tip)
+
+        parent = self.parent()
+        if isinstance(parent, BaseTreeItem):
+            parent.set_warning(id(self), 'Contains incomplete sequences' if self._warnings else None)
+
+    def get_warnings(self):
+        return list(self._warnings.values())
+
+    def get_memory_size(self):
+        # Estimate of the item and its children, the column texts are stored as utf-16 by Qt
+        size = memoryusage.TREE_ITEM_OVERHEAD + sys.getsizeof(self)
+        for column in range(self.columnCount()):
+            size += len(self.text(column)) * 2
+
+        for child_index in range(self.childCount()):
+            child = self.child(child_index)
+            if isinstance(child, BaseTreeItem):
+                size += child.get_memory_size()
+        return size
+
+    def clear_size(self):
+        self._size = None
+        self.setText(self._column_names.index_name('size'), '')
+
+        for child_index in range(self.childCount()):
+            child = self.child(child_index)
+            if isinstance(child, BaseTreeItem):
+                child.clear_size()
+
+class EntityTreeItem(BaseTreeItem):
+    def __init__(self, name, column_names):
+        super(EntityTreeItem, self).__init__(column_names)
+        self._name = name
+
+        self.setText(self._column_names.index_name('name'), name)
+
+    def post_process(self):
+        # Show the most recent modification of all caches of the entity
+        modified = ''
+        for child_index in range(self.childCount()):
+            modified = max(modified, self.child(child_index).get_properties()['modified'])
+        self.setText(self._column_names.index_name('modif'), modified)
+
+    def get_name(self):
+        return self._name
+
+    def item_expand(self):
+        pass
+
+class LoadMoreTreeItem(BaseTreeItem):
+    def __init__(self, column_names, data):
+        super(LoadMoreTreeItem, self).__init__(column_names)
+        self._data = data
+
+        count = len(data['older_versions']) + len(data['skipped_versions'])
+        self.setText(self._column_names.index_name('name'), 'Load {} older versions...'.format(count))
+
+    def get_data(self):
+        return self._data
+
+    def item_expand(self):
+        pass
+
+class TopLevelTreeItem(BaseTreeItem):
     def __init__(self, path, fields, column_names):
-        super(TopLevelTreeItem, self).__init__()
+        super(TopLevelTreeItem, self).__init__(column_names)
         self._fields = fields
-        self._column_names = column_names
+        self._change = None
+        self._modified = None
 
     def post_process(self):
         self._find_latest_child()
@@ -23,7 +139,8 @@ class TopLevelTreeItem(QtGui.QTreeWidgetItem):
     def _find_latest_child(self):
         children = []
         for child_index in range(self.childCount()):
-            children.append(self.child(child_index))
+            if not isinstance(self.child(child_index), LoadMoreTreeItem):
+                children.append(self.child(child_index))
         children = sorted(children, key=lambda k: k.get_properties()['version'])
 
         self._latest_child = children[-1]
@@ -37,6 +154,20 @@ class TopLevelTreeItem(QtGui.QTreeWidgetItem):
     def get_fields(self):
         return self._fields
 
+    def set_change(self, change):
+        # Change since the last session that scanned the entity, see the snapshots module
+        self._change = change
+
+    def get_change(self):
+        return self._change
+
+    def set_modified(self, modified):
+        # Newest folder mtime of the versions, warm items of a relative modified window are filtered on it
+        self._modified = modified
+
+    def get_modified(self):
+        return self._modified
+
     def item_expand(self):
         for child_index in range(self.childCount()):
             self.child(child_index).item_expand()
@@ -77,22 +208,26 @@ class RenderTopLevelTreeItem(TopLevelTreeItem):
         
         return properties
 
-class TreeItem(QtGui.QTreeWidgetItem):
-    def __init__(self, path, fields, column_names):
-        super(TreeItem, self).__init__()
+class TreeItem(BaseTreeItem):
+    def __init__(self, path, fields, column_names, modified=None):
+        super(TreeItem, self).__init__(column_names)
 
         self._fields = fields
-        self._column_names = column_names
         self._item_expanded = False
-        self._preview_item = None
+
+        # Linked work files and previews, resolved by the cache manager during the scan
+        self._links = []
+        self._preview_path = None
+        self._integrity = None
 
         # Check if it can have children through templates
         if 'templates' in self._fields.keys() and len(self._fields['templates'].keys()) > 1:
             self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.ShowIndicator)
 
-        # Last modified
-        time = os.path.getctime(os.path.dirname(path))
-        date_time = datetime.utcfromtimestamp(time).strftime('%Y-%m-%d %H:%M:%S')
+        # Last modified, the cache manager passes None when the folder could not be read in time
+        date_time = ''
+        if modified is not None:
+            date_time = datetime.utcfromtimestamp(modified).strftime('%Y-%m-%d %H:%M:%S')
 
         # Set item properties
         self._properties = {
@@ -112,32 +247,50 @@ class TreeItem(QtGui.QTreeWidgetItem):
         self.setText(self._column_names.index_name('depart'), self._properties['department'])
         self.setText(self._column_names.index_name('modif'), self._properties['modified'])
 
-    def _create_child_item(self, path, fields):
-        item = TreeItem(path, fields, self._column_names)
+    def _create_child_item(self, path, fields, modified=None):
+        item = TreeItem(path, fields, self._column_names, modified)
         self.addChild(item)
         return item
 
+    def set_links(self, links):
+        self._links = links
+        self._preview_path = None
+
+        for path, modified, is_preview in links:
+            if is_preview:
+                self._preview_path = path
+
+        # Remove the expand indicator
+        if not links:
+            self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.DontShowIndicator)
+
+    def get_links(self):
+        return self._links
+
+    def set_integrity(self, result):
+        self._integrity = result
+
+        text = None
+        if integrity.has_problems(result):
+            text = 'Incomplete sequence: {}'.format(integrity.format_result(result))
+        self.set_warning('integrity', text)
+
+    def get_integrity(self):
+        return self._integrity
+
+    def get_memory_size(self):
+        # The template dict is shared by all items of a template, it is not counted per item
+        fields = dict((key, value) for key, value in self._fields.items() if key != 'templates')
+        size = super(TreeItem, self).get_memory_size()
+        return size + memoryusage.deep_size(fields) + memoryusage.deep_size(self._properties) + memoryusage.deep_size(self._links)
+
     def item_expand(self):
-        if 'templates' in self._fields.keys() and not self._item_expanded:
-            work_templates = self._fields['templates']['work_template']
-            if work_templates:
-                for work_template in work_templates:
-                    path = work_template.apply_fields(self._fields)
-                    fields = self._fields.copy()
-                    fields.pop('templates', None)
-
-                    if os.path.exists(path):
-                        self._create_child_item(path, fields)
-                        break
-
-            preview_template = self._fields['templates']['preview_template']
-            if preview_template:
-                path = preview_template.apply_fields(self._fields)
-                fields = self._fields.copy()
-                fields.pop('templates', None)
-                
-                if os.path.exists(path):
-                    self._preview_item = self._create_child_item(path, fields)
+        if not self._item_expanded:
+            fields = self._fields.copy()
+            fields.pop('templates', None)
+
+            for path, modified, is_preview in self._links:
+                self._create_child_item(path, fields, modified)
 
             self._item_expanded = True
 
@@ -149,11 +302,14 @@ class TreeItem(QtGui.QTreeWidgetItem):
         return self._properties['path']
 
     def get_preview_path(self):
-        if self._preview_item:
-            return self._preview_item.get_path()
+        if self._preview_path:
+            return self._preview_path
         else:
             return self.get_path()
 
+    def get_fields(self):
+        return self._fields
+
     def get_type(self):
         return self._properties['type']
 
@@ -164,8 +320,19 @@ class TreeItem(QtGui.QTreeWidgetItem):
         return self._properties
 
 class AovTreeItem(TreeItem):
-    def __init__(self, path, fields, column_names):
-        super(AovTreeItem, self).__init__(path, fields, column_names)
+    def __init__(self, path, fields, column_names, modified=None):
+        super(AovTreeItem, self).__init__(path, fields, column_names, modified)
 
         self._properties['name'] = fields['AOV']
         self.setText(self._column_names.index_name('name'), self._properties['name'])
+
+def get_leaf_items(item):
+    # All cache items below a grouping item, without the linked work files and previews
+    leaf_items = []
+    for child_index in range(item.childCount()):
+        child = item.child(child_index)
+        if isinstance(child, TreeItem):
+            leaf_items.append(child)
+        else:
+            leaf_items.extend(get_leaf_items(child))
+    return leaf_items